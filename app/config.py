@@ -38,10 +38,20 @@ if os.getenv("VERCEL"):
     UPLOAD_DIR = TEMP_DIR / "uploads"
     EMBEDDINGS_DIR = TEMP_DIR / "embeddings"
     EXPORTS_DIR = TEMP_DIR / "exports"
+    ARCHIVE_DIR = TEMP_DIR / "archive"
 else:
     UPLOAD_DIR = BASE_DIR / "uploads"
     EMBEDDINGS_DIR = BASE_DIR / "embeddings"
     EXPORTS_DIR = BASE_DIR / "exports"
+    ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(BASE_DIR / "archive")))  # archived attendance months (.npz)
+
+# On-demand request profiling (app/profiling.py): admins add ?profile=1 (or X-Profile: 1) to a
+# request; PROFILE_SAMPLE_RATE additionally profiles that fraction of all requests. The newest
+# PROFILE_KEEP profiles are kept in PROFILE_DIR and downloadable from /api/admin/profiles.
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(EMBEDDINGS_DIR.parent / "profiles")))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))  # stack sampling period
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
 
 # Face recognition
 FACE_DETECTOR = "mtcnn"  # mtcnn | retinaface | opencv
@@ -50,6 +60,81 @@ DISTANCE_METRIC = "cosine"  # cosine | euclidean
 THRESHOLD_COSINE = 0.6  # Lower = stricter match
 THRESHOLD_EUCLIDEAN = 10.0
 
-# Ensure directories exist
-for d in (UPLOAD_DIR, EMBEDDINGS_DIR, EXPORTS_DIR):
-    d.mkdir(parents=True, exist_ok=True)
+# Face quality gate (applied between detection and embedding)
+FACE_QUALITY_GATE = os.getenv("FACE_QUALITY_GATE", "1") not in ("0", "false", "False")
+FACE_MIN_SIZE = int(os.getenv("FACE_MIN_SIZE", "40"))  # px, shorter box side
+FACE_MIN_CONFIDENCE = float(os.getenv("FACE_MIN_CONFIDENCE", "0.90"))  # MTCNN score
+FACE_MIN_SHARPNESS = float(os.getenv("FACE_MIN_SHARPNESS", "20.0"))  # variance of Laplacian at 64x64
+FACE_MAX_YAW = float(os.getenv("FACE_MAX_YAW", "0.35"))  # nose offset from eye midpoint / eye distance
+FACE_ALIGN_SIZE = 160  # aligned crop side (Facenet input)
+
+# Tiled detection for high-resolution photos (lecture halls): images whose longer side exceeds
+# DETECT_TILE_SIZE px are detected as overlapping tiles at full resolution, in parallel, plus one
+# downscaled full-frame pass for faces larger than a tile; boxes are merged with NMS. 0 disables.
+DETECT_TILE_SIZE = int(os.getenv("DETECT_TILE_SIZE", "0"))
+DETECT_TILE_OVERLAP = int(os.getenv("DETECT_TILE_OVERLAP", "160"))  # px; keep >= the largest face in a tile
+DETECT_TILE_WORKERS = int(os.getenv("DETECT_TILE_WORKERS", "0"))  # threads (0: CPU count)
+DETECT_NMS_IOU = float(os.getenv("DETECT_NMS_IOU", "0.3"))
+# Quality-gate minimum face side (px) for tiled images, in place of FACE_MIN_SIZE: the back-row
+# faces tiling finds are smaller than FACE_MIN_SIZE and would all be rejected as too_small
+DETECT_TILE_MIN_FACE = int(os.getenv("DETECT_TILE_MIN_FACE", "20"))
+
+# Pre-cropped faces from edge devices (mark-from-faces): no server-side detection
+MAX_FACES_PER_REQUEST = int(os.getenv("MAX_FACES_PER_REQUEST", "64"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))  # crops per model forward pass
+
+# Shared inference server (app.ml.inference): when set, workers send detect/embed requests to the
+# process listening on this Unix socket instead of loading TensorFlow themselves
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "30"))
+INFERENCE_BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5"))  # wait for more crops to batch
+
+# Admission control for the CPU-heavy recognition endpoints (mark-from-image/-faces, photo upload)
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", str(os.cpu_count() or 2)))  # per worker
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))  # requests waiting for a slot
+ADMISSION_DEADLINE_SECONDS = float(os.getenv("ADMISSION_DEADLINE_SECONDS", "10"))  # max wait to start, else 503
+
+# Bulk enrollment through the API runs as background jobs: at most BULK_IMPORT_JOBS at once per
+# worker. 0 disables the endpoint (CLI only); the default on Vercel, where work after the response is killed
+BULK_IMPORT_JOBS = int(os.getenv("BULK_IMPORT_JOBS", "0" if os.getenv("VERCEL") else "1"))
+
+# Continuous ingest from video files / camera streams (app.services.video_ingest).
+# INGEST_SOURCES: JSON list of jobs started at app startup, e.g.
+# [{"source": "rtsp://cam1/stream", "section_id": 3, "start": "09:00", "end": "10:00"}]
+INGEST_SOURCES = os.getenv("INGEST_SOURCES", "")
+INGEST_MIN_INTERVAL = float(os.getenv("INGEST_MIN_INTERVAL", "0.5"))  # s between processed frames, at least
+INGEST_MAX_INTERVAL = float(os.getenv("INGEST_MAX_INTERVAL", "5.0"))  # s; process a frame this often regardless
+INGEST_MOTION_THRESHOLD = float(os.getenv("INGEST_MOTION_THRESHOLD", "6.0"))  # mean abs gray diff on a 64x36 thumb
+INGEST_MIN_SIGHTINGS = int(os.getenv("INGEST_MIN_SIGHTINGS", "1"))  # processed frames before a student is marked
+
+# Recognition event log (app.services.recognition_log): every matched/unmatched face, written behind
+# the marking path in bulk inserts when the buffer reaches RECOGNITION_LOG_BATCH or every FLUSH seconds
+RECOGNITION_LOG_ENABLED = os.getenv("RECOGNITION_LOG_ENABLED", "1").lower() not in ("0", "false", "no")
+RECOGNITION_LOG_BATCH = int(os.getenv("RECOGNITION_LOG_BATCH", "500"))
+RECOGNITION_LOG_FLUSH_SECONDS = float(os.getenv("RECOGNITION_LOG_FLUSH_SECONDS", "2.0"))
+RECOGNITION_LOG_MAX_BUFFER = int(os.getenv("RECOGNITION_LOG_MAX_BUFFER", "20000"))  # oldest dropped beyond this
+
+# Attendance change feed (GET /api/attendance/changes): rows newer than the lag are held back so a
+# transaction committing late cannot fall behind a cursor already handed out
+CHANGE_FEED_LAG_SECONDS = float(os.getenv("CHANGE_FEED_LAG_SECONDS", "5"))
+CHANGE_FEED_MAX_ROWS = int(os.getenv("CHANGE_FEED_MAX_ROWS", "100000"))  # per request; "more": true beyond
+
+# Per-worker cache of serialized responses for polled GETs (records, summaries), keyed by change token
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# Postgres: monthly attendance partitions kept ahead of today (when the table is partitioned)
+ATTENDANCE_PARTITIONS_AHEAD = int(os.getenv("ATTENDANCE_PARTITIONS_AHEAD", "3"))
+
+# Gallery snapshot: contiguous float32 matrix memory-mapped read-only by every worker
+GALLERY_SNAPSHOT_DIR = EMBEDDINGS_DIR / "gallery"
+GALLERY_SNAPSHOTS_KEEP = int(os.getenv("GALLERY_SNAPSHOTS_KEEP", "2"))
+
+# Approximate matching (IVF index, app/ml/ann.py) for galleries of at least ANN_MIN_GALLERY
+# students (0 disables). ANN_NLIST cells (0: ~4*sqrt(N)); ANN_NPROBE cells searched per face:
+# higher is closer to exact search and slower (see python -m scripts.bench.ann)
+ANN_MIN_GALLERY = int(os.getenv("ANN_MIN_GALLERY", "50000"))
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+
+# Directories are created on first write (see routers/services), not at import,
+# so a cold serverless start does no filesystem work before the first request.
@@ -26,6 +26,19 @@ AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_co
 Base = declarative_base()
 
 
+def insert_ignoring_conflicts(session: AsyncSession, model):
+    """INSERT into the model's table that skips rows hitting a unique key (ON CONFLICT DO NOTHING on SQLite / PostgreSQL)."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy import insert
+        return insert(model)
+    return insert(model).on_conflict_do_nothing()
+
+
 async def get_db():
     """Dependency: yield async DB session."""
     async with AsyncSessionLocal() as session:
@@ -40,8 +53,16 @@ async def get_db():
 
 
 async def init_db():
-    """Create all tables."""
+    """Create all tables, apply pending migrations and, on Postgres, any missing attendance month partitions."""
     from app.database import Base
     from app import models  # noqa: register models with Base.metadata
+    from app.migrations import run_migrations
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all never alters existing tables: new columns / indexes come from migrations
+        await conn.run_sync(run_migrations)
+        if conn.dialect.name == "postgresql":
+            # Month-partitioned attendance (scripts/partition_attendance.py): keep upcoming months created
+            from app.config import ATTENDANCE_PARTITIONS_AHEAD
+            from app.services.partitions import ensure_partitions
+            await ensure_partitions(conn, months_ahead=ATTENDANCE_PARTITIONS_AHEAD)
@@ -5,13 +5,18 @@ Serves API, static assets, and dashboard.
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pathlib import Path
 
 from app.database import init_db
-from app.routers import auth, students, attendance, reports
+from app import metrics
+from app.ml.inference import InferenceUnavailable
+from app.profiling import ProfilingMiddleware
+from app.routers import admin, auth, students, attendance, reports, sections
+from app.services.recognition_log import close_recognition_log
+from app.services.video_ingest import start_configured_ingest, stop_ingest
 
 # Reduce TensorFlow logging
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
@@ -20,8 +25,10 @@ os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    ingest = start_configured_ingest()  # camera/stream jobs from INGEST_SOURCES, if any
     yield
-    # shutdown if needed
+    await stop_ingest(ingest)
+    await close_recognition_log()  # write-behind buffer: flush what is left
 
 
 app = FastAPI(
@@ -31,10 +38,22 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Admin-flagged (?profile=1) and PROFILE_SAMPLE_RATE-sampled requests run under a profiler
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.exception_handler(InferenceUnavailable)
+async def inference_unavailable(request: Request, exc: InferenceUnavailable):
+    """Shared inference server down or restarting: ask the client to retry instead of failing with 500."""
+    return JSONResponse(status_code=503, content={"detail": "Recognition temporarily unavailable"}, headers={"Retry-After": "5"})
+
+
 app.include_router(auth.router)
 app.include_router(students.router)
 app.include_router(attendance.router)
 app.include_router(reports.router)
+app.include_router(sections.router)
+app.include_router(admin.router)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_DIR = BASE_DIR / "static"
@@ -54,3 +73,9 @@ async def index():
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition of pipeline stage timings and face counters (this worker)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,220 @@
+"""
+In-process metrics: counters, gauges and histograms rendered in Prometheus text format,
+plus per-request stage timings for the Server-Timing response header.
+Metrics are per worker process; scrape each worker (or aggregate upstream).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Seconds; covers ~1 ms decode up to multi-second MTCNN on large frames
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+_lock = threading.Lock()
+
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        with _lock:
+            _registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with _lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label key -> [bucket counts..., sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, state in sorted(self._values.items()):
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(bound)))} {state[i]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(state[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {state[-1]}")
+        return lines
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format (0.0.4)."""
+    out = []
+    with _lock:
+        metrics = list(_registry)
+    for m in metrics:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m.samples())
+    return "\n".join(out) + "\n"
+
+
+# ----- Recognition pipeline metrics -----
+STAGE_SECONDS = Histogram(
+    "attendance_stage_seconds",
+    "Time spent in each recognition/marking stage (decode, gallery_load, detect, embed, match, db writes).",
+)
+FACES_DETECTED = Counter("attendance_faces_detected_total", "Faces found by the detector.")
+FACES_MATCHED = Counter("attendance_faces_matched_total", "Detected faces matched to an enrolled student.")
+FACES_REJECTED = Counter(
+    "attendance_faces_rejected_total",
+    "Detected faces dropped by the quality gate before embedding, by reason.",
+)
+FACES_UNMATCHED = Counter("attendance_faces_unmatched_total", "Detected faces with no match within threshold.")
+GALLERY_SIZE = Gauge("attendance_gallery_size", "Number of enrolled embeddings in the last loaded gallery (whole institution or section roster).")
+
+# ----- Admission control (recognition endpoints) -----
+ADMISSION_IN_FLIGHT = Gauge("attendance_admission_in_flight", "Recognition requests currently holding a slot.")
+ADMISSION_QUEUE_DEPTH = Gauge("attendance_admission_queue_depth", "Recognition requests waiting for a slot.")
+ADMISSION_WAIT_SECONDS = Histogram(
+    "attendance_admission_wait_seconds",
+    "Time admitted requests waited for a slot.",
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+ADMISSION_SHED = Counter(
+    "attendance_admission_shed_total",
+    "Recognition requests rejected with 503 (reason: queue_full | deadline).",
+)
+
+# ----- Video / stream ingest -----
+INGEST_FRAMES = Counter(
+    "attendance_ingest_frames_total",
+    "Frames from video ingest sources (result: read | processed | skipped | dropped).",
+)
+
+# ----- Recognition event log (write-behind) -----
+RECOGNITION_LOG_EVENTS = Counter(
+    "attendance_recognition_log_events_total",
+    "Recognition log rows (result: written | dropped (buffer full) | failed (insert error, requeued)).",
+)
+
+# ----- Conditional GET (polled read endpoints) -----
+RESPONSE_CACHE = Counter(
+    "attendance_response_cache_total",
+    "Conditional GET outcomes for polled endpoints (result: not_modified | hit | miss).",
+)
+
+# ----- Request profiling -----
+PROFILES_CAPTURED = Counter(
+    "attendance_profiles_captured_total",
+    "Request profiles written (mode: sample | cprofile; trigger: admin | rate).",
+)
+
+
+# ----- Per-request stage timings (Server-Timing) -----
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Begin collecting stage timings for the current request; returns the (shared) list."""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time a block: observe it in STAGE_SECONDS and record it for the current request, if any."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    """Format timings as a Server-Timing header value; repeated stages are summed."""
+    totals: Dict[str, float] = {}
+    for stage, elapsed in timings:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items())
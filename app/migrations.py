@@ -0,0 +1,136 @@
+"""
+Schema migrations for existing databases.
+
+`init_db` runs `create_all`, which creates missing tables and their indexes but never
+alters a table that already exists. Columns and indexes added to existing tables
+are applied here, in order. Each migration runs once and is recorded in
+`schema_migrations`. Every step checks the live schema first, so on a fresh database
+(where `create_all` already built everything) the steps are no-ops.
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _indexes(conn: Connection, table: str) -> set:
+    insp = inspect(conn)
+    names = {i["name"] for i in insp.get_indexes(table)}
+    names |= {u["name"] for u in insp.get_unique_constraints(table) if u.get("name")}
+    return names
+
+
+def add_student_embedding_count(conn: Connection) -> None:
+    if "embedding_count" not in _columns(conn, "students"):
+        conn.execute(text("alter table students add column embedding_count integer not null default 0"))
+
+
+def add_attendance_session_id(conn: Connection) -> None:
+    """session_id plus per-day uniqueness narrowed to session-less rows (course/section rosters)."""
+    if "session_id" in _columns(conn, "attendance"):
+        return
+    if conn.dialect.name == "sqlite":
+        # SQLite cannot drop the old table-level UNIQUE (student_id, date): rebuild the table
+        from app.models import Attendance
+
+        for name in _indexes(conn, "attendance"):
+            if name and not name.startswith("sqlite_autoindex"):
+                conn.execute(text(f"drop index if exists {name}"))
+        conn.execute(text("alter table attendance rename to attendance_old"))
+        Attendance.__table__.create(conn)
+        conn.execute(text(
+            "insert into attendance (id, student_id, date, status, marked_at, source) "
+            "select id, student_id, date, status, marked_at, source from attendance_old"
+        ))
+        conn.execute(text("drop table attendance_old"))
+        return
+    conn.execute(text("alter table attendance add column session_id integer references class_sessions(id)"))
+    conn.execute(text("alter table attendance drop constraint if exists uq_student_date"))
+    conn.execute(text(
+        "create unique index if not exists uq_student_date on attendance (student_id, date) where session_id is null"
+    ))
+    conn.execute(text(
+        "create unique index if not exists uq_session_student on attendance (session_id, student_id, date)"
+    ))
+
+
+def add_attendance_date_index(conn: Connection) -> None:
+    """Day/range reads filter on date alone; uq_student_date leads with student_id."""
+    if "ix_attendance_date" not in _indexes(conn, "attendance"):
+        conn.execute(text("create index ix_attendance_date on attendance (date)"))
+
+
+def add_embedding_models(conn: Connection) -> None:
+    """
+    Per-model embeddings (embedding_models / student_embeddings come from create_all): tag existing
+    embeddings with the configured model, pin it as active, and let students.embedding hold any
+    dimension. Vector indexes on it are dropped: pgvector indexes need a fixed dimension, and the
+    gallery is matched in memory anyway.
+    """
+    from app.config import FACE_RECOGNITION_MODEL
+
+    if "embedding_model" not in _columns(conn, "students"):
+        conn.execute(text("alter table students add column embedding_model varchar(50)"))
+    conn.execute(
+        text("update students set embedding_model = :m where embedding is not null and embedding_model is null"),
+        {"m": FACE_RECOGNITION_MODEL},
+    )
+    if conn.dialect.name == "postgresql":
+        rows = conn.execute(text(
+            "select indexname from pg_indexes where tablename = 'students' "
+            "and (indexdef ilike '%using hnsw%' or indexdef ilike '%using ivfflat%')"
+        ))
+        for (name,) in rows.all():
+            conn.execute(text(f'drop index if exists "{name}"'))
+        conn.execute(text("alter table students alter column embedding type vector"))
+    enrolled = conn.execute(text("select count(*) from students where embedding is not null")).scalar()
+    active = conn.execute(text("select count(*) from embedding_models where state = 'active'")).scalar()
+    if enrolled and not active:
+        conn.execute(
+            text("insert into embedding_models (name, state, created_at, activated_at) values (:m, 'active', :at, :at)"),
+            {"m": FACE_RECOGNITION_MODEL, "at": datetime.utcnow()},
+        )
+
+
+def add_attendance_marked_at_index(conn: Connection) -> None:
+    """Change feed reads attendance in (marked_at, id) order from a cursor."""
+    if "ix_attendance_marked_at" not in _indexes(conn, "attendance"):
+        conn.execute(text("create index ix_attendance_marked_at on attendance (marked_at, id)"))
+
+
+# (id, function) in application order; never reorder or rename applied entries
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = [
+    ("0001_student_embedding_count", add_student_embedding_count),
+    ("0002_attendance_session_id", add_attendance_session_id),
+    ("0003_attendance_date_index", add_attendance_date_index),
+    ("0004_embedding_models", add_embedding_models),
+    ("0005_attendance_marked_at_index", add_attendance_marked_at_index),
+]
+
+
+def applied_migrations(conn: Connection) -> set:
+    conn.execute(text(
+        "create table if not exists schema_migrations (id varchar(100) primary key, applied_at timestamp not null)"
+    ))
+    return {row[0] for row in conn.execute(text("select id from schema_migrations"))}
+
+
+def run_migrations(conn: Connection) -> List[str]:
+    """Apply pending migrations on a sync connection (use via AsyncConnection.run_sync). Returns ids applied."""
+    done = applied_migrations(conn)
+    applied = []
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in done:
+            continue
+        migrate(conn)
+        conn.execute(
+            text("insert into schema_migrations (id, applied_at) values (:id, :at)"),
+            {"id": migration_id, "at": datetime.utcnow()},
+        )
+        applied.append(migration_id)
+    return applied
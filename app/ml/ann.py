@@ -0,0 +1,238 @@
+"""
+Approximate nearest-neighbour search for large galleries: a pure-NumPy IVF (inverted file) index.
+
+Training clusters the gallery with k-means into `nlist` cells; each embedding is stored in its
+cell's list. A query is compared with the centroids, then exactly with the vectors of its
+`nprobe` closest cells only, so a 100k gallery costs ~nprobe/nlist of an exact scan per face.
+Recall/latency is tuned with nprobe (more cells: higher recall, slower) and nlist.
+Distances are the same as app.ml.recognizer.distance_matrix (cosine or euclidean).
+
+Embeddings can be added and removed without retraining (enrollment changes); `remap` follows
+gallery row renumbering. save/load use one directory of .npy files; load memory-maps them, so
+the lists are shared through the page cache like the gallery snapshot itself.
+"""
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+FORMAT = 1
+_CHUNK = 8192  # rows per block when assigning to centroids (bounds the (rows, nlist) temp)
+
+
+def _prepare(vectors: np.ndarray, metric: str) -> np.ndarray:
+    v = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+    if metric == "cosine":
+        v = v / (np.linalg.norm(v, axis=1, keepdims=True) + 1e-8)
+    return v
+
+
+def _scores(queries: np.ndarray, vectors: np.ndarray, metric: str) -> np.ndarray:
+    """Distances (rows, len(vectors)) for prepared inputs."""
+    dots = queries @ vectors.T
+    if metric == "cosine":
+        return 1.0 - dots
+    sq = (queries * queries).sum(1)[:, None] + (vectors * vectors).sum(1)[None, :] - 2.0 * dots
+    return np.sqrt(np.maximum(sq, 0.0))
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, metric: str) -> np.ndarray:
+    out = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), _CHUNK):
+        out[start:start + _CHUNK] = np.argmin(_scores(data[start:start + _CHUNK], centroids, metric), axis=1)
+    return out
+
+
+def default_nlist(n: int) -> int:
+    """~4 * sqrt(n) cells (e.g. 1265 for 100k), at least 1 and at most n."""
+    return int(max(1, min(n, round(4 * np.sqrt(n)))))
+
+
+class IVFIndex:
+    """Cells of (label, vector) pairs around k-means centroids; labels are caller-defined ints (gallery rows)."""
+
+    def __init__(self, centroids: np.ndarray, metric: str = "cosine", nprobe: int = 8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.metric = metric
+        self.nprobe = nprobe
+        self.trained_size = 0
+        dim = self.centroids.shape[1]
+        self._vectors: List[np.ndarray] = [np.zeros((0, dim), np.float32) for _ in range(len(self.centroids))]
+        self._labels: List[np.ndarray] = [np.zeros(0, np.int64) for _ in range(len(self.centroids))]
+        self._cell = {}  # label -> cell
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, nlist: Optional[int] = None, metric: str = "cosine", nprobe: int = 8,
+              iterations: int = 8, sample: int = 32, seed: int = 0) -> "IVFIndex":
+        """k-means on at most `sample` points per cell (spherical for cosine). Does not add the vectors."""
+        rng = np.random.default_rng(seed)
+        data = _prepare(matrix, metric)
+        nlist = min(nlist or default_nlist(len(data)), len(data))
+        if len(data) > nlist * sample:
+            data = data[rng.choice(len(data), nlist * sample, replace=False)]
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = _assign(data, centroids, metric)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[~empty]
+            centroids[~empty] = np.add.reduceat(data[order], starts, axis=0) / counts[~empty, None]
+            if empty.any():  # reseed empty cells on random points
+                centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+            if metric == "cosine":
+                centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-8
+        index = cls(centroids, metric=metric, nprobe=nprobe)
+        index.trained_size = len(matrix)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._cell)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def copy(self) -> "IVFIndex":
+        """Independent index sharing the (never modified in place) cell arrays."""
+        other = IVFIndex(self.centroids, metric=self.metric, nprobe=self.nprobe)
+        other.trained_size = self.trained_size
+        other._vectors, other._labels, other._cell = list(self._vectors), list(self._labels), dict(self._cell)
+        return other
+
+    def add(self, labels, vectors: np.ndarray) -> None:
+        """Insert (or replace) embeddings under the given labels."""
+        labels = np.asarray(labels, dtype=np.int64)
+        if not len(labels):
+            return
+        self.remove([l for l in labels.tolist() if l in self._cell])
+        data = _prepare(vectors, self.metric)
+        cells = _assign(data, self.centroids, self.metric)
+        for cell in np.unique(cells).tolist():
+            mask = cells == cell
+            self._vectors[cell] = np.concatenate([self._vectors[cell], data[mask]])
+            self._labels[cell] = np.concatenate([self._labels[cell], labels[mask]])
+        self._cell.update(zip(labels.tolist(), cells.tolist()))
+
+    def remove(self, labels) -> None:
+        """Delete embeddings by label (unknown labels are ignored)."""
+        by_cell = {}
+        for label in labels:
+            cell = self._cell.pop(int(label), None)
+            if cell is not None:
+                by_cell.setdefault(cell, []).append(int(label))
+        for cell, gone in by_cell.items():
+            keep = ~np.isin(self._labels[cell], gone)
+            self._vectors[cell] = self._vectors[cell][keep]
+            self._labels[cell] = self._labels[cell][keep]
+
+    def remap(self, mapping: np.ndarray) -> None:
+        """Relabel: old label i becomes mapping[i]; entries mapped to -1 are dropped."""
+        mapping = np.asarray(mapping, dtype=np.int64)
+        self._cell = {}
+        for cell in range(self.nlist):
+            labels = self._labels[cell]
+            new = mapping[labels] if len(labels) else labels
+            keep = new >= 0
+            if not keep.all():
+                self._vectors[cell] = self._vectors[cell][keep]
+            self._labels[cell] = new[keep]
+            self._cell.update((l, cell) for l in self._labels[cell].tolist())
+
+    def search(self, queries: np.ndarray, k: int = 2, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest labels per query among the probed cells, nearest first: (labels, distances),
+        both (Q, k); padded with -1 / inf when the probed cells hold fewer than k vectors.
+        """
+        q = _prepare(queries, self.metric)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        best_d = np.full((len(q), k), np.inf, dtype=np.float32)
+        best_l = np.full((len(q), k), -1, dtype=np.int64)
+        if not len(q):
+            return best_l, best_d
+        coarse = _scores(q, self.centroids, self.metric)
+        probes = np.argpartition(coarse, nprobe - 1, axis=1)[:, :nprobe] if nprobe < self.nlist else \
+            np.broadcast_to(np.arange(self.nlist), (len(q), self.nlist))
+        # Group (query, cell) pairs by cell: each cell's vectors are scored once against all its queries
+        cells, queries_of = probes.ravel(), np.repeat(np.arange(len(q)), probes.shape[1])
+        order = np.argsort(cells, kind="stable")
+        cells, queries_of = cells[order], queries_of[order]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        cand_q, cand_l, cand_d = [], [], []
+        for rows, cell in zip(np.split(queries_of, bounds), cells[np.concatenate([[0], bounds])].tolist()):
+            labels = self._labels[cell]
+            if not len(labels):
+                continue
+            d = _scores(q[rows], self._vectors[cell], self.metric)
+            cand_q.append(np.repeat(rows, len(labels)))
+            cand_l.append(np.tile(labels, len(rows)))
+            cand_d.append(d.ravel())
+        if not cand_q:
+            return best_l, best_d
+        cand_q, cand_l, cand_d = np.concatenate(cand_q), np.concatenate(cand_l), np.concatenate(cand_d)
+        order = np.lexsort((cand_d, cand_q))  # by query, then distance
+        cand_q, cand_l, cand_d = cand_q[order], cand_l[order], cand_d[order]
+        starts = np.searchsorted(cand_q, np.arange(len(q)))
+        counts = np.bincount(cand_q, minlength=len(q))
+        for j in range(k):
+            has = counts > j
+            best_l[has, j] = cand_l[starts[has] + j]
+            best_d[has, j] = cand_d[starts[has] + j]
+        return best_l, best_d
+
+    def save(self, folder: Path) -> bool:
+        """
+        Publish atomically (temp dir + rename) at `folder`, which is never replaced: like gallery
+        snapshots, an index is saved once under its immutable snapshot version. Returns False,
+        discarding this copy, if an index is already there (e.g. another worker published first).
+        """
+        folder = Path(folder)
+        if folder.exists():
+            return False
+        tmp = folder.with_name(f".tmp-{uuid.uuid4().hex}")
+        tmp.mkdir(parents=True)
+        try:
+            sizes = [len(l) for l in self._labels]
+            np.save(tmp / "centroids.npy", self.centroids)
+            np.save(tmp / "vectors.npy", np.concatenate(self._vectors) if sum(sizes) else
+                    np.zeros((0, self.centroids.shape[1]), np.float32))
+            np.save(tmp / "labels.npy", np.concatenate(self._labels))
+            (tmp / "meta.json").write_text(json.dumps({
+                "format": FORMAT, "metric": self.metric, "nprobe": self.nprobe,
+                "trained_size": self.trained_size, "sizes": sizes,
+            }), encoding="utf-8")
+            os.rename(tmp, folder)  # fails if another writer's (non-empty) folder is already there
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if folder.exists():
+                return False
+            raise
+        return True
+
+    @classmethod
+    def load(cls, folder: Path, mmap: bool = True) -> Optional["IVFIndex"]:
+        """Index saved by `save` (lists memory-mapped read-only), or None if missing / unreadable."""
+        folder = Path(folder)
+        try:
+            meta = json.loads((folder / "meta.json").read_text(encoding="utf-8"))
+            if meta.get("format") != FORMAT:
+                return None
+            mode = "r" if mmap else None
+            centroids = np.load(folder / "centroids.npy")
+            vectors = np.load(folder / "vectors.npy", mmap_mode=mode)
+            labels = np.load(folder / "labels.npy")
+        except (OSError, ValueError):
+            return None
+        index = cls(centroids, metric=meta["metric"], nprobe=meta["nprobe"])
+        index.trained_size = meta["trained_size"]
+        offset = 0
+        for cell, size in enumerate(meta["sizes"]):
+            index._vectors[cell] = vectors[offset:offset + size]  # views: no copy until the cell changes
+            index._labels[cell] = labels[offset:offset + size]
+            offset += size
+        index._cell = {int(l): cell for cell, ls in enumerate(index._labels) for l in ls.tolist()}
+        return index
@@ -2,48 +2,195 @@
 Face detection using MTCNN (Multi-task Cascaded CNN).
 MTCNN is a state-of-the-art detector that outputs bounding boxes and facial landmarks.
 Handles multi-face detection in a single image for classroom scenarios.
+
+High-resolution photos can be detected in tiles (DETECT_TILE_SIZE): MTCNN misses 20-30 px faces
+in a 4000 px frame, and scanning the whole frame at once is slow. Overlapping tiles are detected
+at full resolution on a thread pool (TensorFlow and OpenCV release the GIL), plus one
+downscaled pass over the whole frame for faces larger than a tile. Boxes cut by an interior tile
+edge are dropped (the overlap shows that face whole in the neighbouring tile); the rest are
+mapped to global coordinates and merged with non-maximum suppression.
 """
+import threading
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # Lazy import to avoid loading TF at module load
 _detector = None
+_detector_lock = threading.Lock()  # detection runs in worker threads; build MTCNN once
+_tile_pool = None
 
 
 def _get_detector():
     global _detector
     if _detector is None:
-        try:
-            from mtcnn import MTCNN
-            _detector = MTCNN()
-        except Exception as e:
-            raise RuntimeError(f"MTCNN not available: {e}. Install: pip install mtcnn") from e
+        with _detector_lock:
+            if _detector is None:
+                try:
+                    from mtcnn import MTCNN
+                    _detector = MTCNN()
+                except Exception as e:
+                    raise RuntimeError(f"MTCNN not available: {e}. Install: pip install mtcnn") from e
     return _detector
 
 
-def detect_faces(image: np.ndarray) -> List[Tuple[int, int, int, int]]:
-    """
-    Detect all faces in image. Returns list of (x, y, w, h) bounding boxes.
-    image: BGR or RGB numpy array (H, W, C).
-    """
-    detector = _get_detector()
+class DetectedFace(NamedTuple):
+    """One MTCNN detection: box (x, y, w, h), detector confidence and 5-point landmarks."""
+    box: Tuple[int, int, int, int]
+    confidence: float
+    keypoints: Dict[str, Tuple[int, int]]
+
+
+def tile_workers() -> int:
+    """Threads detecting tiles in parallel (DETECT_TILE_WORKERS, default the CPU count)."""
+    import os
+    from app.config import DETECT_TILE_WORKERS
+    return DETECT_TILE_WORKERS or os.cpu_count() or 1
+
+
+def _get_tile_pool():
+    global _tile_pool
+    if _tile_pool is None:
+        with _detector_lock:
+            if _tile_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _tile_pool = ThreadPoolExecutor(max_workers=tile_workers(), thread_name_prefix="detect-tile")
+    return _tile_pool
+
+
+def _to_rgb(image: np.ndarray) -> np.ndarray:
     # MTCNN expects RGB
+    import cv2
     if len(image.shape) == 2:
-        import cv2
-        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-    elif image.shape[2] == 4:
-        import cv2
-        image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGB)
-    elif image.shape[2] == 3:
-        import cv2
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2RGB)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return image
+
 
-    results = detector.detect_faces(image)
-    boxes = []
-    for r in results:
+def _detect_rgb(rgb: np.ndarray, offset: Tuple[int, int] = (0, 0), scale: float = 1.0) -> List[DetectedFace]:
+    """MTCNN on an RGB array; boxes and keypoints divided by `scale`, then shifted by `offset` (x, y)."""
+    ox, oy = offset
+    faces = []
+    for r in _get_detector().detect_faces(rgb):
         x, y, w, h = r["box"]
         # Ensure non-negative and within image
         x = max(0, x)
         y = max(0, y)
-        boxes.append((int(x), int(y), int(w), int(h)))
-    return boxes
+        box = (int(x / scale) + ox, int(y / scale) + oy, int(w / scale), int(h / scale))
+        keypoints = {
+            k: (int(v[0] / scale) + ox, int(v[1] / scale) + oy) for k, v in (r.get("keypoints") or {}).items()
+        }
+        faces.append(DetectedFace(box, float(r.get("confidence", 1.0)), keypoints))
+    return faces
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """Overlapping (x, y, w, h) tiles covering the image; the last row/column is aligned to the edge."""
+    step = max(1, tile_size - overlap)
+
+    def starts(length: int) -> List[int]:
+        if length <= tile_size:
+            return [0]
+        out = list(range(0, length - tile_size, step))
+        return out + [length - tile_size]
+
+    return [(x, y, min(tile_size, width), min(tile_size, height)) for y in starts(height) for x in starts(width)]
+
+
+def nms(faces: List[DetectedFace], iou_threshold: float) -> List[DetectedFace]:
+    """Greedy non-maximum suppression: keep the most confident of boxes overlapping more than iou_threshold."""
+    if len(faces) < 2:
+        return list(faces)
+    boxes = np.array([f.box for f in faces], dtype=np.float32)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort([-f.confidence for f in faces], kind="stable")
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(int(i))
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-6)
+        order = rest[iou <= iou_threshold]
+    return [faces[i] for i in sorted(keep)]
+
+
+def detect_faces_tiled(
+    rgb: np.ndarray,
+    tile_size: int,
+    overlap: int,
+    iou_threshold: float = 0.3,
+    full_frame_pass: bool = True,
+) -> List[DetectedFace]:
+    """
+    Detect in overlapping tiles (in parallel) and, with full_frame_pass, in the whole frame
+    downscaled to tile_size; merge into global-coordinate boxes with NMS.
+    """
+    height, width = rgb.shape[:2]
+    edge = 2  # px: a box this close to an interior tile edge was cut by the tile
+
+    def one_tile(tile: Tuple[int, int, int, int]) -> List[DetectedFace]:
+        tx, ty, tw, th = tile
+        found = _detect_rgb(np.ascontiguousarray(rgb[ty:ty + th, tx:tx + tw]), offset=(tx, ty))
+        return [
+            f for f in found
+            if not ((tx > 0 and f.box[0] - tx < edge)
+                    or (ty > 0 and f.box[1] - ty < edge)
+                    or (tx + tw < width and tx + tw - (f.box[0] + f.box[2]) < edge)
+                    or (ty + th < height and ty + th - (f.box[1] + f.box[3]) < edge))
+        ]
+
+    def full_frame() -> List[DetectedFace]:
+        import cv2
+        scale = tile_size / max(height, width)
+        small = cv2.resize(rgb, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        return _detect_rgb(small, scale=scale)
+
+    pool = _get_tile_pool()
+    futures = [pool.submit(one_tile, tile) for tile in tile_grid(width, height, tile_size, overlap)]
+    if full_frame_pass:
+        futures.append(pool.submit(full_frame))
+    faces = [face for future in futures for face in future.result()]
+    return nms(faces, iou_threshold)
+
+
+def is_tiled(image: np.ndarray, tile_size: Optional[int] = None) -> bool:
+    """Whether detect_faces_full detects this image in tiles (tile_size default DETECT_TILE_SIZE)."""
+    if tile_size is None:
+        from app.config import DETECT_TILE_SIZE
+        tile_size = DETECT_TILE_SIZE
+    return bool(tile_size) and max(image.shape[:2]) > tile_size
+
+
+def detect_faces_full(image: np.ndarray, tile_size: Optional[int] = None, overlap: Optional[int] = None) -> List[DetectedFace]:
+    """
+    Detect all faces in image, keeping MTCNN's confidence and keypoints
+    (left_eye, right_eye, nose, mouth_left, mouth_right).
+    image: BGR or RGB numpy array (H, W, C). Images whose longer side exceeds tile_size
+    (default DETECT_TILE_SIZE; 0 disables) are detected in overlapping tiles.
+    """
+    from app.config import DETECT_TILE_SIZE, DETECT_TILE_OVERLAP, DETECT_NMS_IOU
+    from app.ml.inference import inference_client
+
+    client = inference_client()
+    if client is not None:
+        return client.detect(image)  # the server applies its own tiling settings
+    rgb = _to_rgb(image)
+    tile_size = DETECT_TILE_SIZE if tile_size is None else tile_size
+    if is_tiled(rgb, tile_size):
+        overlap = DETECT_TILE_OVERLAP if overlap is None else overlap
+        return detect_faces_tiled(rgb, tile_size, overlap, iou_threshold=DETECT_NMS_IOU)
+    return _detect_rgb(rgb)
+
+
+def detect_faces(image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """
+    Detect all faces in image. Returns list of (x, y, w, h) bounding boxes.
+    image: BGR or RGB numpy array (H, W, C).
+    """
+    return [f.box for f in detect_faces_full(image)]
@@ -0,0 +1,291 @@
+"""
+Shared local inference server: one process owns MTCNN and the DeepFace model and serves
+detect/embed requests over a Unix socket, so API workers never load TensorFlow.
+
+Set INFERENCE_SOCKET in the API workers and start the server once per host
+(`python -m scripts.inference_server`). detect_faces_full, get_embedding and embed_faces then
+delegate to it; nothing else changes. Embedding requests from all callers are queued and run
+as shared batches (up to EMBED_BATCH_SIZE crops, waiting at most INFERENCE_BATCH_WAIT_MS for
+more to arrive). When the server cannot be reached, calls raise InferenceUnavailable (503)
+instead of loading the models in the worker.
+
+Wire format, both directions: 8-byte header (JSON length, payload length, big-endian uint32),
+JSON header listing the arrays' shapes and dtypes, then the raw array bytes back to back.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+from app.config import INFERENCE_SOCKET, INFERENCE_TIMEOUT_SECONDS, INFERENCE_BATCH_WAIT_MS, EMBED_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = struct.Struct("!II")
+_client = None
+_client_lock = threading.Lock()
+_serving = False  # True inside the server process: the ml functions run locally
+
+
+class InferenceUnavailable(RuntimeError):
+    """The inference server did not answer (not running, restarting, or overloaded)."""
+
+
+def _encode(header: dict, arrays: list) -> List[bytes]:
+    import numpy as np
+
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    header = dict(header, arrays=[{"shape": list(a.shape), "dtype": a.dtype.str} for a in arrays])
+    head = json.dumps(header).encode()
+    return [_PREFIX.pack(len(head), sum(a.nbytes for a in arrays)), head] + [a.data for a in arrays]
+
+
+def _decode(head: bytes, payload: bytes) -> Tuple[dict, list]:
+    import numpy as np
+
+    header = json.loads(head)
+    arrays, offset = [], 0
+    for spec in header.pop("arrays", []):
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays.append(np.frombuffer(payload, dtype=dtype, count=count, offset=offset).reshape(spec["shape"]))
+        offset += count * dtype.itemsize
+    return header, arrays
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view, got = memoryview(buf), 0
+    while got < n:
+        k = sock.recv_into(view[got:])
+        if not k:
+            raise ConnectionError("inference server closed the connection")
+        got += k
+    return bytes(buf)
+
+
+class InferenceClient:
+    """Blocking client, one connection per thread (the pipeline runs in worker threads)."""
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _drop(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def call(self, op: str, arrays: list = (), **fields) -> Tuple[dict, list]:
+        """One request/response; reconnects once (server restart) before giving up."""
+        message = _encode(dict(fields, op=op), list(arrays))
+        for attempt in (1, 2):
+            try:
+                sock = self._connection()
+                for part in message:
+                    sock.sendall(part)
+                head_len, payload_len = _PREFIX.unpack(_recv_exact(sock, _PREFIX.size))
+                header, out = _decode(_recv_exact(sock, head_len), _recv_exact(sock, payload_len))
+                break
+            except (OSError, ConnectionError) as e:
+                self._drop()
+                if attempt == 2:
+                    raise InferenceUnavailable(f"Inference server at {self.path} unavailable: {e}") from e
+        if not header.get("ok"):
+            raise RuntimeError(f"Inference server error: {header.get('error')}")
+        return header, out
+
+    def detect(self, image) -> list:
+        from app.ml.detector import DetectedFace
+
+        header, _ = self.call("detect", [image])
+        return [
+            DetectedFace(tuple(f["box"]), f["confidence"], {k: tuple(v) for k, v in f["keypoints"].items()})
+            for f in header["faces"]
+        ]
+
+    def embed(self, crops: list, model_name: str) -> list:
+        header, out = self.call("embed", crops, model_name=model_name)
+        vectors = iter(out[0]) if out else iter(())
+        return [next(vectors).copy() if ok else None for ok in header["valid"]]
+
+    def represent(self, image, detector_backend: str, model_name: str):
+        header, out = self.call("represent", [image], detector_backend=detector_backend, model_name=model_name)
+        return out[0].copy() if out else None
+
+
+def inference_client() -> Optional[InferenceClient]:
+    """The shared client when INFERENCE_SOCKET is set (and we are not the server), else None."""
+    global _client
+    if _serving or not INFERENCE_SOCKET:
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = InferenceClient(INFERENCE_SOCKET, INFERENCE_TIMEOUT_SECONDS)
+    return _client
+
+
+class InferenceServer:
+    """Owns the models; one asyncio connection handler per client, embeddings batched across clients."""
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = EMBED_BATCH_SIZE,
+        batch_wait: float = INFERENCE_BATCH_WAIT_MS / 1000.0,
+        threads: int = 2,
+    ):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="inference")
+        self.batches = 0
+        self.batched_crops = 0
+        self._queue: Optional[asyncio.Queue] = None
+
+    def warm_up(self) -> None:
+        """Load the detector and embedding model before accepting connections."""
+        from app.ml.detector import _get_detector
+        from app.ml.recognizer import _get_model
+
+        _get_detector()
+        _get_model()
+
+    async def _batcher(self) -> None:
+        from app.ml.recognizer import embed_faces
+
+        loop = asyncio.get_running_loop()
+        carry = None
+        while True:
+            first = carry or await self._queue.get()
+            carry = None
+            model_name = first[0]
+            batch, size = [first], len(first[1])
+            deadline = loop.time() + self.batch_wait
+            while size < self.batch_size:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if item[0] != model_name:
+                    carry = item
+                    break
+                batch.append(item)
+                size += len(item[1])
+            crops = [crop for _model, request_crops, _fut in batch for crop in request_crops]
+            try:
+                vectors = await loop.run_in_executor(
+                    self.executor, lambda: embed_faces(crops, model_name=model_name, batch_size=self.batch_size)
+                )
+            except Exception as e:
+                for *_rest, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_crops += len(crops)
+            offset = 0
+            for _model, request_crops, fut in batch:
+                if not fut.done():
+                    fut.set_result(vectors[offset:offset + len(request_crops)])
+                offset += len(request_crops)
+
+    async def _handle(self, header: dict, arrays: list) -> Tuple[dict, list]:
+        import numpy as np
+        from app.ml.detector import detect_faces_full
+        from app.ml.recognizer import get_embedding
+
+        loop = asyncio.get_running_loop()
+        op = header.get("op")
+        if op == "detect":
+            faces = await loop.run_in_executor(self.executor, detect_faces_full, arrays[0])
+            return {"faces": [
+                {"box": list(f.box), "confidence": f.confidence, "keypoints": {k: list(v) for k, v in f.keypoints.items()}}
+                for f in faces
+            ]}, []
+        if op == "embed":
+            fut = loop.create_future()
+            await self._queue.put((header["model_name"], arrays, fut))
+            vectors = await fut
+            valid = [v is not None for v in vectors]
+            found = [v for v in vectors if v is not None]
+            return {"valid": valid}, [np.stack(found).astype(np.float32)] if found else []
+        if op == "represent":
+            emb = await loop.run_in_executor(
+                self.executor,
+                lambda: get_embedding(arrays[0], detector_backend=header["detector_backend"], model_name=header["model_name"]),
+            )
+            return {}, [emb] if emb is not None else []
+        if op == "ping":
+            return {"pid": os.getpid(), "batches": self.batches, "batched_crops": self.batched_crops}, []
+        raise ValueError(f"unknown op {op!r}")
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head_len, payload_len = _PREFIX.unpack(await reader.readexactly(_PREFIX.size))
+                except asyncio.IncompleteReadError:
+                    return  # client closed
+                header, arrays = _decode(await reader.readexactly(head_len), await reader.readexactly(payload_len))
+                try:
+                    out_header, out_arrays = await self._handle(header, arrays)
+                    out_header["ok"] = True
+                except Exception as e:
+                    logger.exception("inference request failed")
+                    out_header, out_arrays = {"ok": False, "error": str(e)}, []
+                for part in _encode(out_header, out_arrays):
+                    writer.write(part)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Listen on the socket until `stop` is set (or forever)."""
+        global _serving
+        _serving = True
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise RuntimeError(f"Another inference server is listening on {self.path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.path)  # stale socket from a crashed server
+            finally:
+                probe.close()
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_unix_server(self._serve_client, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.info("inference server listening on %s", self.path)
+        try:
+            async with server:
+                if stop is None:
+                    await server.serve_forever()
+                else:
+                    await stop.wait()
+        finally:
+            batcher.cancel()
+            self.executor.shutdown(wait=False)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
@@ -0,0 +1,130 @@
+"""
+Face quality gate and landmark alignment, run between detection and embedding.
+Cheap checks (size, detector score, sharpness, landmark pose) reject faces that would waste
+an embedding call or produce an unreliable match, e.g. tiny, blurred or profile faces at the
+back of the room. Accepted faces are aligned on the eye line using MTCNN landmarks.
+"""
+import math
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import numpy as np
+
+from app.ml.detector import DetectedFace
+
+# Rejection reasons (also used as metric labels and in API responses)
+TOO_SMALL = "too_small"
+LOW_CONFIDENCE = "low_confidence"
+BLURRY = "blurry"
+POSE = "pose"
+
+
+@dataclass(frozen=True)
+class QualityGate:
+    enabled: bool = True
+    min_size: int = 40
+    min_confidence: float = 0.90
+    min_sharpness: float = 20.0
+    max_yaw: float = 0.35
+
+    @classmethod
+    def from_config(cls) -> "QualityGate":
+        from app.config import (
+            FACE_QUALITY_GATE,
+            FACE_MIN_SIZE,
+            FACE_MIN_CONFIDENCE,
+            FACE_MIN_SHARPNESS,
+            FACE_MAX_YAW,
+        )
+        return cls(FACE_QUALITY_GATE, FACE_MIN_SIZE, FACE_MIN_CONFIDENCE, FACE_MIN_SHARPNESS, FACE_MAX_YAW)
+
+    def for_image(self, image: np.ndarray, tile_size: Optional[int] = None) -> "QualityGate":
+        """This gate, with the minimum face size lowered to DETECT_TILE_MIN_FACE if the image is detected in tiles."""
+        from app.config import DETECT_TILE_MIN_FACE
+        from app.ml.detector import is_tiled
+
+        if is_tiled(image, tile_size) and DETECT_TILE_MIN_FACE < self.min_size:
+            return replace(self, min_size=DETECT_TILE_MIN_FACE)
+        return self
+
+    def check(self, image: np.ndarray, face: DetectedFace) -> Optional[str]:
+        """Rejection reason for this face, or None if it should be embedded. Cheapest checks first."""
+        if not self.enabled:
+            return None
+        x, y, w, h = face.box
+        if min(w, h) < self.min_size:
+            return TOO_SMALL
+        if face.confidence < self.min_confidence:
+            return LOW_CONFIDENCE
+        yaw = estimate_yaw(face)
+        if yaw is not None and abs(yaw) > self.max_yaw:
+            return POSE
+        if sharpness(image[y:y + h, x:x + w]) < self.min_sharpness:
+            return BLURRY
+        return None
+
+
+def sharpness(crop: np.ndarray) -> float:
+    """Variance of the Laplacian on a 64x64 grayscale resize (scale-independent blur measure)."""
+    import cv2
+
+    if crop.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY) if crop.ndim == 3 else crop
+    gray = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def estimate_yaw(face: DetectedFace) -> Optional[float]:
+    """
+    Horizontal nose offset from the eye midpoint, in units of eye distance.
+    ~0 for a frontal face, grows towards +-0.5 and beyond as the head turns. None without landmarks.
+    """
+    kp = face.keypoints
+    if not all(k in kp for k in ("left_eye", "right_eye", "nose")):
+        return None
+    (lx, ly), (rx, ry), (nx, ny) = kp["left_eye"], kp["right_eye"], kp["nose"]
+    eye_dist = math.hypot(rx - lx, ry - ly)
+    if eye_dist < 1:
+        return None
+    # Project the nose onto the eye line so in-plane rotation (roll) doesn't count as yaw
+    ux, uy = (rx - lx) / eye_dist, (ry - ly) / eye_dist
+    mx, my = (lx + rx) / 2, (ly + ry) / 2
+    return ((nx - mx) * ux + (ny - my) * uy) / eye_dist
+
+
+def align_face(rgb: np.ndarray, face: DetectedFace, size: int = 160) -> Optional[np.ndarray]:
+    """
+    Rotate/scale so the eyes are level at fixed positions in a size x size crop.
+    Returns None if the face has no eye landmarks (caller falls back to a padded box crop).
+    """
+    import cv2
+
+    kp = face.keypoints
+    if "left_eye" not in kp or "right_eye" not in kp:
+        return None
+    (lx, ly), (rx, ry) = kp["left_eye"], kp["right_eye"]
+    eye_dist = math.hypot(rx - lx, ry - ly)
+    if eye_dist < 1:
+        return None
+    # Eyes land at (0.3, 0.38) and (0.7, 0.38) of the output: room for forehead and chin
+    desired_left = (0.30, 0.38)
+    desired_dist = (1.0 - 2 * desired_left[0]) * size
+    angle = math.degrees(math.atan2(ry - ly, rx - lx))
+    scale = desired_dist / eye_dist
+    center = ((lx + rx) / 2.0, (ly + ry) / 2.0)
+    m = cv2.getRotationMatrix2D(center, angle, scale)
+    m[0, 2] += size * 0.5 - center[0]
+    m[1, 2] += size * desired_left[1] - center[1]
+    return cv2.warpAffine(rgb, m, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def padded_crop(rgb: np.ndarray, face: DetectedFace, pad_ratio: float = 0.1) -> np.ndarray:
+    """Box crop expanded by pad_ratio (fallback when landmarks are unavailable)."""
+    x, y, w, h = face.box
+    pad = int(pad_ratio * max(w, h))
+    x1 = max(0, x - pad)
+    y1 = max(0, y - pad)
+    x2 = min(rgb.shape[1], x + w + pad)
+    y2 = min(rgb.shape[0], y + h + pad)
+    return rgb[y1:y2, x1:x2]
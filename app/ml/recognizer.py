@@ -2,20 +2,24 @@
 Face recognition using DeepFace (Facenet/ArcFace) embeddings.
 Extracts 128/512-dim embedding per face; matching is done via cosine/euclidean distance.
 """
+import threading
 import numpy as np
-from typing import List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 # DeepFace is used for representation (embedding) and verification
 _recognition_model = None
+_model_lock = threading.Lock()  # embeddings run in worker threads; load the model once
 
 
 def _get_model():
     global _recognition_model
     if _recognition_model is None:
-        import os
-        os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
-        from deepface import DeepFace
-        _recognition_model = DeepFace
+        with _model_lock:
+            if _recognition_model is None:
+                import os
+                os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+                from deepface import DeepFace
+                _recognition_model = DeepFace
     return _recognition_model
 
 
@@ -25,6 +29,11 @@ def get_embedding(image: np.ndarray, detector_backend: str = "mtcnn", model_name
     image: RGB numpy array (H, W, 3).
     Returns 128-d (Facenet) or 512-d (ArcFace) vector, or None if no face.
     """
+    from app.ml.inference import inference_client
+
+    client = inference_client()
+    if client is not None:
+        return client.represent(image, detector_backend, model_name)
     import tempfile
     import cv2
     try:
@@ -52,35 +61,174 @@ def get_embedding(image: np.ndarray, detector_backend: str = "mtcnn", model_name
     return None
 
 
+# model name -> Keras model behind DeepFace for batched predict, or False when unusable (e.g. stub models)
+_batch_models: Dict[str, object] = {}
+_batch_model_verified: Dict[str, bool] = {}  # batched output checked against DeepFace.represent once
+
+
+def _get_batch_model(model_name: str):
+    model = _batch_models.get(model_name)
+    if model is None:
+        with _model_lock:
+            model = _batch_models.get(model_name)
+            if model is None:
+                try:
+                    model = _get_model().build_model(model_name)
+                    if len(model.input_shape) != 4:
+                        model = False
+                except Exception:
+                    model = False
+                _batch_models[model_name] = model
+    return model
+
+
+def _preprocess_batch(crops: List[np.ndarray], size: Tuple[int, int]) -> np.ndarray:
+    """
+    Same input DeepFace.represent(detector_backend="skip") builds for one image: BGR, resized to fit
+    `size` keeping aspect ratio, zero-padded to it, scaled to [0, 1]. Stacked into one (N, H, W, 3) batch.
+    """
+    import cv2
+
+    batch = np.zeros((len(crops), size[0], size[1], 3), dtype=np.float32)
+    for i, crop in enumerate(crops):
+        bgr = cv2.cvtColor(crop, cv2.COLOR_RGB2BGR)
+        factor = min(size[0] / bgr.shape[0], size[1] / bgr.shape[1])
+        resized = cv2.resize(bgr, (int(bgr.shape[1] * factor), int(bgr.shape[0] * factor)))
+        top = (size[0] - resized.shape[0]) // 2
+        left = (size[1] - resized.shape[1]) // 2
+        batch[i, top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return batch / 255.0
+
+
+def embed_faces(
+    crops: List[np.ndarray],
+    model_name: str = "Facenet",
+    batch_size: int = 32,
+) -> List[Optional[np.ndarray]]:
+    """
+    Embed already-cropped, aligned faces (RGB arrays) without detection, `batch_size` crops per
+    model forward pass. The first batch is checked against the per-crop DeepFace path; if they
+    disagree (other DeepFace version / preprocessing), or the model cannot be batched, every
+    crop goes through get_embedding(detector_backend="skip") instead.
+    Returns one embedding (or None) per crop, in order.
+    """
+    if not crops:
+        return []
+    from app.ml.inference import inference_client
+
+    client = inference_client()
+    if client is not None:
+        return client.embed(crops, model_name)  # batched server-side, across callers
+    model = _get_batch_model(model_name)
+    if model is not False:
+        try:
+            size = tuple(model.input_shape[1:3])
+            out: List[Optional[np.ndarray]] = []
+            for start in range(0, len(crops), batch_size):
+                batch = _preprocess_batch(crops[start:start + batch_size], size)
+                vectors = model.predict(batch, verbose=0)
+                out.extend(np.asarray(v, dtype=np.float32) for v in vectors)
+            if _batch_model_verified.get(model_name) is None:
+                reference = get_embedding(crops[0], detector_backend="skip", model_name=model_name)
+                ok = reference is not None and cosine_distance(reference, out[0]) < 0.05
+                _batch_model_verified[model_name] = ok
+            if _batch_model_verified[model_name]:
+                return out
+        except Exception:
+            pass
+        _batch_models[model_name] = False
+    return [get_embedding(c, detector_backend="skip", model_name=model_name) for c in crops]
+
+
+class FaceEmbeddings(NamedTuple):
+    """Result of detect -> quality gate -> align -> embed for one image."""
+    faces: List[Tuple[Tuple[int, int, int, int], np.ndarray]]  # (bbox, embedding) per accepted face
+    detected: int  # faces found by the detector
+    rejected: Dict[str, int]  # quality-gate rejections by reason
+
+
+def extract_face_embeddings(
+    image: np.ndarray,
+    detector_backend: str = "mtcnn",
+    model_name: str = "Facenet",
+    gate=None,
+) -> FaceEmbeddings:
+    """
+    Detect faces, drop those failing the quality gate (size, score, pose, sharpness) before the
+    expensive embedding call, align the rest on their eye landmarks and embed them.
+    image: BGR or RGB numpy array. gate: app.ml.quality.QualityGate (default: from config).
+    """
+    import cv2
+    from app.ml.detector import detect_faces_full
+    from app.ml.quality import QualityGate, align_face, padded_crop
+    from app.metrics import timed_stage, FACES_DETECTED, FACES_REJECTED
+    from app.config import FACE_ALIGN_SIZE, EMBED_BATCH_SIZE
+
+    gate = (gate or QualityGate.from_config()).for_image(image)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.shape[2] == 3 else image
+    with timed_stage("detect"):
+        detections = detect_faces_full(image)
+    FACES_DETECTED.inc(len(detections))
+
+    accepted, rejected = [], {}
+    with timed_stage("quality"):
+        for face in detections:
+            reason = gate.check(rgb, face)
+            if reason:
+                rejected[reason] = rejected.get(reason, 0) + 1
+                FACES_REJECTED.inc(reason=reason)
+            else:
+                accepted.append(face)
+
+    embedded = []
+    with timed_stage("embed"):
+        aligned_faces, aligned_crops = [], []
+        for face in accepted:
+            aligned = align_face(rgb, face, size=FACE_ALIGN_SIZE)
+            if aligned is not None:
+                aligned_faces.append(face)
+                aligned_crops.append(aligned)
+                continue
+            crop = padded_crop(rgb, face)
+            if crop.size == 0:
+                continue
+            embedded.append((face, get_embedding(crop, detector_backend=detector_backend, model_name=model_name)))
+        # Already aligned on landmarks: no second detection, one batched forward pass
+        embedded += zip(aligned_faces, embed_faces(aligned_crops, model_name=model_name, batch_size=EMBED_BATCH_SIZE))
+    order = {id(face): i for i, face in enumerate(accepted)}
+    embedded.sort(key=lambda pair: order[id(pair[0])])
+    results = [(face.box, emb) for face, emb in embedded if emb is not None]
+    return FaceEmbeddings(results, len(detections), rejected)
+
+
 def get_embeddings_from_image(
     image: np.ndarray,
     detector_backend: str = "mtcnn",
     model_name: str = "Facenet",
 ) -> List[Tuple[Tuple[int, int, int, int], np.ndarray]]:
     """
-    Detect faces in image and return list of (bbox, embedding) for each face.
+    Detect faces in image and return list of (bbox, embedding) for each face passing the quality gate.
     image: BGR or RGB numpy array.
     """
-    import cv2
-    from app.ml.detector import detect_faces
+    return extract_face_embeddings(image, detector_backend=detector_backend, model_name=model_name).faces
 
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image.shape[2] == 3 else image
-    boxes = detect_faces(image)
-    results = []
-    for (x, y, w, h) in boxes:
-        # Expand slightly for better alignment
-        pad = int(0.1 * max(w, h))
-        x1 = max(0, x - pad)
-        y1 = max(0, y - pad)
-        x2 = min(image.shape[1], x + w + pad)
-        y2 = min(image.shape[0], y + h + pad)
-        crop = rgb[y1:y2, x1:x2]
-        if crop.size == 0:
-            continue
-        emb = get_embedding(crop, detector_backend=detector_backend, model_name=model_name)
-        if emb is not None:
-            results.append(((x, y, w, h), emb))
-    return results
+
+def update_mean_embedding(
+    current: Optional[np.ndarray],
+    count: int,
+    new_embeddings: List[np.ndarray],
+) -> Tuple[np.ndarray, int]:
+    """
+    Fold new embeddings into a stored running mean without the original photos.
+    current: stored mean (or None), count: number of embeddings it averages.
+    Returns (new mean as float32, new count).
+    """
+    new_sum = np.sum(new_embeddings, axis=0, dtype=np.float64)
+    n = len(new_embeddings)
+    if current is None or count <= 0:
+        return (new_sum / n).astype(np.float32), n
+    total = np.asarray(current, dtype=np.float64) * count + new_sum
+    return (total / (count + n)).astype(np.float32), count + n
 
 
 def cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
@@ -94,6 +242,67 @@ def euclidean_distance(a: np.ndarray, b: np.ndarray) -> float:
     return float(np.linalg.norm(a.flatten() - b.flatten()))
 
 
+def distance_matrix(queries: np.ndarray, gallery: np.ndarray, metric: str = "cosine") -> np.ndarray:
+    """
+    Vectorized distances between every query row and every gallery row.
+    queries: (Q, D), gallery: (N, D). Returns (Q, N) float32; same semantics as
+    cosine_distance / euclidean_distance, computed in one matrix product.
+    """
+    q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    g = np.atleast_2d(np.asarray(gallery, dtype=np.float32))
+    dots = q @ g.T
+    q_norm = np.linalg.norm(q, axis=1)[:, None]
+    g_norm = np.linalg.norm(g, axis=1)[None, :]
+    if metric == "cosine":
+        return 1.0 - dots / (q_norm * g_norm + 1e-8)
+    sq = q_norm ** 2 + g_norm ** 2 - 2.0 * dots
+    return np.sqrt(np.maximum(sq, 0.0))
+
+
+def match_embeddings(
+    queries: np.ndarray,
+    gallery: np.ndarray,
+    metric: str = "cosine",
+    threshold_cosine: float = 0.6,
+    threshold_euclidean: float = 10.0,
+) -> List[Optional[Tuple[int, float]]]:
+    """
+    Match every query row against a gallery matrix in one vectorized pass.
+    Returns, per query, (gallery row index, distance) if within threshold, else None.
+    """
+    if len(queries) == 0 or len(gallery) == 0:
+        return [None] * len(queries)
+    best, best_dist, _second, _second_dist = rank_matches(queries, gallery, metric=metric)
+    threshold = threshold_cosine if metric == "cosine" else threshold_euclidean
+    return [
+        (int(i), float(d)) if d <= threshold else None
+        for i, d in zip(best, best_dist)
+    ]
+
+
+def rank_matches(
+    queries: np.ndarray,
+    gallery: np.ndarray,
+    metric: str = "cosine",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Nearest and runner-up gallery rows per query, no threshold (the margin between them is what
+    threshold tuning looks at). Returns (best index, best distance, runner-up index, runner-up
+    distance); the runner-up is -1 / NaN when the gallery has a single row.
+    """
+    dists = distance_matrix(queries, gallery, metric=metric)
+    rows = np.arange(len(dists))
+    if dists.shape[1] < 2:
+        best = np.zeros(len(dists), dtype=np.int64)
+        return best, dists[rows, best], np.full(len(dists), -1), np.full(len(dists), np.nan, dtype=np.float32)
+    top2 = np.argpartition(dists, 1, axis=1)[:, :2]
+    d2 = dists[rows[:, None], top2]
+    order = np.argsort(d2, axis=1)
+    top2 = np.take_along_axis(top2, order, axis=1)
+    d2 = np.take_along_axis(d2, order, axis=1)
+    return top2[:, 0], d2[:, 0], top2[:, 1], d2[:, 1]
+
+
 def find_best_match(
     query_embedding: np.ndarray,
     known_embeddings: List[Tuple[str, str, np.ndarray]],
@@ -105,16 +314,14 @@ def find_best_match(
     known_embeddings: list of (student_id, name, embedding).
     Returns (student_id, name, distance) of best match if within threshold, else None.
     """
-    best_id, best_name, best_dist = None, None, float("inf")
-    for sid, name, emb in known_embeddings:
-        if metric == "cosine":
-            d = cosine_distance(query_embedding, emb)
-            if d < best_dist and d <= threshold_cosine:
-                best_dist, best_id, best_name = d, sid, name
-        else:
-            d = euclidean_distance(query_embedding, emb)
-            if d < best_dist and d <= threshold_euclidean:
-                best_dist, best_id, best_name = d, sid, name
-    if best_id is None:
+    if not known_embeddings:
+        return None
+    gallery = np.stack([emb.flatten() for _sid, _name, emb in known_embeddings])
+    dists = distance_matrix(query_embedding.flatten(), gallery, metric=metric)[0]
+    best = int(np.argmin(dists))
+    best_dist = float(dists[best])
+    threshold = threshold_cosine if metric == "cosine" else threshold_euclidean
+    if best_dist > threshold:
         return None
-    return (best_id, best_name, best_dist)
+    sid, name, _emb = known_embeddings[best]
+    return (sid, name, best_dist)
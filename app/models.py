@@ -1,15 +1,34 @@
 """
-SQLAlchemy models: User (role-based), Student, Attendance.
+SQLAlchemy models: User (role-based), Student, Attendance, course/section rosters
+(Course, Section, SectionEnrollment, ClassSession), per-model embeddings
+(EmbeddingModel, StudentEmbedding) and the recognition event log (RecognitionEvent).
 Student stores ID, name; face embeddings stored in files keyed by student_id.
 """
 from datetime import date, datetime
-from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
-from pgvector.sqlalchemy import Vector
+from sqlalchemy.types import TypeDecorator, UserDefinedType
 
 from app.database import Base
 
 
+class EmbeddingVector(TypeDecorator):
+    """
+    pgvector ``Vector`` column. pgvector (and numpy, which it imports) is only
+    loaded when the column is first compiled or bound, not at module import.
+    """
+    impl = UserDefinedType
+    cache_ok = True
+
+    def __init__(self, dim=None):
+        super().__init__()
+        self.dim = dim
+
+    def load_dialect_impl(self, dialect):
+        from pgvector.sqlalchemy import Vector
+        return dialect.type_descriptor(Vector(self.dim))
+
+
 class User(Base):
     """User for login (Admin / Faculty)."""
     __tablename__ = "users"
@@ -31,26 +50,174 @@ class Student(Base):
     student_id = Column(String(50), unique=True, index=True, nullable=False)  # e.g. "STU001"
     name = Column(String(255), nullable=False)
     # Path to folder: uploads/<student_id>/ and embeddings/<student_id>.npy
-    # For Supabase/Postgres:
-    embedding = Column(Vector(128)) 
-    
+    # For Supabase/Postgres: embedding under the active model (see EmbeddingModel); any dimension
+    embedding = Column(EmbeddingVector())
+    # Number of face embeddings averaged into `embedding` (running mean; new photos update it incrementally)
+    embedding_count = Column(Integer, default=0, nullable=False, server_default="0")
+    embedding_model = Column(String(50), nullable=True)  # model that produced `embedding` (NULL: legacy, active)
+
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     attendances = relationship("Attendance", back_populates="student")
+    enrollments = relationship("SectionEnrollment", back_populates="student")
+
+
+class EmbeddingModel(Base):
+    """
+    A face recognition model embeddings were computed with. Exactly one is `active` (matched against);
+    a model being rolled out is `building` until the re-embed job switches over; the previous one is `retired`.
+    """
+    __tablename__ = "embedding_models"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), unique=True, nullable=False)  # DeepFace model name, e.g. "Facenet", "ArcFace"
+    version = Column(String(50), nullable=True)  # e.g. DeepFace / weights version
+    dim = Column(Integer, nullable=True)
+    state = Column(String(20), nullable=False, default="building")  # building | active | retired
+    created_at = Column(DateTime, default=datetime.utcnow)
+    activated_at = Column(DateTime, nullable=True)
+
+
+class StudentEmbedding(Base):
+    """
+    A student's enrollment embedding under one model; embeddings of several models (and dimensions)
+    live side by side. Written by the re-embed job for the model being built, and for the retired
+    model when the gallery switches over; Student.embedding holds the active model's.
+    """
+    __tablename__ = "student_embeddings"
+    __table_args__ = (UniqueConstraint("student_id", "model", name="uq_student_embedding_model"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    model = Column(String(50), nullable=False)
+    model_version = Column(String(50), nullable=True)
+    embedding = Column(EmbeddingVector())  # NULL: no usable face in the student's photos
+    embedding_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Course(Base):
+    """A course, e.g. CS101; taught in one or more sections."""
+    __tablename__ = "courses"
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(50), unique=True, index=True, nullable=False)  # e.g. "CS101"
+    name = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    sections = relationship("Section", back_populates="course")
+
+
+class Section(Base):
+    """One class group of a course (e.g. CS101 / A, Fall 2024) with its own roster."""
+    __tablename__ = "sections"
+
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, ForeignKey("courses.id"), nullable=False, index=True)
+    name = Column(String(100), nullable=False)  # e.g. "A"
+    term = Column(String(50), nullable=True)  # e.g. "2024-FALL"
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    course = relationship("Course", back_populates="sections")
+    enrollments = relationship("SectionEnrollment", back_populates="section")
+
+    __table_args__ = (UniqueConstraint("course_id", "name", "term", name="uq_section_course_name_term"),)
+
+
+class SectionEnrollment(Base):
+    """Roster entry: student belongs to section."""
+    __tablename__ = "section_enrollments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    section_id = Column(Integer, ForeignKey("sections.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    section = relationship("Section", back_populates="enrollments")
+    student = relationship("Student", back_populates="enrollments")
+
+    # Leading section_id: loading a roster is one index range scan
+    __table_args__ = (UniqueConstraint("section_id", "student_id", name="uq_section_student"),)
+
+
+class ClassSession(Base):
+    """One meeting of a section on a date; attendance taken for a section is keyed by it."""
+    __tablename__ = "class_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    section_id = Column(Integer, ForeignKey("sections.id"), nullable=False)
+    date = Column(Date, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint("section_id", "date", name="uq_section_date"),)
 
 
 class Attendance(Base):
-    """One record per student per day: prevents duplicate marking."""
+    """
+    One record per student per class session, or per student per day for institution-wide
+    marking (session_id NULL): prevents duplicate marking.
+    """
     __tablename__ = "attendance"
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("class_sessions.id"), nullable=True)
     date = Column(Date, nullable=False)
     status = Column(String(20), default="Present")  # Present | Absent
     marked_at = Column(DateTime, default=datetime.utcnow)
-    source = Column(String(50), nullable=True)  # "camera" | "image_upload"
+    source = Column(String(50), nullable=True)  # "camera" | "image_upload" | "face_upload" | "device:<device_id>"
 
     student = relationship("Student", back_populates="attendances")
 
-    __table_args__ = (UniqueConstraint("student_id", "date", name="uq_student_date"),)
+    __table_args__ = (
+        # Institution-wide rows: one per student per day
+        Index(
+            "uq_student_date",
+            "student_id",
+            "date",
+            unique=True,
+            sqlite_where=text("session_id IS NULL"),
+            postgresql_where=text("session_id IS NULL"),
+        ),
+        # Section rows: one per student per session (NULL session_ids never collide).
+        # date is implied by the session; it is included so the key also works on the
+        # month-partitioned Postgres table (unique keys must contain the partition column)
+        UniqueConstraint("session_id", "student_id", "date", name="uq_session_student"),
+        # Day and range reads filter on date alone; uq_student_date leads with student_id
+        Index("ix_attendance_date", "date"),
+        # Change feed: keyset scan in (marked_at, id) order
+        Index("ix_attendance_marked_at", "marked_at", "id"),
+    )
+
+
+class RecognitionEvent(Base):
+    """
+    One face seen by a recognition pass: where it was, the nearest and runner-up enrolled students
+    and their distances, and whether it matched. Written in bulk behind the marking path
+    (app.services.recognition_log); student ids are the public codes, so events outlive deletions.
+    """
+    __tablename__ = "recognition_events"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    date = Column(Date, nullable=False)  # attendance day the pass was for
+    batch_id = Column(String(32), nullable=False)  # faces of one image / request / frame share it
+    source = Column(String(50), nullable=True)  # same tag as Attendance.source
+    section_id = Column(Integer, nullable=True)
+    session_id = Column(Integer, nullable=True)
+    model = Column(String(50), nullable=True)
+    box_x = Column(Integer, nullable=True)
+    box_y = Column(Integer, nullable=True)
+    box_w = Column(Integer, nullable=True)
+    box_h = Column(Integer, nullable=True)
+    matched_student_id = Column(String(50), nullable=True)  # NULL: best distance above threshold
+    best_student_id = Column(String(50), nullable=True)
+    best_distance = Column(Float, nullable=True)
+    runner_up_student_id = Column(String(50), nullable=True)
+    runner_up_distance = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_recognition_events_date", "date"),
+        Index("ix_recognition_events_best_student", "best_student_id"),
+    )
@@ -0,0 +1,231 @@
+"""
+On-demand request profiling for production debugging.
+
+An admin adds ?profile=1 (or the header X-Profile: 1) to any request; `profile=cprofile` asks
+for the deterministic profiler instead. PROFILE_SAMPLE_RATE profiles that fraction of all
+requests with the sampler, for continuous low-overhead profiling. The response carries
+X-Profile-Id; the profile is downloadable from /api/admin/profiles/<id> once the body is sent.
+
+- sample: a background thread records the stack of every thread every PROFILE_INTERVAL_MS, so
+  the work DeepFace / MTCNN do in worker threads is included. Written as folded stacks
+  (`thread;outer;...;inner count`), which flamegraph.pl and speedscope read.
+- cprofile: cProfile on the event-loop thread (routing, SQLAlchemy, serialization; thread-pool
+  work shows as time awaiting it). Written as a pstats file (snakeviz, `python -m pstats`).
+
+One request per worker is profiled at a time (others run unprofiled); both profilers see the
+whole process, so concurrent requests on the same worker leak into a profile. PROFILE_DIR
+keeps the newest PROFILE_KEEP profiles.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as Tally
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from app.config import PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL_MS, PROFILE_KEEP
+from app.metrics import PROFILES_CAPTURED
+
+MODES = ("sample", "cprofile")
+EXTENSIONS = {"sample": ".folded", "cprofile": ".prof"}
+PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+# Leaf frames of threads parked in a pool / queue: skipped so idle workers do not fill the profile
+_IDLE = {("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+_busy = threading.Lock()  # one profiled request per process at a time
+
+
+class StackSampler:
+    """Counts the stacks of every other thread, sampled every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Tally = Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def requested_mode(scope) -> Optional[str]:
+    """Profiler asked for by ?profile= or X-Profile (1/true/sample/cprofile), or None."""
+    value = None
+    for name, raw in scope.get("headers") or ():
+        if name == b"x-profile":
+            value = raw.decode("latin-1")
+    raw_query = scope.get("query_string", b"")
+    if b"profile" in raw_query:  # parse only when present: this runs on every request
+        query = parse_qs(raw_query.decode("latin-1"))
+        if "profile" in query:
+            value = query["profile"][-1]
+    if value is None:
+        return None
+    value = value.strip().lower()
+    if value in ("1", "true", "yes"):
+        return "sample"
+    return value if value in MODES else None
+
+
+def _bearer(scope) -> Optional[str]:
+    for name, raw in scope.get("headers") or ():
+        if name == b"authorization":
+            scheme, _, token = raw.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    return None
+
+
+def list_profiles(root: Path = PROFILE_DIR) -> List[dict]:
+    """Metadata of the stored profiles, newest first."""
+    out = []
+    try:
+        sidecars = sorted(root.glob("*.json"), reverse=True)
+    except OSError:
+        return out
+    for path in sidecars:
+        try:
+            out.append(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_file(profile_id: str, root: Path = PROFILE_DIR) -> Optional[Path]:
+    """Path of a stored profile, or None (unknown or malformed id)."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    for ext in EXTENSIONS.values():
+        path = root / f"{profile_id}{ext}"
+        if path.is_file():
+            return path
+    return None
+
+
+def prune_profiles(root: Path = PROFILE_DIR, keep: int = PROFILE_KEEP) -> None:
+    """Delete all but the newest `keep` profiles (ids sort by time)."""
+    try:
+        ids = sorted({p.stem for p in root.iterdir() if PROFILE_ID.match(p.stem)}, reverse=True)
+    except OSError:
+        return
+    for old in ids[keep:]:
+        for ext in (".json", *EXTENSIONS.values()):
+            try:
+                (root / f"{old}{ext}").unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: profiles admin-flagged and rate-sampled requests (streaming bodies included)."""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, root: Path = PROFILE_DIR):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.root = root
+
+    def _mode(self, scope):
+        mode = requested_mode(scope)
+        if mode is not None:
+            from app.routers.auth import token_role
+            if token_role(_bearer(scope)) == "admin":
+                return mode, "admin"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample", "rate"
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        mode, trigger = self._mode(scope)
+        if mode is None or not _busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status = {}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            if mode == "cprofile":
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                profiler = StackSampler(PROFILE_INTERVAL_MS / 1000.0)
+                profiler.start()
+            started = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                elapsed = time.perf_counter() - started
+                if mode == "cprofile":
+                    profiler.disable()
+                else:
+                    profiler.stop()
+                self._write(profile_id, mode, trigger, profiler, scope, status.get("code"), elapsed)
+        finally:
+            _busy.release()
+
+    def _write(self, profile_id, mode, trigger, profiler, scope, status, elapsed) -> None:
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self.root / f"{profile_id}{EXTENSIONS[mode]}"
+            if mode == "cprofile":
+                profiler.dump_stats(str(path))
+            else:
+                path.write_text(profiler.folded(), encoding="utf-8")
+            meta = {
+                "id": profile_id,
+                "mode": mode,
+                "trigger": trigger,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 1),
+                "samples": profiler.samples if mode == "sample" else None,
+                "created_at": datetime.utcnow().isoformat() + "Z",
+                "file": path.name,
+            }
+            # Sidecar last: a profile is listed only once complete
+            (self.root / f"{profile_id}.json").write_text(json.dumps(meta), encoding="utf-8")
+        except OSError:
+            return
+        PROFILES_CAPTURED.inc(mode=mode, trigger=trigger)
+        prune_profiles(self.root, PROFILE_KEEP)
@@ -0,0 +1,30 @@
+"""
+Admin-only endpoints: stored request profiles (see app/profiling.py).
+"""
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app.models import User
+from app.profiling import list_profiles, profile_file
+from app.routers.auth import require_admin
+from app.schemas import ProfileInfo
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+@router.get("/profiles", response_model=List[ProfileInfo])
+async def profiles(_admin: User = Depends(require_admin)):
+    """Stored profiles, newest first."""
+    return list_profiles()
+
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, _admin: User = Depends(require_admin)):
+    """Folded stacks (sample) or a pstats file (cprofile)."""
+    path = profile_file(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain; charset=utf-8" if path.suffix == ".folded" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=path.name)
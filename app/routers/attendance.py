@@ -1,133 +1,566 @@
 """
 Mark attendance from image (camera frame or upload), get daily summary, list records.
+mark-from-faces takes faces already cropped on the device and skips detection;
+mark-from-embeddings takes vectors computed on the device and skips all image work.
+Pass section_id to take attendance for one section: faces are matched against its roster only
+and records are keyed by the section's class session for the day.
+The read endpoints send an ETag derived from a cheap change token and answer If-None-Match with 304.
+Every face the mark-* endpoints see is kept in the recognition log (/recognition-events).
+/changes streams inserts and updates since a cursor as NDJSON, for mirrors that sync incrementally.
 """
+import asyncio
 from datetime import date, timedelta
 from typing import List, Optional
 
-import numpy as np
-import cv2
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
-from sqlalchemy import select, func
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import MAX_FACES_PER_REQUEST, CHANGE_FEED_MAX_ROWS
 from app.database import get_db
-from app.models import Student, Attendance
-from app.schemas import AttendanceMark, AttendanceRecordResponse, AttendanceSummary
-from app.services.face_engine import recognize_from_image
-from app.services.attendance_service import mark_recognized_and_fill_absent
+from app.metrics import start_request_timings, timed_stage, server_timing_header
+from app.models import Student, Attendance, SectionEnrollment, RecognitionEvent
+from app.schemas import (
+    AttendanceMark,
+    AttendanceRecordResponse,
+    AttendanceSummary,
+    DistanceHistogram,
+    EmbeddingBatch,
+    RecognitionEventPage,
+    RecognitionEventResponse,
+    StudentAttendanceStatsPage,
+)
+from app.services.admission import admission
+from app.services.attendance_service import (
+    attendance_scope,
+    range_scope,
+    attendance_change_token,
+    mark_recognized_and_fill_absent,
+)
+from app.services.archive import archived_statuses, is_archived_day, read_archived
+from app.services.attendance_stats import SORT_FIELDS, student_attendance_stats, filter_and_sort
+from app.services.recognition_log import log_recognition
+from app.services.response_cache import conditional_json
+from app.services.rosters import get_section, get_class_session, get_or_create_class_session, get_roster_pks
 
 router = APIRouter(prefix="/api/attendance", tags=["attendance"])
 
 
 @router.post("/mark-from-image")
 async def mark_attendance_from_image(
+    response: Response,
     file: UploadFile = File(...),
     attendance_date: Optional[date] = Query(None),
+    section_id: Optional[int] = Query(None),
+    _slot: None = Depends(admission("mark_from_image")),  # before get_db: no DB connection held while queued
     session: AsyncSession = Depends(get_db),
 ):
-    """Upload an image (classroom photo); recognize faces and mark present for the day. No duplicate per student per day."""
+    """
+    Upload an image (classroom photo); recognize faces and mark present for the day. No duplicate per student per day.
+    With section_id, only the section's roster is matched and marked (absent-fill covers the roster only).
+    Returns 503 with Retry-After when the worker is saturated.
+    """
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Please upload an image file")
+    if section_id is not None and not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    # Heavy imports (OpenCV, NumPy, TF via the face engine) are deferred to first use
+    import numpy as np
+    import cv2
+    from app.services.face_engine import recognize_from_image
+
+    timings = start_request_timings()
     data = await file.read()
-    npy = np.frombuffer(data, np.uint8)
-    img = cv2.imdecode(npy, cv2.IMREAD_COLOR)
+    with timed_stage("decode"):
+        npy = np.frombuffer(data, np.uint8)
+        img = await asyncio.to_thread(cv2.imdecode, npy, cv2.IMREAD_COLOR)
     if img is None:
         raise HTTPException(status_code=400, detail="Could not decode image")
     day = attendance_date or date.today()
-    recognized = await recognize_from_image(session, img)
-    marked = await mark_recognized_and_fill_absent(session, recognized, day, source="image_upload")
+    _ensure_open(day)
+    result = await recognize_from_image(session, img, section_id=section_id)
+    recognized = result.recognized
+    class_session = await get_or_create_class_session(session, section_id, day) if section_id is not None else None
+    marked = await mark_recognized_and_fill_absent(
+        session, recognized, day, source="image_upload", class_session=class_session
+    )
+    log_recognition(result, day, "image_upload", section_id=section_id, class_session=class_session)
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return {
+        "date": str(day),
+        "section_id": section_id,
+        "session_id": class_session.id if class_session is not None else None,
+        "recognized": [{"student_id": s[0], "name": s[1], "confidence": s[2]} for s in recognized],
+        "marked_present": marked,
+        "faces_detected": result.faces_detected,
+        "rejected_faces": result.rejected,
+    }
+
+
+@router.post("/mark-from-faces")
+async def mark_attendance_from_faces(
+    response: Response,
+    faces: List[UploadFile] = File(...),
+    attendance_date: Optional[date] = Query(None),
+    section_id: Optional[int] = Query(None),
+    _slot: None = Depends(admission("mark_from_faces")),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Upload faces already detected, cropped and aligned on the device (one image part per face,
+    repeated `faces` field). Skips server-side detection: crops are embedded in batches, matched
+    and marked present like mark-from-image (same section_id semantics, absent-fill and response).
+    Parts that are not decodable images are counted under rejected_faces["undecodable"].
+    """
+    if len(faces) > MAX_FACES_PER_REQUEST:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FACES_PER_REQUEST} faces per request")
+    if section_id is not None and not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    import numpy as np
+    import cv2
+    from app.services.face_engine import recognize_from_faces
+
+    def decode(payloads: List[bytes]) -> list:
+        crops = []
+        for data in payloads:
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            crops.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB) if img is not None and img.size else None)
+        return crops
+
+    timings = start_request_timings()
+    payloads = [await part.read() for part in faces]
+    with timed_stage("decode"):
+        decoded = await asyncio.to_thread(decode, payloads)
+    crops = [crop for crop in decoded if crop is not None]
+    if not crops:
+        raise HTTPException(status_code=400, detail="No decodable face images")
+    day = attendance_date or date.today()
+    _ensure_open(day)
+    result = await recognize_from_faces(session, crops, section_id=section_id)
+    recognized = result.recognized
+    class_session = await get_or_create_class_session(session, section_id, day) if section_id is not None else None
+    marked = await mark_recognized_and_fill_absent(
+        session, recognized, day, source="face_upload", class_session=class_session
+    )
+    log_recognition(result, day, "face_upload", section_id=section_id, class_session=class_session)
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    undecodable = len(decoded) - len(crops)
+    return {
+        "date": str(day),
+        "section_id": section_id,
+        "session_id": class_session.id if class_session is not None else None,
+        "recognized": [{"student_id": s[0], "name": s[1], "confidence": s[2]} for s in recognized],
+        "marked_present": marked,
+        "faces_detected": result.faces_detected,
+        "rejected_faces": {"undecodable": undecodable} if undecodable else {},
+    }
+
+
+@router.post("/mark-from-embeddings")
+async def mark_attendance_from_embeddings(
+    response: Response,
+    batch: EmbeddingBatch,
+    attendance_date: Optional[date] = Query(None),
+    section_id: Optional[int] = Query(None),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Mark attendance from face embeddings computed on the device (with the active enrollment model).
+    The vectors are matched against the gallery (or section roster) in one vectorized call and
+    marked in bulk; no image is decoded or embedded on the server. The day is attendance_date,
+    else the date of captured_at, else today. Records are tagged with source "device:<device_id>".
+    """
+    if section_id is not None and not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    import base64
+    import binascii
+    import numpy as np
+    from app.services.face_engine import recognize_from_embeddings
+
+    timings = start_request_timings()
+    with timed_stage("decode"):
+        try:
+            raw = base64.b64decode(batch.embeddings, validate=True)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=422, detail="embeddings must be base64")
+        if batch.dim <= 0 or len(raw) % (4 * batch.dim):
+            raise HTTPException(status_code=422, detail=f"embeddings length is not a multiple of {batch.dim} float32 values")
+        vectors = np.frombuffer(raw, dtype="<f4").reshape(-1, batch.dim).astype(np.float32)
+    if len(vectors) == 0:
+        raise HTTPException(status_code=422, detail="No embeddings")
+    if len(vectors) > MAX_FACES_PER_REQUEST:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FACES_PER_REQUEST} embeddings per request")
+    if not np.isfinite(vectors).all():
+        raise HTTPException(status_code=422, detail="embeddings contain NaN or infinite values")
+
+    day = attendance_date or (batch.captured_at.date() if batch.captured_at else date.today())
+    _ensure_open(day)
+    try:
+        result = await recognize_from_embeddings(session, vectors, section_id=section_id, model=batch.model)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    recognized = result.recognized
+    class_session = await get_or_create_class_session(session, section_id, day) if section_id is not None else None
+    marked = await mark_recognized_and_fill_absent(
+        session, recognized, day, source=f"device:{batch.device_id}"[:50], class_session=class_session
+    )
+    log_recognition(result, day, f"device:{batch.device_id}"[:50], section_id=section_id, class_session=class_session)
+    response.headers["Server-Timing"] = server_timing_header(timings)
     return {
         "date": str(day),
+        "device_id": batch.device_id,
+        "section_id": section_id,
+        "session_id": class_session.id if class_session is not None else None,
         "recognized": [{"student_id": s[0], "name": s[1], "confidence": s[2]} for s in recognized],
         "marked_present": marked,
+        "embeddings_received": len(vectors),
     }
 
 
+def _ensure_open(day: date) -> None:
+    if is_archived_day(day):
+        raise HTTPException(status_code=409, detail=f"{day.strftime('%Y-%m')} is archived and closed to marking")
+
+
+async def _day_scope(session: AsyncSession, day: date, section_id: Optional[int]):
+    """WHERE clause for a day's institution-wide rows, or the section's session rows (None: no session that day)."""
+    if section_id is None:
+        return attendance_scope(day)
+    if not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    class_session = await get_class_session(session, section_id, day)
+    return attendance_scope(day, class_session) if class_session is not None else None
+
+
 @router.get("/records", response_model=List[AttendanceRecordResponse])
 async def get_attendance_records(
+    request: Request,
     day: Optional[date] = Query(None),
+    section_id: Optional[int] = Query(None),
     session: AsyncSession = Depends(get_db),
 ):
-    """Get attendance records for a day (default today). Each student has one row: Present or Absent."""
+    """Get attendance records for a day (default today), optionally for one section. Each student has one row: Present or Absent."""
     day = day or date.today()
-    result = await session.execute(
-        select(Attendance, Student)
-        .join(Student, Attendance.student_id == Student.id)
-        .where(Attendance.date == day)
-    )
-    rows = []
-    for att, stu in result.all():
-        rows.append(AttendanceRecordResponse(
-            id=att.id,
-            student_id=stu.student_id,
-            student_name=stu.name,
-            date=att.date,
-            status=att.status,
-            marked_at=att.marked_at,
-        ))
-    return rows
+    scope = await _day_scope(session, day, section_id)
+    token = await attendance_change_token(session, scope) if scope is not None else "none"
+
+    async def build():
+        rows, shadow = [], set()
+        if scope is not None:
+            result = await session.execute(
+                select(Attendance, Student)
+                .join(Student, Attendance.student_id == Student.id)
+                .where(scope)
+            )
+            for att, stu in result.all():
+                shadow.add((att.student_id, att.date))
+                rows.append(AttendanceRecordResponse(
+                    id=att.id,
+                    student_id=stu.student_id,
+                    student_name=stu.name,
+                    date=att.date,
+                    status=att.status,
+                    marked_at=att.marked_at,
+                ))
+        archived = read_archived(day, day, section_id, shadow=shadow)
+        if archived is not None:
+            pks = [int(pk) for pk in archived["student_pk"]]
+            result = await session.execute(select(Student.id, Student.name).where(Student.id.in_(pks)))
+            names = dict(result.all())
+            for i, pk in enumerate(pks):
+                if pk not in names:
+                    continue  # student deleted since archiving
+                rows.append(AttendanceRecordResponse(
+                    id=int(archived["id"][i]),
+                    student_id=str(archived["student_id"][i]),
+                    student_name=names[pk],
+                    date=day,
+                    status="Present" if archived["status"][i] else "Absent",
+                    marked_at=archived["marked_at"][i].astype(object),
+                ))
+        return rows
+
+    return await conditional_json(request, ("records", day, section_id), token, build)
 
 
 @router.get("/summary", response_model=AttendanceSummary)
 async def get_daily_summary(
+    request: Request,
     day: Optional[date] = Query(None),
+    section_id: Optional[int] = Query(None),
     session: AsyncSession = Depends(get_db),
 ):
     day = day or date.today()
-    result = await session.execute(select(Attendance).where(Attendance.date == day))
-    records = result.scalars().all()
-    total = len(records)
-    present = sum(1 for r in records if r.status == "Present")
-    absent = total - present
-    pct = (present / total * 100) if total else 0.0
-    return AttendanceSummary(
-        date=day,
-        total_students=total,
-        present_count=present,
-        absent_count=absent,
-        present_percent=round(pct, 2),
-    )
+    scope = await _day_scope(session, day, section_id)
+    token = await attendance_change_token(session, scope) if scope is not None else "none"
+
+    async def build():
+        live = []
+        if scope is not None:
+            result = await session.execute(select(Attendance.student_id, Attendance.status).where(scope))
+            live = result.all()
+        # A live row for an archived day wins over the archived one
+        shadow = {(pk, day) for pk, _status in live}
+        statuses = [status for _pk, status in live]
+        statuses += [status for _pk, _day, status in archived_statuses(day, day, section_id, shadow=shadow)]
+        total = len(statuses)
+        present = sum(1 for status in statuses if status == "Present")
+        absent = total - present
+        pct = (present / total * 100) if total else 0.0
+        return AttendanceSummary(
+            date=day,
+            total_students=total,
+            present_count=present,
+            absent_count=absent,
+            present_percent=round(pct, 2),
+        )
+
+    return await conditional_json(request, ("summary", day, section_id), token, build)
 
 
 @router.get("/summary-range")
 async def get_summary_range(
+    request: Request,
     from_date: date = Query(...),
     to_date: date = Query(...),
+    section_id: Optional[int] = Query(None),
     session: AsyncSession = Depends(get_db),
 ):
-    """Daily summaries for each day in range."""
-    result = await session.execute(select(Student))
-    students = result.scalars().all()
-    total_students = len(students)
+    """Daily summaries for each day in range (for one section: over its roster and sessions)."""
+    where = range_scope(from_date, to_date, section_id)
+    if section_id is not None:
+        if not await get_section(session, section_id):
+            raise HTTPException(status_code=404, detail="Section not found")
+        total_students = len(await get_roster_pks(session, section_id))
+    else:
+        total_students = (await session.execute(select(func.count(Student.id)))).scalar_one()
     if total_students == 0:
         return []
-    result = await session.execute(
-        select(Attendance.date, Attendance.status)
-        .where(Attendance.date >= from_date, Attendance.date <= to_date)
+    token = f"{total_students}|{await attendance_change_token(session, where)}"
+
+    async def build():
+        live = (await session.execute(select(Attendance.student_id, Attendance.date, Attendance.status).where(where))).all()
+        shadow = {(pk, d) for pk, d, _status in live}
+        rows = [(d, status) for _pk, d, status in live]
+        rows += [(d, status) for _pk, d, status in archived_statuses(from_date, to_date, section_id, shadow=shadow)]
+        by_date = {}
+        for d, status in rows:
+            if d not in by_date:
+                by_date[d] = {"present": 0, "absent": 0}
+            if status == "Present":
+                by_date[d]["present"] += 1
+            else:
+                by_date[d]["absent"] += 1
+        out = []
+        current = from_date
+        while current <= to_date:
+            data = by_date.get(current, {"present": 0, "absent": 0})
+            present = data["present"]
+            absent = data["absent"]
+            missing = total_students - present - absent
+            absent += missing
+            pct = (present / total_students * 100) if total_students else 0
+            out.append({
+                "date": str(current),
+                "total_students": total_students,
+                "present_count": present,
+                "absent_count": absent,
+                "present_percent": round(pct, 2),
+            })
+            current += timedelta(days=1)
+        return out
+
+    return await conditional_json(request, ("summary-range", from_date, to_date, section_id), token, build)
+
+
+@router.get("/changes")
+async def get_attendance_changes(
+    since: Optional[str] = Query(None, description="Cursor from the previous sync (omit for the full history)"),
+    section_id: Optional[int] = Query(None),
+    limit: int = Query(CHANGE_FEED_MAX_ROWS, ge=1, le=CHANGE_FEED_MAX_ROWS),
+):
+    """
+    Attendance inserts and updates after `since`, oldest first, streamed as NDJSON
+    (application/x-ndjson): one "change" object per line, each carrying its own cursor, then an
+    "end" line with the cursor to pass next time and "more": true when `limit` cut the batch short.
+    """
+    from app.services.change_feed import parse_cursor, stream_changes
+
+    try:
+        cursor = parse_cursor(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return StreamingResponse(stream_changes(cursor, section_id, limit), media_type="application/x-ndjson")
+
+
+@router.get("/student-stats", response_model=StudentAttendanceStatsPage)
+async def get_student_stats(
+    request: Request,
+    from_date: date = Query(...),
+    to_date: date = Query(...),
+    section_id: Optional[int] = Query(None),
+    sort: str = Query("percent", description="percent | present | absent | streak | student_id | name"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    below_percent: Optional[float] = Query(None, description="Only students with present_percent below this"),
+    min_percent: Optional[float] = Query(None),
+    min_streak: Optional[int] = Query(None, description="Only students absent at least this many days in a row"),
+    limit: int = Query(100, ge=1, le=5000),
+    offset: int = Query(0, ge=0),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Per-student present/absent counts, percentage and current absence streak over a range,
+    e.g. ?below_percent=75 for students under 75%. Days counted are those with attendance taken.
+    """
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORT_FIELDS)}")
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date must be on or before to_date")
+    if section_id is not None and not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    where = range_scope(from_date, to_date, section_id)
+    students_query = select(func.count(Student.id), func.max(Student.updated_at))
+    if section_id is not None:
+        students_query = students_query.join(SectionEnrollment, SectionEnrollment.student_id == Student.id).where(
+            SectionEnrollment.section_id == section_id
+        )
+    students_token = "|".join(str(v) for v in (await session.execute(students_query)).one())
+    token = f"{students_token}|{await attendance_change_token(session, where)}"
+
+    async def build():
+        stats = await student_attendance_stats(session, from_date, to_date, section_id)
+        rows = filter_and_sort(
+            stats["students"],
+            sort=sort,
+            descending=order == "desc",
+            max_percent=below_percent,
+            min_percent=min_percent,
+            min_streak=min_streak,
+        )
+        return StudentAttendanceStatsPage(
+            from_date=from_date,
+            to_date=to_date,
+            section_id=section_id,
+            session_days=stats["session_days"],
+            total=len(rows),
+            students=rows[offset:offset + limit],
+        )
+
+    key = ("student-stats", from_date, to_date, section_id, sort, order, below_percent, min_percent, min_streak, limit, offset)
+    return await conditional_json(request, key, token, build)
+
+
+def _event_filters(from_date: date, to_date: date, student_id: Optional[str], source: Optional[str],
+                   section_id: Optional[int], matched: Optional[bool]) -> list:
+    where = [RecognitionEvent.date >= from_date, RecognitionEvent.date <= to_date]
+    if student_id is not None:
+        # Disputes: faces where the student was the match, the nearest or the runner-up
+        where.append(or_(
+            RecognitionEvent.best_student_id == student_id,
+            RecognitionEvent.runner_up_student_id == student_id,
+            RecognitionEvent.matched_student_id == student_id,
+        ))
+    if source is not None:
+        where.append(RecognitionEvent.source == source)
+    if section_id is not None:
+        where.append(RecognitionEvent.section_id == section_id)
+    if matched is not None:
+        where.append(RecognitionEvent.matched_student_id.is_not(None) if matched
+                     else RecognitionEvent.matched_student_id.is_(None))
+    return where
+
+
+@router.get("/recognition-events", response_model=RecognitionEventPage)
+async def get_recognition_events(
+    day: Optional[date] = Query(None, description="Single day (default: today); or use from_date/to_date"),
+    from_date: Optional[date] = Query(None),
+    to_date: Optional[date] = Query(None),
+    student_id: Optional[str] = Query(None, description="Faces matched to, nearest to or runner-up to this student"),
+    source: Optional[str] = Query(None),
+    section_id: Optional[int] = Query(None),
+    matched: Optional[bool] = Query(None),
+    max_margin: Optional[float] = Query(None, description="Only ambiguous faces: runner-up within this distance of the best"),
+    limit: int = Query(200, ge=1, le=5000),
+    before_id: Optional[int] = Query(None, description="Keyset pagination: events older than this id"),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Faces seen by recognition passes (newest first): box, nearest and runner-up student with
+    distances, and the match. Recent events may still be in the write-behind buffer for a few seconds.
+    """
+    from_date = from_date or day or date.today()
+    to_date = to_date or day or from_date
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date must be on or before to_date")
+    where = _event_filters(from_date, to_date, student_id, source, section_id, matched)
+    if max_margin is not None:
+        where.append(RecognitionEvent.runner_up_distance - RecognitionEvent.best_distance <= max_margin)
+    if before_id is not None:
+        where.append(RecognitionEvent.id < before_id)
+    rows = (await session.execute(
+        select(RecognitionEvent).where(*where).order_by(RecognitionEvent.id.desc()).limit(limit)
+    )).scalars().all()
+    events = [
+        RecognitionEventResponse(
+            id=e.id,
+            created_at=e.created_at,
+            date=e.date,
+            batch_id=e.batch_id,
+            source=e.source,
+            section_id=e.section_id,
+            session_id=e.session_id,
+            model=e.model,
+            box=[e.box_x, e.box_y, e.box_w, e.box_h] if e.box_x is not None else None,
+            matched_student_id=e.matched_student_id,
+            best_student_id=e.best_student_id,
+            best_distance=e.best_distance,
+            runner_up_student_id=e.runner_up_student_id,
+            runner_up_distance=e.runner_up_distance,
+            margin=(e.runner_up_distance - e.best_distance) if e.runner_up_distance is not None else None,
+        )
+        for e in rows
+    ]
+    return RecognitionEventPage(events=events, next_before_id=rows[-1].id if len(rows) == limit else None)
+
+
+@router.get("/recognition-events/histogram", response_model=DistanceHistogram)
+async def get_recognition_distance_histogram(
+    from_date: date = Query(...),
+    to_date: date = Query(...),
+    source: Optional[str] = Query(None),
+    section_id: Optional[int] = Query(None),
+    bins: int = Query(20, ge=2, le=200),
+    session: AsyncSession = Depends(get_db),
+):
+    """
+    Threshold tuning: distribution of best distances (matched vs unmatched faces) and of the
+    runner-up margin over a date range. Only the two distance columns are read.
+    """
+    import numpy as np
+    from app.config import DISTANCE_METRIC, THRESHOLD_COSINE, THRESHOLD_EUCLIDEAN
+
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="from_date must be on or before to_date")
+    where = _event_filters(from_date, to_date, None, source, section_id, None)
+    rows = (await session.execute(
+        select(
+            RecognitionEvent.best_distance,
+            RecognitionEvent.runner_up_distance,
+            RecognitionEvent.matched_student_id.is_not(None),
+        ).where(*where, RecognitionEvent.best_distance.is_not(None))
+    )).all()
+    threshold = THRESHOLD_COSINE if DISTANCE_METRIC == "cosine" else THRESHOLD_EUCLIDEAN
+    data = np.array([(b, r if r is not None else np.nan, m) for b, r, m in rows], dtype=np.float64).reshape(-1, 3)
+    top = max(threshold * 2, float(data[:, 0].max()) if len(data) else 0.0)
+    edges = np.linspace(0.0, top, bins + 1)
+    margins = data[:, 1] - data[:, 0]
+    return DistanceHistogram(
+        from_date=from_date,
+        to_date=to_date,
+        threshold=threshold,
+        edges=[round(float(e), 6) for e in edges],
+        matched=np.histogram(data[data[:, 2] == 1, 0], bins=edges)[0].tolist(),
+        unmatched=np.histogram(data[data[:, 2] == 0, 0], bins=edges)[0].tolist(),
+        margin=np.histogram(margins[~np.isnan(margins)], bins=edges)[0].tolist(),
     )
-    by_date = {}
-    for d, status in result.all():
-        if d not in by_date:
-            by_date[d] = {"present": 0, "absent": 0}
-        if status == "Present":
-            by_date[d]["present"] += 1
-        else:
-            by_date[d]["absent"] += 1
-    out = []
-    current = from_date
-    while current <= to_date:
-        data = by_date.get(current, {"present": 0, "absent": 0})
-        present = data["present"]
-        absent = data["absent"]
-        missing = total_students - present - absent
-        absent += missing
-        pct = (present / total_students * 100) if total_students else 0
-        out.append({
-            "date": str(current),
-            "total_students": total_students,
-            "present_count": present,
-            "absent_count": absent,
-            "present_percent": round(pct, 2),
-        })
-        current += timedelta(days=1)
-    return out
@@ -4,12 +4,13 @@ Excel export: generate and download attendance reports.
 from datetime import date
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.services.excel_export import generate_daily_report, generate_range_report
+from app.services.rosters import get_section
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
@@ -17,11 +18,14 @@ router = APIRouter(prefix="/api/reports", tags=["reports"])
 @router.get("/daily")
 async def export_daily(
     day: Optional[date] = Query(None),
+    section_id: Optional[int] = Query(None),
     session: AsyncSession = Depends(get_db),
 ):
-    """Generate Excel for one day; return file for download."""
+    """Generate Excel for one day (optionally one section's roster); return file for download."""
     day = day or date.today()
-    path = await generate_daily_report(session, day)
+    if section_id is not None and not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    path = await generate_daily_report(session, day, section_id=section_id)
     return FileResponse(
         path,
         filename=path.name,
@@ -33,10 +37,13 @@ async def export_daily(
 async def export_range(
     from_date: date = Query(...),
     to_date: date = Query(...),
+    section_id: Optional[int] = Query(None),
     session: AsyncSession = Depends(get_db),
 ):
-    """Generate Excel for date range; return file for download."""
-    path = await generate_range_report(session, from_date, to_date, student_ids=None)
+    """Generate Excel for date range (optionally one section's roster); return file for download."""
+    if section_id is not None and not await get_section(session, section_id):
+        raise HTTPException(status_code=404, detail="Section not found")
+    path = await generate_range_report(session, from_date, to_date, student_ids=None, section_id=section_id)
     return FileResponse(
         path,
         filename=path.name,
@@ -0,0 +1,138 @@
+"""
+Courses, sections and rosters: create courses and their sections, manage which students
+are enrolled in a section, list a section's class sessions.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models import Course, Section, ClassSession
+from app.schemas import (
+    CourseCreate,
+    CourseResponse,
+    SectionCreate,
+    SectionResponse,
+    RosterUpdate,
+    StudentResponse,
+    ClassSessionResponse,
+)
+from app.services.rosters import (
+    get_section,
+    get_roster,
+    get_roster_pks,
+    resolve_student_ids,
+    add_to_roster,
+    remove_from_roster,
+)
+
+router = APIRouter(prefix="/api/sections", tags=["sections"])
+
+
+@router.get("/courses", response_model=List[CourseResponse])
+async def list_courses(session: AsyncSession = Depends(get_db)):
+    result = await session.execute(select(Course).order_by(Course.code))
+    return result.scalars().all()
+
+
+@router.post("/courses", response_model=CourseResponse)
+async def create_course(body: CourseCreate, session: AsyncSession = Depends(get_db)):
+    result = await session.execute(select(Course).where(Course.code == body.code))
+    if result.scalar_one_or_none():
+        raise HTTPException(status_code=400, detail="Course code already exists")
+    course = Course(code=body.code, name=body.name)
+    session.add(course)
+    await session.flush()
+    await session.refresh(course)
+    return course
+
+
+@router.get("", response_model=List[SectionResponse])
+async def list_sections(course_id: Optional[int] = Query(None), session: AsyncSession = Depends(get_db)):
+    query = select(Section).order_by(Section.course_id, Section.name)
+    if course_id is not None:
+        query = query.where(Section.course_id == course_id)
+    result = await session.execute(query)
+    return result.scalars().all()
+
+
+@router.post("", response_model=SectionResponse)
+async def create_section(body: SectionCreate, session: AsyncSession = Depends(get_db)):
+    if not await session.get(Course, body.course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
+    result = await session.execute(
+        select(Section).where(
+            Section.course_id == body.course_id,
+            Section.name == body.name,
+            Section.term.is_(None) if body.term is None else Section.term == body.term,
+        )
+    )
+    if result.scalar_one_or_none():
+        raise HTTPException(status_code=400, detail="Section already exists for this course and term")
+    section = Section(course_id=body.course_id, name=body.name, term=body.term)
+    session.add(section)
+    await session.flush()
+    await session.refresh(section)
+    return section
+
+
+async def _section_or_404(session: AsyncSession, section_id: int) -> Section:
+    section = await get_section(session, section_id)
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
+    return section
+
+
+async def _resolve_or_400(session: AsyncSession, student_ids: List[str]) -> List[int]:
+    found, unknown = await resolve_student_ids(session, student_ids)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown student IDs: {', '.join(unknown[:20])}")
+    return list(found.values())
+
+
+@router.get("/{section_id}/roster", response_model=List[StudentResponse])
+async def list_roster(section_id: int, session: AsyncSession = Depends(get_db)):
+    await _section_or_404(session, section_id)
+    return await get_roster(session, section_id)
+
+
+@router.post("/{section_id}/roster")
+async def enroll_students(section_id: int, body: RosterUpdate, session: AsyncSession = Depends(get_db)):
+    """Add students to the section (already enrolled ones are ignored)."""
+    await _section_or_404(session, section_id)
+    pks = await _resolve_or_400(session, body.student_ids)
+    added = await add_to_roster(session, section_id, pks)
+    return {"section_id": section_id, "added": added}
+
+
+@router.put("/{section_id}/roster")
+async def replace_roster(section_id: int, body: RosterUpdate, session: AsyncSession = Depends(get_db)):
+    """Set the section's roster to exactly these students."""
+    await _section_or_404(session, section_id)
+    wanted = set(await _resolve_or_400(session, body.student_ids))
+    current = set(await get_roster_pks(session, section_id))
+    removed = await remove_from_roster(session, section_id, list(current - wanted))
+    added = await add_to_roster(session, section_id, list(wanted - current))
+    return {"section_id": section_id, "added": added, "removed": removed, "size": len(wanted)}
+
+
+@router.delete("/{section_id}/roster/{student_id}")
+async def unenroll_student(section_id: int, student_id: str, session: AsyncSession = Depends(get_db)):
+    await _section_or_404(session, section_id)
+    found, _unknown = await resolve_student_ids(session, [student_id])
+    if not found:
+        raise HTTPException(status_code=404, detail="Student not found")
+    if not await remove_from_roster(session, section_id, list(found.values())):
+        raise HTTPException(status_code=404, detail="Student is not enrolled in this section")
+    return {"message": "Student removed from section"}
+
+
+@router.get("/{section_id}/sessions", response_model=List[ClassSessionResponse])
+async def list_class_sessions(section_id: int, session: AsyncSession = Depends(get_db)):
+    await _section_or_404(session, section_id)
+    result = await session.execute(
+        select(ClassSession).where(ClassSession.section_id == section_id).order_by(ClassSession.date)
+    )
+    return result.scalars().all()
@@ -1,20 +1,25 @@
 """
 Student registration: create student, upload one or more photos, build and store face embedding.
 """
-import numpy as np
+import asyncio
+import hashlib
+import shutil
+import uuid
+import zipfile
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy import select, delete
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from sqlalchemy import select, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.models import Student, Attendance
-from app.schemas import StudentCreate, StudentResponse
-from app.config import UPLOAD_DIR, EMBEDDINGS_DIR, FACE_DETECTOR, FACE_RECOGNITION_MODEL
-from app.ml.recognizer import get_embeddings_from_image
-import cv2
+from app.models import Student, Attendance, SectionEnrollment, StudentEmbedding
+from app.schemas import StudentCreate, StudentResponse, BulkImportJob
+from app.services.admission import admission
+from app.config import UPLOAD_DIR, FACE_DETECTOR, BULK_IMPORT_JOBS
+from app.services.embedding_models import active_model, student_photos
 
 router = APIRouter(prefix="/api/students", tags=["students"])
 
@@ -37,58 +42,189 @@ async def create_student(body: StudentCreate, session: AsyncSession = Depends(ge
     return student
 
 
+def _process_photo(data: bytes, path: Path, model_name: str) -> list:
+    """
+    Decode one uploaded photo, save it and return the embedding of its face ([] if none).
+    Runs in a worker thread so decoding, disk writes and inference stay off the event loop.
+    """
+    import numpy as np
+    import cv2
+    from app.ml.recognizer import get_embeddings_from_image
+
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return []
+    try:
+        path.write_bytes(data)
+    except Exception:
+        # Ignore write errors (e.g. read-only fs) but process embedding
+        pass
+    face_list = get_embeddings_from_image(img, detector_backend=FACE_DETECTOR, model_name=model_name)
+    if not face_list:
+        return []
+    # One face per photo, as in bulk import: a bystander in the background is not the student
+    _bbox, emb = max(face_list, key=lambda f: f[0][2] * f[0][3])
+    return [emb]
+
+
+def _remove_photos(paths: List[str]) -> None:
+    for path in paths:
+        try:
+            Path(path).unlink()
+        except OSError:
+            pass
+
+
 @router.post("/{student_id}/photos")
 async def upload_photos(
     student_id: str,
     files: List[UploadFile] = File(...),
+    replace: bool = Query(False, description="Discard the stored embedding instead of adding to it"),
+    _slot: None = Depends(admission("upload_photos")),  # before get_db: no DB connection held while queued
     session: AsyncSession = Depends(get_db),
 ):
+    """
+    Add photos for a student. Photos are decoded and embedded concurrently off the event loop;
+    the stored embedding is a running mean, so new photos are folded in without re-sending old ones.
+    Photos are embedded with the active model; an embedding from another model is replaced.
+    With replace, the student's earlier photos are deleted once the new embedding is stored
+    (re-embedding for a new model uses every photo on disk).
+    Returns 503 with Retry-After when the worker is saturated.
+    """
     result = await session.execute(select(Student).where(Student.student_id == student_id))
     student = result.scalar_one_or_none()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    
+
+    from app.ml.recognizer import update_mean_embedding
+
+    model = await active_model(session, pin=True)
     # Save photos to disk (transient on Vercel)
     folder = UPLOAD_DIR / student_id
-    folder.mkdir(parents=True, exist_ok=True)
-    
-    embeddings_list = []
-    for i, f in enumerate(files):
+    await asyncio.to_thread(folder.mkdir, parents=True, exist_ok=True)
+    old_photos = await asyncio.to_thread(student_photos, student_id) if replace else []
+
+    photos = []
+    for f in files:
         if not f.content_type or not f.content_type.startswith("image/"):
             continue
         data = await f.read()
-        npy = np.frombuffer(data, np.uint8)
-        img = cv2.imdecode(npy, cv2.IMREAD_COLOR)
-        if img is None:
-            continue
-            
         ext = Path(f.filename or "img.jpg").suffix
-        path = folder / f"photo_{i}{ext}"
-        try:
-            with open(path, "wb") as out:
-                out.write(data)
-        except Exception:
-            # Ignore write errors (e.g. read-only fs) but process embedding
-            pass
-            
-        # One face per photo: get first face embedding
-        face_list = get_embeddings_from_image(img, detector_backend=FACE_DETECTOR, model_name=FACE_RECOGNITION_MODEL)
-        for _bbox, emb in face_list:
-            embeddings_list.append(emb)
-            
+        photos.append((data, folder / f"photo_{uuid.uuid4().hex[:12]}{ext}"))
+
+    # Photos of one request are processed concurrently, one worker-thread task each
+    per_photo = await asyncio.gather(*(asyncio.to_thread(_process_photo, data, path, model) for data, path in photos))
+    embeddings_list = [emb for embs in per_photo for emb in embs]
+
     if not embeddings_list:
         raise HTTPException(status_code=400, detail="No face detected in any photo. Please upload clear front-facing photos.")
-    
-    # Average embedding for robustness (multiple photos)
-    mean_emb = np.mean(embeddings_list, axis=0).astype(np.float32)
-    
-    # Update embedding in Database
-    # pgvector handles list or numpy array
-    student.embedding = mean_emb.tolist()
-    session.add(student)
+
+    # Fold into a fresh read of the row and write only if it is unchanged since (version check on
+    # count + updated_at): embedding took seconds, and a concurrent upload for the same student
+    # would otherwise be overwritten. On a conflict, re-read and fold again.
+    for _attempt in range(5):
+        row = (await session.execute(
+            select(Student.embedding, Student.embedding_count, Student.embedding_model, Student.updated_at)
+            .where(Student.id == student.id)
+        )).one()
+        # Running mean: rows enrolled before counts were tracked count as one embedding
+        current, count = None, 0
+        if not replace and row.embedding is not None and row.embedding_model in (None, model):
+            current = row.embedding
+            count = row.embedding_count or 1
+        mean_emb, new_count = update_mean_embedding(current, count, embeddings_list)
+        # pgvector handles list or numpy array
+        written = await session.execute(
+            update(Student)
+            .where(
+                Student.id == student.id,
+                Student.embedding_count == row.embedding_count,
+                Student.updated_at.is_not_distinct_from(row.updated_at),
+            )
+            .values(embedding=mean_emb.tolist(), embedding_count=new_count, embedding_model=model,
+                    updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        if written.rowcount:
+            break
+    else:
+        raise HTTPException(status_code=409, detail="Student embedding is being updated concurrently; retry")
     await session.commit()
-    
-    return {"message": "Photos uploaded and embedding saved", "faces_used": len(embeddings_list)}
+    if old_photos:
+        await asyncio.to_thread(_remove_photos, old_photos)
+
+    return {
+        "message": "Photos uploaded and embedding saved",
+        "faces_used": len(embeddings_list),
+        "embedding_count": new_count,
+    }
+
+
+@router.post("/bulk-import", response_model=BulkImportJob, status_code=202)
+async def bulk_import(
+    response: Response,
+    archive: UploadFile = File(..., description="Zip laid out as <student_id>/<photos>"),
+    names: Optional[UploadFile] = File(None, description="CSV with columns student_id, name"),
+):
+    """
+    Enroll a whole class from a photo archive, as a background job: poll
+    GET /bulk-import/{job_id}. Embedding runs across a process pool and progress is
+    checkpointed per archive, so re-uploading the same zip after a failure resumes the import.
+    """
+    from app.services.bulk_import import IMPORTS_DIR, extract_zip, job_dir, load_names, start_job
+
+    if not BULK_IMPORT_JOBS:
+        raise HTTPException(status_code=501, detail="Bulk import is CLI-only here: python -m scripts.bulk_import")
+    # Stream the upload to disk while hashing it; the hash keys the job and its checkpoint
+    staging = IMPORTS_DIR / uuid.uuid4().hex
+    await asyncio.to_thread(staging.mkdir, parents=True, exist_ok=True)
+    zip_path = staging / "archive.zip"
+    digest = hashlib.sha256()
+    out = await asyncio.to_thread(open, zip_path, "wb")
+    try:
+        while chunk := await archive.read(1 << 20):
+            digest.update(chunk)
+            await asyncio.to_thread(out.write, chunk)
+    finally:
+        await asyncio.to_thread(out.close)
+    job_id = digest.hexdigest()[:16]
+    folder = job_dir(job_id)
+    try:
+        await asyncio.to_thread(staging.rename, folder)
+    except OSError:  # this archive was uploaded before (or concurrently): reuse its folder
+        await asyncio.to_thread(shutil.rmtree, staging, True)
+
+    names_map = {}
+    if names is not None:
+        csv_path = folder / "names.csv"
+        await asyncio.to_thread(csv_path.write_bytes, await names.read())
+        names_map = await asyncio.to_thread(load_names, csv_path)
+
+    photo_root = folder / "photos"
+    try:
+        if not photo_root.exists():
+            await asyncio.to_thread(extract_zip, folder / "archive.zip", photo_root)
+    except (zipfile.BadZipFile, ValueError) as e:
+        await asyncio.to_thread(shutil.rmtree, folder, True)
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+
+    state = await start_job(job_id, names_map)
+    if state is None:
+        # Archive stays extracted: the same upload later starts without re-extracting
+        raise HTTPException(status_code=503, detail="Another bulk import is running", headers={"Retry-After": "60"})
+    response.headers["Location"] = f"/api/students/bulk-import/{job_id}"
+    return state
+
+
+@router.get("/bulk-import/{job_id}", response_model=BulkImportJob)
+async def bulk_import_status(job_id: str):
+    """Progress of a bulk import job, then its summary (imported, skipped, no_face) once done."""
+    from app.services.bulk_import import read_job
+
+    state = await asyncio.to_thread(read_job, job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return state
 
 
 @router.get("/{student_id}", response_model=StudentResponse)
@@ -106,13 +242,14 @@ async def delete_student(student_id: str, session: AsyncSession = Depends(get_db
     student = result.scalar_one_or_none()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    # Delete attendance records first (FK constraint)
+    # Delete attendance records, roster entries and per-model embeddings first (FK constraints)
     await session.execute(delete(Attendance).where(Attendance.student_id == student.id))
+    await session.execute(delete(SectionEnrollment).where(SectionEnrollment.student_id == student.id))
+    await session.execute(delete(StudentEmbedding).where(StudentEmbedding.student_id == student.id))
     await session.delete(student)
     # Remove uploaded photos (if any)
     folder = UPLOAD_DIR / student_id
     if folder.exists():
-        import shutil
         try:
             shutil.rmtree(folder)
         except:
@@ -46,6 +46,52 @@ class StudentResponse(BaseModel):
         from_attributes = True
 
 
+# ----- Courses / sections -----
+class CourseCreate(BaseModel):
+    code: str
+    name: str
+
+
+class CourseResponse(BaseModel):
+    id: int
+    code: str
+    name: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SectionCreate(BaseModel):
+    course_id: int
+    name: str
+    term: Optional[str] = None
+
+
+class SectionResponse(BaseModel):
+    id: int
+    course_id: int
+    name: str
+    term: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class RosterUpdate(BaseModel):
+    student_ids: List[str]  # our student_id strings e.g. STU001
+
+
+class ClassSessionResponse(BaseModel):
+    id: int
+    section_id: int
+    date: date
+
+    class Config:
+        from_attributes = True
+
+
 # ----- Attendance -----
 class AttendanceMark(BaseModel):
     student_id: str  # our student_id string e.g. STU001
@@ -54,6 +100,15 @@ class AttendanceMark(BaseModel):
     confidence: Optional[float] = None
 
 
+class EmbeddingBatch(BaseModel):
+    """Face embeddings computed on a device: `embeddings` is base64 of little-endian float32, N x dim row-major."""
+    device_id: str
+    captured_at: Optional[datetime] = None  # attendance day defaults to this date
+    model: Optional[str] = None  # must match the active embedding model when given
+    dim: int = 128
+    embeddings: str
+
+
 class AttendanceRecordResponse(BaseModel):
     id: int
     student_id: str
@@ -74,8 +129,87 @@ class AttendanceSummary(BaseModel):
     present_percent: float
 
 
+class StudentAttendanceStats(BaseModel):
+    student_id: str
+    name: str
+    present_count: int
+    absent_count: int
+    present_percent: float
+    absence_streak: int  # attendance days since the last Present
+    last_present: Optional[date] = None
+
+
+class StudentAttendanceStatsPage(BaseModel):
+    from_date: date
+    to_date: date
+    section_id: Optional[int] = None
+    session_days: int  # days on which attendance was taken in range
+    total: int  # students matching the filters (before pagination)
+    students: List[StudentAttendanceStats]
+
+
+# ----- Recognition log -----
+class RecognitionEventResponse(BaseModel):
+    id: int
+    created_at: datetime
+    date: date
+    batch_id: str
+    source: Optional[str] = None
+    section_id: Optional[int] = None
+    session_id: Optional[int] = None
+    model: Optional[str] = None
+    box: Optional[List[int]] = None  # [x, y, w, h]
+    matched_student_id: Optional[str] = None
+    best_student_id: Optional[str] = None
+    best_distance: Optional[float] = None
+    runner_up_student_id: Optional[str] = None
+    runner_up_distance: Optional[float] = None
+    margin: Optional[float] = None  # runner_up_distance - best_distance
+
+
+class RecognitionEventPage(BaseModel):
+    events: List[RecognitionEventResponse]
+    next_before_id: Optional[int] = None  # pass as before_id for the next (older) page
+
+
+class DistanceHistogram(BaseModel):
+    from_date: date
+    to_date: date
+    threshold: float  # current match threshold for DISTANCE_METRIC
+    edges: List[float]  # bin edges, len(bins) + 1
+    matched: List[int]  # best_distance counts of matched faces per bin
+    unmatched: List[int]
+    margin: List[int]  # counts of runner_up - best margins per bin (same edges)
+
+
 # ----- Reports -----
+class BulkImportJob(BaseModel):
+    job_id: str
+    status: str  # running | done | failed
+    processed: int = 0  # students done so far (including ones skipped on resume)
+    total: Optional[int] = None
+    imported: Optional[int] = None
+    skipped: Optional[int] = None
+    no_face: List[str] = []
+    error: Optional[str] = None
+    updated_at: datetime
+
+
 class ReportRequest(BaseModel):
     from_date: date
     to_date: date
     student_ids: Optional[List[str]] = None  # filter by student_id list
+
+
+# ----- Admin -----
+class ProfileInfo(BaseModel):
+    id: str
+    mode: str  # sample | cprofile
+    trigger: str  # admin | rate
+    method: Optional[str] = None
+    path: Optional[str] = None
+    status: Optional[int] = None
+    duration_ms: float
+    samples: Optional[int] = None  # stack samples taken (sample mode)
+    created_at: datetime
+    file: str
@@ -0,0 +1,128 @@
+"""
+Admission control for the CPU-heavy recognition endpoints.
+
+Each worker runs at most ADMISSION_MAX_CONCURRENT recognition requests at once; up to
+ADMISSION_MAX_QUEUE more wait (FIFO) for a slot. A request that cannot start within
+ADMISSION_DEADLINE_SECONDS, or arrives to a full queue, is shed immediately with 503 and a
+Retry-After estimate instead of piling more work onto a saturated worker. Everything else
+(/health, records, summaries) is never queued behind recognition.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import HTTPException
+
+from app.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS, ADMISSION_SHED
+
+QUEUE_FULL = "queue_full"
+DEADLINE = "deadline"
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Concurrency limit plus bounded FIFO wait queue; lives on one event loop (one per worker)."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, deadline: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.deadline = deadline
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self._service_time = 1.0  # EWMA of seconds a slot is held, for Retry-After
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained enough to admit one more request."""
+        backlog = self.in_flight + self.waiting + 1
+        return max(1, math.ceil(self._service_time * backlog / self.max_concurrent))
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns seconds waited. Raises Overloaded if the request must be shed."""
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            return 0.0
+        if self.waiting >= self.max_queue:
+            raise Overloaded(QUEUE_FULL, self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self._publish()
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, timeout=self.deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self.release()  # slot was handed over just as we gave up: pass it on
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            self._publish()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Overloaded(DEADLINE, self.retry_after())
+        # release() handed its slot to us, in_flight already counts it
+        return time.perf_counter() - t0
+
+    def release(self, held: Optional[float] = None) -> None:
+        """Free a slot (handing it straight to the oldest live waiter, if any)."""
+        if held is not None:
+            self._service_time = 0.8 * self._service_time + 0.2 * held
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(True)
+                self._publish()
+                return
+        self.in_flight = max(0, self.in_flight - 1)
+        self._publish()
+
+    def _publish(self) -> None:
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        ADMISSION_QUEUE_DEPTH.set(self.waiting)
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        from app.config import ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_DEADLINE_SECONDS
+        _controller = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_DEADLINE_SECONDS)
+    return _controller
+
+
+def admission(endpoint: str):
+    """Dependency: hold a recognition slot for the duration of the endpoint, or 503."""
+    async def dependency():
+        controller = get_admission_controller()
+        try:
+            waited = await controller.acquire()
+        except Overloaded as e:
+            ADMISSION_SHED.inc(endpoint=endpoint, reason=e.reason)
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, retry later",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        ADMISSION_WAIT_SECONDS.observe(waited, endpoint=endpoint)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            controller.release(held=time.perf_counter() - t0)
+    return dependency
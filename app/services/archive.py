@@ -0,0 +1,247 @@
+"""
+Cold attendance archive: closed months moved out of the hot table into compressed columnar
+files (ARCHIVE_DIR/attendance/YYYY-MM.npz, one NumPy array per column).
+
+Range reads (summary-range, student stats, Excel reports, records/summary of an archived day)
+merge the archive with the live table through `read_archived`, so archiving is transparent
+to the API. A month is archived whole and is then closed to marking (the mark endpoints return
+409, see `is_archived_day`). Live rows that still exist for an archived day (written while the
+month was being archived) shadow the archived row for the same student and day in every read,
+and replace it when the month is archived again.
+NumPy is imported on first use, so reads that overlap no archived month never load it.
+"""
+import os
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import ARCHIVE_DIR
+from app.models import Student, Attendance, ClassSession
+from app.services.partitions import (
+    add_months, month_range, month_start, drop_partition, is_partitioned, lock_partition,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+ARCHIVE_FORMAT = 1
+PRESENT, ABSENT = 1, 0
+DELETE_BATCH = 5000  # ids per DELETE ... WHERE id IN (...) (SQLite's bound-parameter limit)
+COLUMNS = ("id", "student_pk", "student_id", "date", "status", "marked_at", "source", "session_id", "section_id")
+
+# path -> (mtime, columns); archived months are immutable, so this only grows with the archive
+_loaded: Dict[str, tuple] = {}
+
+
+def archive_root(root: Optional[Path] = None) -> Path:
+    return (root or ARCHIVE_DIR) / "attendance"
+
+
+def month_key(month: date) -> str:
+    return f"{month.year:04d}-{month.month:02d}"
+
+
+def archived_months(root: Optional[Path] = None) -> List[str]:
+    """Archived months as sorted 'YYYY-MM' keys."""
+    try:
+        return sorted(p.name[:-4] for p in os.scandir(archive_root(root)) if p.name.endswith(".npz"))
+    except OSError:
+        return []
+
+
+def is_archived_day(day: date, root: Optional[Path] = None) -> bool:
+    """Whether the day's month has been archived (closed to marking)."""
+    return (archive_root(root) / f"{month_key(day)}.npz").exists()
+
+
+def load_month(key: str, root: Optional[Path] = None) -> Optional[Dict[str, "np.ndarray"]]:
+    """All columns of one archived month (decompressed once per process)."""
+    import numpy as np
+
+    path = archive_root(root) / f"{key}.npz"
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        return None
+    cached = _loaded.get(str(path))
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with np.load(path, allow_pickle=False) as data:
+        columns = {name: data[name] for name in COLUMNS}
+    _loaded[str(path)] = (mtime, columns)
+    return columns
+
+
+def read_archived(
+    from_date: date,
+    to_date: date,
+    section_id: Optional[int] = None,
+    root: Optional[Path] = None,
+    shadow: Optional[set] = None,
+) -> Optional[Dict[str, "np.ndarray"]]:
+    """
+    Archived rows in [from_date, to_date]: institution-wide rows (no session), or one section's.
+    shadow: (student pk, date) pairs that have a live row in the same scope; those archived rows
+    are skipped, so the live row wins. Returns columns as arrays, or None when nothing archived
+    overlaps the range.
+    """
+    wanted = {month_key(m) for m in month_range(from_date, to_date)}
+    keys = [k for k in archived_months(root) if k in wanted]
+    if not keys:
+        return None
+    import numpy as np
+
+    parts = []
+    lo, hi = np.datetime64(from_date, "D"), np.datetime64(to_date, "D")
+    for key in keys:
+        cols = load_month(key, root)
+        if cols is None:
+            continue
+        mask = (cols["date"] >= lo) & (cols["date"] <= hi)
+        mask &= (cols["section_id"] == section_id) if section_id is not None else (cols["session_id"] < 0)
+        if shadow:
+            days = cols["date"].astype(object)
+            mask &= np.array([(int(pk), d) not in shadow for pk, d in zip(cols["student_pk"], days)], dtype=bool)
+        parts.append({name: cols[name][mask] for name in COLUMNS})
+    if not parts:
+        return None
+    merged = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+    return merged if len(merged["id"]) else None
+
+
+def archived_span(from_date: date, to_date: date, root: Optional[Path] = None) -> Optional[tuple]:
+    """(first, last) day of [from_date, to_date] that falls in archived months, or None."""
+    archived = set(archived_months(root))
+    months = [m for m in month_range(from_date, to_date) if month_key(m) in archived]
+    if not months:
+        return None
+    return max(months[0], from_date), min(add_months(months[-1], 1) - timedelta(days=1), to_date)
+
+
+def archived_statuses(
+    from_date: date,
+    to_date: date,
+    section_id: Optional[int] = None,
+    shadow: Optional[set] = None,
+) -> List[tuple]:
+    """(student pk, date, status) for archived rows in range not shadowed by a live row; the shape range readers merge in."""
+    cols = read_archived(from_date, to_date, section_id, shadow=shadow)
+    if cols is None:
+        return []
+    days = cols["date"].astype(object)  # datetime64[D] -> datetime.date
+    return [
+        (int(pk), day, "Present" if status == PRESENT else "Absent")
+        for pk, day, status in zip(cols["student_pk"], days, cols["status"])
+    ]
+
+
+def _to_columns(rows: list) -> Dict[str, "np.ndarray"]:
+    import numpy as np
+
+    return {
+        "id": np.array([r.id for r in rows], dtype=np.int64),
+        "student_pk": np.array([r.student_pk for r in rows], dtype=np.int64),
+        "student_id": np.array([r.student_code or "" for r in rows], dtype=np.str_),
+        "date": np.array([r.date for r in rows], dtype="datetime64[D]"),
+        "status": np.array([PRESENT if r.status == "Present" else ABSENT for r in rows], dtype=np.uint8),
+        "marked_at": np.array([r.marked_at for r in rows], dtype="datetime64[us]"),
+        "source": np.array([r.source or "" for r in rows], dtype=np.str_),
+        "session_id": np.array([r.session_id if r.session_id is not None else -1 for r in rows], dtype=np.int64),
+        "section_id": np.array([r.section_id if r.section_id is not None else -1 for r in rows], dtype=np.int64),
+    }
+
+
+def write_month(key: str, columns: Dict[str, "np.ndarray"], root: Optional[Path] = None) -> Path:
+    """Atomically write one month's columns (temp file, then rename)."""
+    import numpy as np
+
+    folder = archive_root(root)
+    folder.mkdir(parents=True, exist_ok=True)
+    target = folder / f"{key}.npz"
+    tmp = folder / f".tmp-{uuid.uuid4().hex}.npz"
+    try:
+        np.savez_compressed(tmp, format=np.array(ARCHIVE_FORMAT), **columns)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return target
+
+
+async def archive_month(session: AsyncSession, month: date, root: Optional[Path] = None) -> int:
+    """
+    Move one month of attendance out of the hot table: write the archive file, then drop the
+    month's partition (Postgres, partitioned) or delete its rows. Returns rows archived.
+    The caller commits. The file is written first and merged with any existing archive of the
+    month, the live rows replacing archived ones for the same (student, date, session), so
+    re-running after a failed commit is safe. Only the rows written to the file are deleted:
+    a row inserted while the month was read stays live for the next run.
+    """
+    month = month_start(month)
+    key = month_key(month)
+    end = add_months(month, 1)
+    conn = await session.connection()
+    # No write to the month may slip in between reading it and dropping / deleting it: lock the
+    # partition against writes (Postgres, partitioned), else lock the rows read (FOR UPDATE;
+    # rows inserted meanwhile are not deleted below)
+    partitioned = await is_partitioned(conn) and await lock_partition(conn, month)
+    query = (
+        select(
+            Attendance.id,
+            Attendance.student_id.label("student_pk"),
+            Student.student_id.label("student_code"),
+            Attendance.date,
+            Attendance.status,
+            Attendance.marked_at,
+            Attendance.source,
+            Attendance.session_id,
+            ClassSession.section_id,
+        )
+        .outerjoin(Student, Attendance.student_id == Student.id)
+        .outerjoin(ClassSession, Attendance.session_id == ClassSession.id)
+        .where(Attendance.date >= month, Attendance.date < end)
+        .order_by(Attendance.date, Attendance.id)
+    )
+    if not partitioned:
+        query = query.with_for_update(of=Attendance)
+    rows = (await session.execute(query)).all()
+    if not rows:
+        return 0
+    columns = _to_columns(rows)
+    previous = load_month(key, root) if key in archived_months(root) else None
+    if previous is not None:
+        import numpy as np
+
+        live = set(zip(columns["student_pk"].tolist(), columns["date"].tolist(), columns["session_id"].tolist()))
+        keep = np.array([
+            row_key not in live
+            for row_key in zip(previous["student_pk"].tolist(), previous["date"].tolist(), previous["session_id"].tolist())
+        ], dtype=bool)
+        columns = {name: np.concatenate([previous[name][keep], columns[name]]) for name in COLUMNS}
+    write_month(key, columns, root)
+    if partitioned:
+        await drop_partition(conn, month)
+        return len(rows)
+    ids = [r.id for r in rows]
+    for i in range(0, len(ids), DELETE_BATCH):
+        await session.execute(delete(Attendance).where(Attendance.id.in_(ids[i:i + DELETE_BATCH])))
+    return len(rows)
+
+
+async def archive_before(session: AsyncSession, before: date, root: Optional[Path] = None) -> Dict[str, int]:
+    """Archive every whole month that ends on or before `before` and still has hot rows."""
+    first = (await session.execute(select(Attendance.date).order_by(Attendance.date).limit(1))).scalar()
+    if first is None:
+        return {}
+    done = {}
+    for month in month_range(first, before):
+        if add_months(month, 1) > before:
+            break  # month not closed yet
+        count = await archive_month(session, month, root)
+        if count:
+            done[month_key(month)] = count
+    return done
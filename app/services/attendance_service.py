@@ -1,13 +1,16 @@
 """
-Attendance marking logic: prevent duplicate per student per day, mark present for recognized faces.
+Attendance marking logic: prevent duplicate per student per day (or per class session when
+marking a section), mark present for recognized faces.
 """
-from datetime import date
-from typing import List, Tuple
+from datetime import date, datetime
+from typing import List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import select, func, case, update, literal, Integer, Date, DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import Student, Attendance
+from app.database import insert_ignoring_conflicts
+from app.models import Student, Attendance, ClassSession, SectionEnrollment
+from app.metrics import timed_stage
 
 
 async def get_student_by_student_id(session: AsyncSession, student_id: str) -> Student | None:
@@ -15,45 +18,160 @@ async def get_student_by_student_id(session: AsyncSession, student_id: str) -> S
     return result.scalar_one_or_none()
 
 
+def attendance_scope(day: date, class_session: Optional[ClassSession] = None):
+    """WHERE clause for the rows of one day (institution-wide) or of one class session."""
+    if class_session is not None:
+        return Attendance.session_id == class_session.id
+    return (Attendance.date == day) & Attendance.session_id.is_(None)
+
+
+def range_scope(from_date: date, to_date: date, section_id: Optional[int] = None):
+    """WHERE clause for a date range: institution-wide rows, or the rows of one section's sessions."""
+    where = (Attendance.date >= from_date) & (Attendance.date <= to_date)
+    if section_id is not None:
+        return where & Attendance.session_id.in_(
+            select(ClassSession.id).where(ClassSession.section_id == section_id)
+        )
+    return where & Attendance.session_id.is_(None)
+
+
+async def attendance_change_token(session: AsyncSession, where) -> str:
+    """
+    Cheap change token for the attendance rows matching `where`: one aggregate query
+    (row count, max id / marked_at, present count, and max updated_at of the students involved).
+    """
+    row = (await session.execute(
+        select(
+            func.count(Attendance.id),
+            func.max(Attendance.id),
+            func.max(Attendance.marked_at),
+            func.sum(case((Attendance.status == "Present", 1), else_=0)),
+            func.max(Student.updated_at),
+        )
+        .join(Student, Attendance.student_id == Student.id)
+        .where(where)
+    )).one()
+    return "|".join(str(v) for v in row)
+
+
+def attendance_insert(session: AsyncSession):
+    """
+    INSERT into attendance that skips rows hitting a unique key: two uploads for the same day can
+    both read a student as unmarked.
+    """
+    return insert_ignoring_conflicts(session, Attendance)
+
+
+async def mark_present_many(
+    session: AsyncSession,
+    student_ids: List[str],
+    day: date,
+    source: str = "image_upload",
+    class_session: Optional[ClassSession] = None,
+) -> List[str]:
+    """
+    Mark students present for the date (or class session) in a constant number of statements:
+    resolve ids, read existing rows, upgrade Absent rows to Present, insert the rest.
+    Returns the student_ids that exist (marked now or already present), in input order.
+    """
+    if not student_ids:
+        return []
+    result = await session.execute(
+        select(Student.student_id, Student.id).where(Student.student_id.in_(set(student_ids)))
+    )
+    pks = dict(result.all())
+    if not pks:
+        return []
+    result = await session.execute(
+        select(Attendance.student_id, Attendance.status).where(
+            Attendance.student_id.in_(pks.values()),
+            attendance_scope(day, class_session),
+        )
+    )
+    existing = dict(result.all())
+    now = datetime.utcnow()
+    # An earlier photo (or absent-fill) marked them Absent; a later sighting makes them Present
+    upgrade = [pk for pk, status in existing.items() if status != "Present"]
+    if upgrade:
+        await session.execute(
+            update(Attendance)
+            .where(Attendance.student_id.in_(upgrade), attendance_scope(day, class_session))
+            .values(status="Present", source=source, marked_at=now)
+        )
+    session_id = class_session.id if class_session is not None else None
+    new_rows = [
+        {"student_id": pk, "session_id": session_id, "date": day, "status": "Present", "source": source, "marked_at": now}
+        for pk in dict.fromkeys(pks[sid] for sid in student_ids if sid in pks)
+        if pk not in existing
+    ]
+    if new_rows:
+        result = await session.execute(attendance_insert(session).returning(Attendance.student_id), new_rows)
+        # Rows a concurrent request inserted after our read were skipped: upgrade them if Absent
+        raced = {row["student_id"] for row in new_rows} - set(result.scalars())
+        if raced:
+            await session.execute(
+                update(Attendance)
+                .where(
+                    Attendance.student_id.in_(raced),
+                    attendance_scope(day, class_session),
+                    Attendance.status != "Present",
+                )
+                .values(status="Present", source=source, marked_at=now)
+            )
+    return [sid for sid in dict.fromkeys(student_ids) if sid in pks]
+
+
 async def mark_present(
     session: AsyncSession,
     student_id: str,
     day: date,
     source: str = "image_upload",
+    class_session: Optional[ClassSession] = None,
 ) -> bool:
     """
-    Mark student as present for the given date if not already marked.
+    Mark student as present for the given date (or class session) if not already marked.
     Returns True if marked (new or existing), False if student not found.
     """
-    student = await get_student_by_student_id(session, student_id)
-    if not student:
-        return False
-    result = await session.execute(
-        select(Attendance).where(
-            Attendance.student_id == student.id,
-            Attendance.date == day,
-        )
-    )
-    existing = result.scalar_one_or_none()
-    if existing:
-        return True  # Already marked, no duplicate
-    att = Attendance(student_id=student.id, date=day, status="Present", source=source)
-    session.add(att)
-    return True
+    return bool(await mark_present_many(session, [student_id], day, source=source, class_session=class_session))
 
 
-async def ensure_all_students_have_attendance_record(session: AsyncSession, day: date) -> None:
+async def ensure_all_students_have_attendance_record(
+    session: AsyncSession,
+    day: date,
+    class_session: Optional[ClassSession] = None,
+) -> None:
     """
     For the given date, ensure every registered student has an attendance row.
-    Missing students get status Absent.
+    For a class session, only the section's roster is filled.
+    Missing students get status Absent. One INSERT ... SELECT, however many students.
     """
-    result = await session.execute(select(Student))
-    students = result.scalars().all()
-    result = await session.execute(select(Attendance).where(Attendance.date == day))
-    existing = {a.student_id for a in result.scalars().all()}
-    for s in students:
-        if s.id not in existing:
-            session.add(Attendance(student_id=s.id, date=day, status="Absent", source="system"))
+    if class_session is not None:
+        expected = select(SectionEnrollment.student_id.label("pk")).where(
+            SectionEnrollment.section_id == class_session.section_id
+        )
+        session_id = class_session.id
+    else:
+        expected = select(Student.id.label("pk"))
+        session_id = None
+    expected = expected.subquery()
+    has_row = (
+        select(Attendance.id)
+        .where(Attendance.student_id == expected.c.pk, attendance_scope(day, class_session))
+        .exists()
+    )
+    await session.execute(
+        attendance_insert(session).from_select(
+            ["student_id", "session_id", "date", "status", "source", "marked_at"],
+            select(
+                expected.c.pk,
+                literal(session_id, Integer),
+                literal(day, Date),
+                literal("Absent"),
+                literal("system"),
+                literal(datetime.utcnow(), DateTime),
+            ).where(~has_row),
+        )
+    )
 
 
 async def mark_recognized_and_fill_absent(
@@ -61,16 +179,17 @@ async def mark_recognized_and_fill_absent(
     recognized: List[Tuple[str, str, float]],
     day: date,
     source: str = "image_upload",
+    class_session: Optional[ClassSession] = None,
 ) -> List[str]:
     """
-    Mark all recognized students as present (no duplicate), then ensure
-    all other students have an Absent record for the day.
-    Returns list of student_ids that were marked present (newly).
+    Mark all recognized students as present (no duplicate; Absent rows are upgraded), then ensure
+    all other students (the section roster, for a class session) have an Absent record.
+    Returns list of student_ids that were marked present.
     """
-    marked = []
-    for student_id, _name, _conf in recognized:
-        ok = await mark_present(session, student_id, day, source=source)
-        if ok:
-            marked.append(student_id)
-    await ensure_all_students_have_attendance_record(session, day)
+    with timed_stage("mark_present"):
+        marked = await mark_present_many(
+            session, [sid for sid, _name, _conf in recognized], day, source=source, class_session=class_session
+        )
+    with timed_stage("fill_absent"):
+        await ensure_all_students_have_attendance_record(session, day, class_session=class_session)
     return marked
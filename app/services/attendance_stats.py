@@ -0,0 +1,125 @@
+"""
+Per-student attendance statistics over a date range, computed with SQL aggregation
+(one GROUP BY over the range) instead of expanding days x students in Python.
+
+Denominator: the days on which attendance was taken in scope (distinct dates with any record),
+so weekends and holidays without marking don't count as absences. A student with no record on
+such a day counts as absent, as in the daily summaries. The current absence streak is the number
+of those days after the student's last Present day. Archived months are merged in
+(vectorized over the archive's columns).
+"""
+from bisect import bisect_right
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import select, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Student, Attendance, SectionEnrollment
+from app.services.archive import PRESENT, archived_span, read_archived
+from app.services.attendance_service import range_scope
+
+SORT_FIELDS = ("percent", "present", "absent", "streak", "student_id", "name")
+
+
+async def student_attendance_stats(
+    session: AsyncSession,
+    from_date: date,
+    to_date: date,
+    section_id: Optional[int] = None,
+) -> dict:
+    """{"session_days": n, "students": [per-student dicts]} for every student (or the section roster)."""
+    where = range_scope(from_date, to_date, section_id)
+    result = await session.execute(select(Attendance.date).where(where).distinct().order_by(Attendance.date))
+    days = [row[0] for row in result.all()]
+
+    is_present = Attendance.status == "Present"
+    result = await session.execute(
+        select(
+            Attendance.student_id,
+            func.sum(case((is_present, 1), else_=0)),
+            func.max(case((is_present, Attendance.date), else_=None)),
+        )
+        .where(where)
+        .group_by(Attendance.student_id)
+    )
+    agg = {pk: (int(present or 0), _as_date(last)) for pk, present, last in result.all()}
+
+    span = archived_span(from_date, to_date)
+    if span is not None:
+        # Live rows left in archived months win over the archived row for the same student and day
+        result = await session.execute(
+            select(Attendance.student_id, Attendance.date).where(where, Attendance.date >= span[0], Attendance.date <= span[1])
+        )
+        shadow = {(pk, _as_date(day)) for pk, day in result.all()}
+        archived = read_archived(from_date, to_date, section_id, shadow=shadow)
+        if archived is not None:
+            _merge_archived(archived, days, agg)
+
+    query = select(Student.id, Student.student_id, Student.name)
+    if section_id is not None:
+        query = query.join(SectionEnrollment, SectionEnrollment.student_id == Student.id).where(
+            SectionEnrollment.section_id == section_id
+        )
+    result = await session.execute(query)
+
+    total_days = len(days)
+    students = []
+    for pk, student_id, name in result.all():
+        present, last_present = agg.get(pk, (0, None))
+        streak = total_days - bisect_right(days, last_present) if last_present else total_days
+        students.append({
+            "student_id": student_id,
+            "name": name,
+            "present_count": present,
+            "absent_count": total_days - present,
+            "present_percent": round(present / total_days * 100, 2) if total_days else 0.0,
+            "absence_streak": streak,
+            "last_present": last_present,
+        })
+    return {"session_days": total_days, "students": students}
+
+
+def _as_date(value) -> Optional[date]:
+    # Dates come back as str from SQLite aggregates
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _merge_archived(archived: dict, days: List[date], agg: dict) -> None:
+    """Fold archived rows into the marking days (in place, kept sorted) and per-student aggregates."""
+    import numpy as np
+
+    days[:] = sorted(set(days) | set(np.unique(archived["date"]).astype(object)))
+    present = archived["status"] == PRESENT
+    pks, inverse, counts = np.unique(archived["student_pk"][present], return_inverse=True, return_counts=True)
+    last = np.full(len(pks), np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last, inverse, archived["date"][present].astype(np.int64))
+    for pk, count, last_day in zip(pks.tolist(), counts.tolist(), last.astype("datetime64[D]").astype(object)):
+        hot_count, hot_last = agg.get(pk, (0, None))
+        agg[pk] = (hot_count + count, max(hot_last, last_day) if hot_last else last_day)
+
+
+def filter_and_sort(
+    students: List[dict],
+    sort: str = "percent",
+    descending: bool = False,
+    max_percent: Optional[float] = None,
+    min_percent: Optional[float] = None,
+    min_streak: Optional[int] = None,
+) -> List[dict]:
+    """Apply threshold filters, then sort (ties broken by student_id)."""
+    rows = [
+        s for s in students
+        if (max_percent is None or s["present_percent"] < max_percent)
+        and (min_percent is None or s["present_percent"] >= min_percent)
+        and (min_streak is None or s["absence_streak"] >= min_streak)
+    ]
+    field = {
+        "percent": "present_percent",
+        "present": "present_count",
+        "absent": "absent_count",
+        "streak": "absence_streak",
+    }.get(sort, sort)
+    rows.sort(key=lambda s: s["student_id"])
+    rows.sort(key=lambda s: s[field], reverse=descending)
+    return rows
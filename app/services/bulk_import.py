@@ -0,0 +1,301 @@
+"""
+Bulk enrollment: import a whole class from a photo archive laid out as <student_id>/<photos>
+plus a CSV of names (columns: student_id, name).
+Detection + embedding run across a process pool; progress is checkpointed to a JSONL file so
+an interrupted import resumes where it stopped; students and embeddings are written in bulk
+statements, one transaction per batch.
+
+Each student's embedding is replaced by the mean of the archive photos (not merged), so
+re-running a batch after a crash is idempotent. Photos are embedded with the active model
+(app.services.embedding_models); the re-embed job reuses the worker side with another model.
+
+The API endpoint runs imports as background jobs keyed by the archive hash, with their state in
+UPLOAD_DIR/_imports/<job_id>.json (readable from any worker). The job folder (archive, photos,
+checkpoint) is removed once the import completes and kept after a failure, so re-uploading the
+same archive resumes it.
+"""
+import asyncio
+import csv
+import inspect
+import json
+import logging
+import os
+import re
+import shutil
+import zipfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import FACE_DETECTOR, FACE_RECOGNITION_MODEL, UPLOAD_DIR, BULK_IMPORT_JOBS
+from app.models import Student
+from app.services.embedding_models import active_model
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+IMPORTS_DIR = UPLOAD_DIR / "_imports"
+JOB_ID = re.compile(r"^[0-9a-f]{16}$")
+
+_jobs: Dict[str, asyncio.Task] = {}  # imports running in this worker
+
+logger = logging.getLogger(__name__)
+
+
+def extract_zip(zip_path: Path, dest: Path) -> Path:
+    """Extract an archive safely (no paths outside dest). Returns dest."""
+    dest.mkdir(parents=True, exist_ok=True)
+    root = dest.resolve()
+    with zipfile.ZipFile(zip_path) as zf:
+        for member in zf.infolist():
+            target = (dest / member.filename).resolve()
+            if root not in target.parents and target != root:
+                raise ValueError(f"Unsafe path in archive: {member.filename}")
+        zf.extractall(dest)
+    return dest
+
+
+def scan_photo_tree(root: Path) -> Dict[str, List[str]]:
+    """<student_id>/<photos> -> {student_id: [photo paths]}. Descends through a single wrapper folder."""
+    dirs = [p for p in root.iterdir() if p.is_dir() and not p.name.startswith(("_", "."))]
+    has_photos = any(
+        f.suffix.lower() in IMAGE_SUFFIXES for d in dirs for f in d.iterdir() if f.is_file()
+    )
+    if len(dirs) == 1 and not has_photos:
+        return scan_photo_tree(dirs[0])
+    tree = {}
+    for d in sorted(dirs):
+        photos = sorted(str(f) for f in d.iterdir() if f.is_file() and f.suffix.lower() in IMAGE_SUFFIXES)
+        if photos:
+            tree[d.name] = photos
+    return tree
+
+
+def load_names(csv_path: Optional[Path]) -> Dict[str, str]:
+    """CSV with student_id, name columns -> {student_id: name}."""
+    if not csv_path:
+        return {}
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        return {
+            row["student_id"].strip(): (row.get("name") or "").strip()
+            for row in csv.DictReader(f)
+            if row.get("student_id")
+        }
+
+
+def load_checkpoint(path: Path) -> Dict[str, dict]:
+    """student_id -> checkpoint record for every student already written to the DB."""
+    done = {}
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = json.loads(line)
+                    done[rec["student_id"]] = rec
+    return done
+
+
+def _append_checkpoint(path: Path, records: List[dict]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps({k: v for k, v in rec.items() if k != "embedding"}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def keep_photos(results: List[dict], tree: Dict[str, List[str]]) -> None:
+    """Copy imported photos to UPLOAD_DIR/<student_id>/ like uploaded ones (the re-embed job reads them there)."""
+    for r in results:
+        if r["embedding"] is None:
+            continue
+        folder = UPLOAD_DIR / r["student_id"]
+        try:
+            folder.mkdir(parents=True, exist_ok=True)
+            for path in tree[r["student_id"]]:
+                shutil.copyfile(path, folder / f"import_{Path(path).name}")
+        except OSError:
+            pass  # read-only fs: the embedding is stored anyway
+
+
+# ----- Worker process side -----
+def _init_worker(setup: Optional[Callable[[], None]] = None) -> None:
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    if setup is not None:
+        setup()
+
+
+def embed_student_photos(item, model_name: str = FACE_RECOGNITION_MODEL) -> dict:
+    """(student_id, [paths]) -> {student_id, embedding (list) or None, count, photos}. One face per photo."""
+    import cv2
+    import numpy as np
+    from app.ml.recognizer import get_embeddings_from_image
+
+    student_id, paths = item
+    embeddings = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        faces = get_embeddings_from_image(img, detector_backend=FACE_DETECTOR, model_name=model_name)
+        if faces:
+            # Enrollment photos show one student: keep the largest face
+            _bbox, emb = max(faces, key=lambda f: f[0][2] * f[0][3])
+            embeddings.append(emb)
+    mean = np.mean(embeddings, axis=0).astype(np.float32).tolist() if embeddings else None
+    return {"student_id": student_id, "embedding": mean, "count": len(embeddings), "photos": len(paths)}
+
+
+# ----- DB side -----
+async def write_batch(session: AsyncSession, results: List[dict], names: Dict[str, str], model: str = FACE_RECOGNITION_MODEL) -> None:
+    """Insert new students and update existing ones with bulk statements, in one transaction."""
+    ids = [r["student_id"] for r in results]
+    existing = {
+        sid: pk
+        for pk, sid in (await session.execute(
+            select(Student.id, Student.student_id).where(Student.student_id.in_(ids))
+        )).all()
+    }
+    new_rows, updates = [], []
+    for r in results:
+        sid = r["student_id"]
+        row = {"embedding": r["embedding"], "embedding_count": r["count"], "embedding_model": model}
+        if sid in names and names[sid]:
+            row["name"] = names[sid]
+        if sid in existing:
+            if r["embedding"] is None:
+                continue  # keep whatever the student already has
+            updates.append({"id": existing[sid], **row})
+        else:
+            row.setdefault("name", names.get(sid) or sid)
+            new_rows.append({"student_id": sid, **row})
+    if new_rows:
+        await session.execute(insert(Student), new_rows)
+    if updates:
+        await session.execute(update(Student), updates)
+    await session.commit()
+
+
+async def run_bulk_import(
+    session: AsyncSession,
+    photo_root: Path,
+    names: Dict[str, str],
+    checkpoint_path: Path,
+    workers: Optional[int] = None,
+    batch_size: int = 200,
+    worker_setup: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Import every student under photo_root that is not yet in the checkpoint.
+    worker_setup: optional picklable callable run once in each worker process (e.g. install test models).
+    progress: called with (done, total) after each batch; may be a coroutine function.
+    Returns a summary: total, skipped (already done), imported, no_face (student ids).
+    """
+    tree = scan_photo_tree(photo_root)
+    # Students listed in the CSV without a photo folder are still created (no embedding)
+    for sid in names:
+        tree.setdefault(sid, [])
+    done = load_checkpoint(checkpoint_path)
+    todo = [(sid, paths) for sid, paths in sorted(tree.items()) if sid not in done]
+    summary = {"total": len(tree), "skipped": len(tree) - len(todo), "imported": 0, "no_face": []}
+    if not todo:
+        return summary
+
+    model = await active_model(session, pin=True)
+    embed = partial(embed_student_photos, model_name=model)
+    loop = asyncio.get_running_loop()
+    ctx = get_context("spawn")  # TensorFlow is not fork-safe
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=ctx,
+                             initializer=_init_worker, initargs=(worker_setup,)) as pool:
+        for start in range(0, len(todo), batch_size):
+            batch = todo[start:start + batch_size]
+            results = await asyncio.gather(*(loop.run_in_executor(pool, embed, item) for item in batch))
+            # DB first, then checkpoint: a crash in between only repeats an idempotent batch
+            await write_batch(session, results, names, model)
+            await asyncio.to_thread(keep_photos, results, tree)
+            _append_checkpoint(checkpoint_path, results)
+            summary["imported"] += len(results)
+            summary["no_face"].extend(r["student_id"] for r in results if r["embedding"] is None)
+            if progress:
+                reported = progress(summary["skipped"] + summary["imported"], summary["total"])
+                if inspect.isawaitable(reported):
+                    await reported
+    return summary
+
+
+# ----- Background jobs (POST /api/students/bulk-import) -----
+def job_dir(job_id: str) -> Path:
+    return IMPORTS_DIR / job_id
+
+
+def read_job(job_id: str) -> Optional[dict]:
+    """Stored state of an import job, or None (unknown or malformed id)."""
+    if not JOB_ID.match(job_id):
+        return None
+    try:
+        return json.loads((IMPORTS_DIR / f"{job_id}.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_job(job_id: str, **state) -> dict:
+    state = {"job_id": job_id, "updated_at": datetime.utcnow().isoformat() + "Z", **state}
+    IMPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = IMPORTS_DIR / f"{job_id}.json.tmp"
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, IMPORTS_DIR / f"{job_id}.json")
+    return state
+
+
+def _running_elsewhere(state: Optional[dict]) -> bool:
+    """Whether another live process on this host is running the job."""
+    if not state or state.get("status") != "running" or state.get("pid") == os.getpid():
+        return False
+    try:
+        os.kill(state["pid"], 0)
+    except (OSError, KeyError, TypeError):
+        return False  # that worker died mid-import: the job can be resumed
+    return True
+
+
+async def _run_job(job_id: str, names: Dict[str, str]) -> None:
+    from app.database import AsyncSessionLocal
+
+    folder = job_dir(job_id)
+
+    async def progress(done: int, total: int) -> None:
+        await asyncio.to_thread(_write_job, job_id, status="running", pid=os.getpid(), processed=done, total=total)
+
+    try:
+        async with AsyncSessionLocal() as session:
+            summary = await run_bulk_import(session, folder / "photos", names, folder / "checkpoint.jsonl", progress=progress)
+        await asyncio.to_thread(_write_job, job_id, status="done", processed=summary["total"], **summary)
+        await asyncio.to_thread(shutil.rmtree, folder, True)
+    except Exception as e:
+        # Keep the folder: uploading the same archive again resumes from the checkpoint
+        logger.exception("bulk import %s failed", job_id)
+        await asyncio.to_thread(_write_job, job_id, status="failed", error=f"{type(e).__name__}: {e}")
+    finally:
+        _jobs.pop(job_id, None)
+
+
+async def start_job(job_id: str, names: Dict[str, str]) -> Optional[dict]:
+    """
+    Start importing the extracted archive in job_dir(job_id) in the background and return its
+    state; an import of the same archive already running is returned as is. None when this worker
+    already runs BULK_IMPORT_JOBS imports.
+    """
+    state = await asyncio.to_thread(read_job, job_id)
+    if job_id in _jobs or _running_elsewhere(state):
+        return state
+    if len(_jobs) >= BULK_IMPORT_JOBS:
+        return None
+    state = await asyncio.to_thread(_write_job, job_id, status="running", pid=os.getpid(), processed=0)
+    _jobs[job_id] = asyncio.get_running_loop().create_task(_run_job(job_id, names))
+    return state
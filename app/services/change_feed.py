@@ -0,0 +1,95 @@
+"""
+Attendance change feed for downstream mirrors (student-information systems).
+
+Every insert and update of an attendance row sets marked_at, so (marked_at, id) orders all
+changes; the cursor a client hands back is the last pair it received. Rows are streamed as
+NDJSON straight from a server-side cursor (plain column tuples, no ORM objects), so a sync
+costs what changed since the last one, not the full history.
+
+Rows marked within the last CHANGE_FEED_LAG_SECONDS are held back: a transaction that stamped
+marked_at earlier but commits after a read must not land behind a cursor already handed out.
+Deletions (student removal, archived months) are not part of the feed.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+
+from app.config import CHANGE_FEED_LAG_SECONDS
+from app.models import Attendance, Student, ClassSession
+
+Cursor = Tuple[datetime, int]
+
+
+def format_cursor(marked_at: datetime, row_id: int) -> str:
+    return f"{marked_at.isoformat()}~{row_id}"
+
+
+def parse_cursor(token: str) -> Cursor:
+    """Inverse of format_cursor; raises ValueError on anything else."""
+    stamp, _, row_id = token.rpartition("~")
+    return datetime.fromisoformat(stamp), int(row_id)
+
+
+def changes_query(since: Optional[Cursor], section_id: Optional[int], limit: int):
+    """Changed rows after `since`, oldest first, as plain columns."""
+    query = (
+        select(
+            Attendance.id,
+            Attendance.marked_at,
+            Student.student_id,
+            Attendance.date,
+            Attendance.status,
+            Attendance.source,
+            Attendance.session_id,
+            ClassSession.section_id,
+        )
+        .join(Student, Student.id == Attendance.student_id)
+        .outerjoin(ClassSession, ClassSession.id == Attendance.session_id)
+        .where(Attendance.marked_at <= datetime.utcnow() - timedelta(seconds=CHANGE_FEED_LAG_SECONDS))
+        .order_by(Attendance.marked_at, Attendance.id)
+        .limit(limit)
+    )
+    if since is not None:
+        # Row-value comparison: one ordered range scan of ix_attendance_marked_at, no sort
+        query = query.where(tuple_(Attendance.marked_at, Attendance.id) > tuple_(*since))
+    if section_id is not None:
+        query = query.where(ClassSession.section_id == section_id)
+    return query
+
+
+async def stream_changes(since: Optional[Cursor], section_id: Optional[int], limit: int) -> AsyncIterator[bytes]:
+    """
+    NDJSON lines: one {"type": "change", ...} per row (each with its own cursor, so a client can
+    resume mid-stream), then {"type": "end", "cursor", "count", "more"}. Uses its own session:
+    the request's session is closed before a streaming body runs.
+    """
+    from app.database import AsyncSessionLocal
+
+    count, last = 0, since
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(
+            changes_query(since, section_id, limit).execution_options(yield_per=1000)
+        )
+        async for row_id, marked_at, student_id, day, status, source, session_id, row_section in result:
+            last = (marked_at, row_id)
+            count += 1
+            yield (json.dumps({
+                "type": "change",
+                "cursor": format_cursor(marked_at, row_id),
+                "id": row_id,
+                "student_id": student_id,
+                "date": day.isoformat(),
+                "status": status,
+                "source": source,
+                "session_id": session_id,
+                "section_id": row_section,
+                "marked_at": marked_at.isoformat(),
+            }) + "\n").encode()
+    yield (json.dumps({
+        "type": "end",
+        "cursor": format_cursor(*last) if last is not None else None,
+        "count": count,
+        "more": count == limit,
+    }) + "\n").encode()
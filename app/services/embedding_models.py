@@ -0,0 +1,333 @@
+"""
+Embedding models and re-embedding.
+
+The active model (embedding_models.state = 'active') is the one Student.embedding was computed
+with; recognition embeds query faces with it too, so changing FACE_RECOGNITION_MODEL on a live
+database does not break matching. FACE_RECOGNITION_MODEL only picks the model for the first
+enrollment (which pins it).
+
+Rolling out another model: `run_reembed` re-embeds every student's enrollment photos
+(UPLOAD_DIR/<student_id>/) with the new model into student_embeddings, in batches (one
+transaction each, so an interrupted job resumes where it stopped) at a bounded photo rate.
+Students whose photos change while the job runs are picked up again. When nobody is left,
+`activate_model` switches over in one transaction: the old model's vectors are kept in
+student_embeddings (switching back only re-embeds students changed since), Student.embedding
+takes the new ones and the model states flip. The gallery version changes with it, so every
+worker reloads the new gallery (and model) on its next request. The switch is refused
+(MissingEmbeddings) while students who are recognized today would be left without an embedding
+(no photos on disk, or no usable face in them), unless explicitly allowed.
+
+Rebuilding the active model: run_reembed with the active model and a new `version` re-embeds
+everyone whose row has another version (e.g. after the face pipeline changed, so the gallery is
+computed the way query faces are) and switches the same way; the previous version's vectors are
+not kept.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select, insert, update, delete, and_, or_, func, literal, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import FACE_RECOGNITION_MODEL, UPLOAD_DIR
+from app.models import Student, EmbeddingModel, StudentEmbedding
+
+BUILDING, ACTIVE, RETIRED = "building", "active", "retired"
+
+
+class MissingEmbeddings(Exception):
+    """Activating the model would leave these students, who have an embedding now, without one."""
+
+    def __init__(self, student_ids: List[str]):
+        super().__init__(f"{len(student_ids)} student(s) would lose their embedding")
+        self.student_ids = student_ids
+
+
+async def active_model(session: AsyncSession, pin: bool = False) -> str:
+    """
+    Name of the model enrolled embeddings belong to. Before any enrollment this is
+    FACE_RECOGNITION_MODEL; pin=True (enrollment) records it as active so it stays fixed.
+    """
+    name = (await session.execute(
+        select(EmbeddingModel.name).where(EmbeddingModel.state == ACTIVE)
+    )).scalar_one_or_none()
+    if name is not None:
+        return name
+    if pin:
+        existing = (await session.execute(
+            select(EmbeddingModel).where(EmbeddingModel.name == FACE_RECOGNITION_MODEL)
+        )).scalar_one_or_none()
+        if existing is None:
+            session.add(EmbeddingModel(name=FACE_RECOGNITION_MODEL, state=ACTIVE, activated_at=datetime.utcnow()))
+        else:
+            existing.state, existing.activated_at = ACTIVE, datetime.utcnow()
+        await session.flush()
+    return FACE_RECOGNITION_MODEL
+
+
+def pending_students(model: str, version: Optional[str] = None):
+    """
+    Students without an embedding for `model`, or whose record changed after it was computed.
+    With version (rebuilding the active model), rows of any other version are pending too.
+    """
+    stale = [StudentEmbedding.id.is_(None), StudentEmbedding.updated_at < Student.updated_at]
+    if version is not None:
+        stale.append(StudentEmbedding.model_version.is_distinct_from(version))
+    return (
+        select(Student.id, Student.student_id)
+        .outerjoin(StudentEmbedding, and_(StudentEmbedding.student_id == Student.id, StudentEmbedding.model == model))
+        .where(or_(*stale))
+        .order_by(Student.id)
+    )
+
+
+async def _model_version(session: AsyncSession, model: str) -> Optional[str]:
+    return (await session.execute(select(EmbeddingModel.version).where(EmbeddingModel.name == model))).scalar_one_or_none()
+
+
+def losing_students(model: str):
+    """Students with an embedding now but none (no usable face) for `model`."""
+    return (
+        select(Student.student_id)
+        .outerjoin(StudentEmbedding, and_(StudentEmbedding.student_id == Student.id, StudentEmbedding.model == model))
+        .where(Student.embedding.is_not(None), StudentEmbedding.embedding.is_(None))
+        .order_by(Student.id)
+    )
+
+
+async def model_status(session: AsyncSession) -> List[dict]:
+    """Every known model with its state and how many students have an embedding for it."""
+    models = (await session.execute(select(EmbeddingModel).order_by(EmbeddingModel.id))).scalars().all()
+    counts = dict((await session.execute(
+        select(StudentEmbedding.model, func.count(StudentEmbedding.embedding))
+        .group_by(StudentEmbedding.model)
+    )).all())
+    active_count = (await session.execute(
+        select(func.count(Student.id)).where(Student.embedding.is_not(None))
+    )).scalar_one()
+    total = (await session.execute(select(func.count(Student.id)))).scalar_one()
+    out = []
+    for m in models:
+        pending = (await session.execute(
+            select(func.count()).select_from(pending_students(m.name).subquery())
+        )).scalar_one() if m.state == BUILDING else 0
+        out.append({
+            "name": m.name,
+            "version": m.version,
+            "dim": m.dim,
+            "state": m.state,
+            "students_embedded": active_count if m.state == ACTIVE else counts.get(m.name, 0),
+            "students_pending": pending,
+            "students_total": total,
+            "activated_at": m.activated_at,
+        })
+    return out
+
+
+class RateLimiter:
+    """Token bucket: at most `rate` units per second on average (bursts up to one second's worth)."""
+
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        self._tokens = rate or 0.0
+        self._last = time.monotonic()
+
+    async def acquire(self, units: float = 1.0) -> None:
+        if not self.rate:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens >= min(units, self.rate):
+                self._tokens -= units
+                return
+            await asyncio.sleep((min(units, self.rate) - self._tokens) / self.rate)
+
+
+def student_photos(student_id: str) -> List[str]:
+    from app.services.bulk_import import IMAGE_SUFFIXES
+
+    folder = UPLOAD_DIR / student_id
+    try:
+        return sorted(str(p) for p in folder.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES)
+    except OSError:
+        return []
+
+
+async def _register_build(session: AsyncSession, model: str, version: Optional[str]) -> EmbeddingModel:
+    row = (await session.execute(select(EmbeddingModel).where(EmbeddingModel.name == model))).scalar_one_or_none()
+    if row is None:
+        row = EmbeddingModel(name=model, version=version, state=BUILDING)
+        session.add(row)
+    elif row.state != ACTIVE:
+        row.state = BUILDING
+        if version:
+            row.version = version
+    await session.commit()
+    return row
+
+
+async def _write_embeddings(session: AsyncSession, model: str, version: Optional[str], results: List[dict], pks: Dict[str, int]) -> Optional[int]:
+    """
+    Replace the batch's rows for `model` (delete + bulk insert, portable). Returns the dimension seen.
+    Each row is stamped with the time its photos were listed, not the write time, so a student whose
+    record changed while being embedded is still newer than the row and gets picked up again.
+    """
+    ids = [pks[r["student_id"]] for r in results]
+    await session.execute(
+        delete(StudentEmbedding).where(StudentEmbedding.student_id.in_(ids), StudentEmbedding.model == model)
+    )
+    await session.execute(insert(StudentEmbedding), [
+        {
+            "student_id": pks[r["student_id"]],
+            "model": model,
+            "model_version": version,
+            "embedding": r["embedding"],
+            "embedding_count": r["count"],
+            "updated_at": r["listed_at"],
+        }
+        for r in results
+    ])
+    await session.commit()
+    dims = [len(r["embedding"]) for r in results if r["embedding"] is not None]
+    return dims[0] if dims else None
+
+
+async def activate_model(
+    session: AsyncSession, model: str, allow_missing: bool = False, version: Optional[str] = None
+) -> bool:
+    """
+    Switch the gallery to `model` in one transaction, if every student has been processed.
+    Returns False (nothing changed) while students are still pending. Raises MissingEmbeddings
+    (nothing changed) if students who have an embedding now have none for `model`, unless
+    allow_missing; they then drop out of recognition until they upload new photos.
+    If `model` is already active, a `version` other than its current one switches to that rebuild.
+    """
+    current = await active_model(session)
+    rebuild = current == model and version is not None and version != await _model_version(session, model)
+    if current == model and not rebuild:
+        return True
+    pending = (await session.execute(
+        select(func.count()).select_from(pending_students(model, version if rebuild else None).subquery())
+    )).scalar_one()
+    if pending:
+        return False
+    if not allow_missing:
+        missing = (await session.execute(losing_students(model))).scalars().all()
+        if missing:
+            raise MissingEmbeddings(list(missing))
+    now = datetime.utcnow()
+    if not rebuild:
+        # Keep the outgoing vectors so switching back is cheap
+        await session.execute(delete(StudentEmbedding).where(StudentEmbedding.model == current))
+        await session.execute(insert(StudentEmbedding).from_select(
+            ["student_id", "model", "embedding", "embedding_count", "updated_at"],
+            select(Student.id, literal(current), Student.embedding, Student.embedding_count, literal(now, DateTime()))
+            .where(Student.embedding.is_not(None), or_(Student.embedding_model.is_(None), Student.embedding_model == current)),
+        ))
+        await session.execute(update(EmbeddingModel).where(EmbeddingModel.state == ACTIVE).values(state=RETIRED))
+        if (await session.execute(select(EmbeddingModel.id).where(EmbeddingModel.name == current))).first() is None:
+            session.add(EmbeddingModel(name=current, state=RETIRED))
+    chosen = select(StudentEmbedding).where(
+        StudentEmbedding.student_id == Student.id, StudentEmbedding.model == model
+    )
+    await session.execute(
+        update(Student).values(
+            embedding=chosen.with_only_columns(StudentEmbedding.embedding).scalar_subquery(),
+            embedding_count=func.coalesce(
+                chosen.with_only_columns(StudentEmbedding.embedding_count).scalar_subquery(), 0
+            ),
+            embedding_model=model,
+            updated_at=now,
+        )
+    )
+    # Switching leaves every kept vector as fresh as its student
+    await session.execute(update(StudentEmbedding).where(StudentEmbedding.model == model).values(updated_at=now))
+    await session.execute(
+        update(EmbeddingModel).where(EmbeddingModel.name == model)
+        .values(state=ACTIVE, activated_at=now, **({"version": version} if rebuild else {}))
+    )
+    await session.commit()
+    from app.services.gallery import invalidate_gallery_cache
+    invalidate_gallery_cache()
+    return True
+
+
+async def run_reembed(
+    session: AsyncSession,
+    model: str,
+    version: Optional[str] = None,
+    batch_size: int = 50,
+    photos_per_second: Optional[float] = None,
+    workers: Optional[int] = None,
+    activate: bool = True,
+    allow_missing: bool = False,
+    worker_setup: Optional[Callable[[], None]] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Re-embed all pending students' photos with `model` (resumable), then switch over.
+    For the active model, a new `version` rebuilds it (every student is re-embedded once);
+    without one, or with its current version, there is nothing to do (already_active).
+    photos_per_second bounds the load on a live server (None: as fast as the workers go).
+    Returns a summary: processed, no_face (student ids), activated, and missing (student ids that
+    would lose their embedding) when the switch was refused; allow_missing switches anyway.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+    from app.services.bulk_import import _init_worker, embed_student_photos
+
+    rebuild = await active_model(session) == model
+    if rebuild:
+        if version is None or version == await _model_version(session, model):
+            return {"processed": 0, "no_face": [], "activated": False, "already_active": True}
+        build = (await session.execute(select(EmbeddingModel).where(EmbeddingModel.name == model))).scalar_one()
+    else:
+        build = await _register_build(session, model, version)
+        version = build.version
+    pending = pending_students(model, version if rebuild else None)
+    summary = {"processed": 0, "no_face": [], "activated": False}
+    limiter = RateLimiter(photos_per_second)
+    loop = asyncio.get_running_loop()
+    embed = partial(embed_student_photos, model_name=model)
+    ctx = get_context("spawn")  # TensorFlow is not fork-safe
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, mp_context=ctx,
+                             initializer=_init_worker, initargs=(worker_setup,)) as pool:
+        while True:
+            total = (await session.execute(select(func.count()).select_from(pending.subquery()))).scalar_one()
+            batch = (await session.execute(pending.limit(batch_size))).all()
+            if not batch:
+                if not activate:
+                    break
+                try:
+                    if await activate_model(session, model, allow_missing=allow_missing, version=version if rebuild else None):
+                        summary["activated"] = True
+                        break
+                except MissingEmbeddings as e:
+                    summary["missing"] = e.student_ids
+                    break
+                continue  # someone changed photos between the last batch and the switch
+            pks = {sid: pk for pk, sid in batch}
+
+            async def one(sid: str) -> dict:
+                listed_at = datetime.utcnow()
+                paths = student_photos(sid)
+                await limiter.acquire(max(1, len(paths)))
+                result = await loop.run_in_executor(pool, embed, (sid, paths))
+                return {**result, "listed_at": listed_at}
+
+            results = await asyncio.gather(*(one(sid) for _pk, sid in batch))
+            dim = await _write_embeddings(session, model, version, results, pks)
+            if dim and build.dim != dim:
+                build.dim = dim
+                await session.execute(update(EmbeddingModel).where(EmbeddingModel.name == model).values(dim=dim))
+                await session.commit()
+            summary["processed"] += len(results)
+            summary["no_face"].extend(r["student_id"] for r in results if r["embedding"] is None)
+            if progress:
+                progress(summary["processed"], summary["processed"] + total - len(results))
+    return summary
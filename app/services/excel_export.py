@@ -1,34 +1,43 @@
 """
 Generate and update attendance Excel (.xlsx) with Student ID, Name, Date, Status.
+Reads merge the live table with archived months.
 """
 from datetime import date
 from pathlib import Path
 from typing import List, Optional
 
-import pandas as pd
-from openpyxl import load_workbook
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import EXPORTS_DIR
-from app.models import Student, Attendance
+from app.models import Student, Attendance, ClassSession
+from app.services.archive import archived_statuses
+from app.services.rosters import get_roster
 
 
-async def get_attendance_for_date(session: AsyncSession, day: date) -> List[dict]:
-    """Get attendance records for a single day; include all students with Present/Absent."""
-    # All students
-    result = await session.execute(select(Student))
-    students = result.scalars().all()
+async def _students_and_scope(session: AsyncSession, section_id: Optional[int]):
+    """Students to report on and the attendance filter: everyone / institution-wide rows, or a section."""
+    if section_id is None:
+        result = await session.execute(select(Student))
+        return result.scalars().all(), Attendance.session_id.is_(None)
+    students = await get_roster(session, section_id)
+    in_section = Attendance.session_id.in_(select(ClassSession.id).where(ClassSession.section_id == section_id))
+    return students, in_section
+
+
+async def get_attendance_for_date(session: AsyncSession, day: date, section_id: Optional[int] = None) -> List[dict]:
+    """Get attendance records for a single day; include all students (or the section roster) with Present/Absent."""
+    students, scope = await _students_and_scope(session, section_id)
     # Attendance for day
     result = await session.execute(
-        select(Attendance).where(Attendance.date == day)
+        select(Attendance.student_id, Attendance.status).where(Attendance.date == day, scope)
     )
-    records = {a.student_id: a for a in result.scalars().all()}
+    records = {pk: status for pk, _day, status in archived_statuses(day, day, section_id)}
+    records.update(result.all())
 
     rows = []
     for s in students:
-        att = records.get(s.id)
-        status = att.status if att else "Absent"
+        status = records.get(s.id, "Absent")
         rows.append({
             "Student ID": s.student_id,
             "Student Name": s.name,
@@ -43,30 +52,31 @@ async def get_attendance_range(
     from_date: date,
     to_date: date,
     student_ids: Optional[List[str]] = None,
+    section_id: Optional[int] = None,
 ) -> List[dict]:
-    """Get all attendance in date range; optionally filter by student_id list."""
-    result = await session.execute(select(Student))
-    students = result.scalars().all()
+    """Get all attendance in date range; optionally filter by student_id list and/or section."""
+    students, scope = await _students_and_scope(session, section_id)
     if student_ids is not None:
         students = [s for s in students if s.student_id in student_ids]
     if not students:
         return []
 
     result = await session.execute(
-        select(Attendance).where(
+        select(Attendance.date, Attendance.student_id, Attendance.status).where(
             Attendance.date >= from_date,
             Attendance.date <= to_date,
+            scope,
         )
     )
-    all_att = result.scalars().all()
-    by_date_student = {(a.date, a.student_id): a for a in all_att}
+    # Archived (cold) months first, so hot rows win for any backfilled day
+    by_date_student = {(d, pk): status for pk, d, status in archived_statuses(from_date, to_date, section_id)}
+    by_date_student.update({(d, pk): status for d, pk, status in result.all()})
 
     rows = []
     current = from_date
     while current <= to_date:
         for s in students:
-            att = by_date_student.get((current, s.id))
-            status = att.status if att else "Absent"
+            status = by_date_student.get((current, s.id), "Absent")
             rows.append({
                 "Student ID": s.student_id,
                 "Student Name": s.name,
@@ -81,16 +91,21 @@ async def get_attendance_range(
 
 def write_excel(rows: List[dict], filepath: Path) -> Path:
     """Write list of dicts to Excel; columns: Student ID, Student Name, Date, Attendance Status."""
+    import pandas as pd  # lazy: pandas + openpyxl only load when a report is generated
     df = pd.DataFrame(rows)
     df.to_excel(filepath, index=False, sheet_name="Attendance")
     return filepath
 
 
-async def generate_daily_report(session: AsyncSession, day: date) -> Path:
-    """Generate one Excel file for the given day; save to exports/."""
+def _section_suffix(section_id: Optional[int]) -> str:
+    return f"_section{section_id}" if section_id is not None else ""
+
+
+async def generate_daily_report(session: AsyncSession, day: date, section_id: Optional[int] = None) -> Path:
+    """Generate one Excel file for the given day (optionally one section); save to exports/."""
     EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
-    rows = await get_attendance_for_date(session, day)
-    filename = f"attendance_{day.isoformat()}.xlsx"
+    rows = await get_attendance_for_date(session, day, section_id)
+    filename = f"attendance{_section_suffix(section_id)}_{day.isoformat()}.xlsx"
     filepath = EXPORTS_DIR / filename
     write_excel(rows, filepath)
     return filepath
@@ -101,11 +116,12 @@ async def generate_range_report(
     from_date: date,
     to_date: date,
     student_ids: Optional[List[str]] = None,
+    section_id: Optional[int] = None,
 ) -> Path:
     """Generate Excel for date range."""
     EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
-    rows = await get_attendance_range(session, from_date, to_date, student_ids)
-    filename = f"attendance_{from_date.isoformat()}_to_{to_date.isoformat()}.xlsx"
+    rows = await get_attendance_range(session, from_date, to_date, student_ids, section_id)
+    filename = f"attendance{_section_suffix(section_id)}_{from_date.isoformat()}_to_{to_date.isoformat()}.xlsx"
     filepath = EXPORTS_DIR / filename
     write_excel(rows, filepath)
     return filepath
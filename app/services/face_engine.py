@@ -1,25 +1,52 @@
 """
-High-level face recognition pipeline: load registered embeddings from DB, detect faces in image,
-match each face to a student, return list of recognized (student_id, name, confidence).
+High-level face recognition pipeline: load registered embeddings (memory-mapped gallery snapshot
+or DB), detect faces in image (or take device-cropped faces as they are), match each face to a
+student, return list of recognized (student_id, name, confidence). Every face's nearest and
+runner-up student are kept too (RecognitionResult.faces) for the recognition log.
 """
+import asyncio
 import numpy as np
-from typing import List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from pgvector.sqlalchemy import Vector
 
 from app.config import (
     FACE_DETECTOR,
-    FACE_RECOGNITION_MODEL,
     DISTANCE_METRIC,
     THRESHOLD_COSINE,
     THRESHOLD_EUCLIDEAN,
+    EMBED_BATCH_SIZE,
 )
 from app.models import Student
+from app.metrics import timed_stage, FACES_MATCHED, FACES_UNMATCHED, GALLERY_SIZE
 from app.ml.recognizer import (
-    get_embeddings_from_image,
-    find_best_match,
+    embed_faces,
+    extract_face_embeddings,
+    rank_matches,
 )
+from app.services.gallery import load_gallery, load_roster_gallery
+
+
+@dataclass
+class FaceMatch:
+    """One face: its nearest and runner-up enrolled students, whether or not it matched."""
+    box: Optional[Tuple[int, int, int, int]]  # (x, y, w, h) in the image; None for device crops / embeddings
+    student_id: Optional[str]  # matched student (best within threshold), else None
+    best_student_id: str
+    best_distance: float
+    runner_up_student_id: Optional[str] = None  # None when the gallery has one student
+    runner_up_distance: Optional[float] = None
+
+
+@dataclass
+class RecognitionResult:
+    """Outcome of one recognition pass over an image."""
+    recognized: List[Tuple[str, str, float]] = field(default_factory=list)  # (student_id, name, confidence)
+    faces_detected: int = 0
+    rejected: Dict[str, int] = field(default_factory=dict)  # quality-gate rejections by reason
+    faces: List[FaceMatch] = field(default_factory=list)  # every embedded face, matched or not
+    model: Optional[str] = None  # embedding model of the gallery matched against
 
 
 async def load_student_embeddings_db(session: AsyncSession) -> List[Tuple[str, str, np.ndarray]]:
@@ -27,54 +54,148 @@ async def load_student_embeddings_db(session: AsyncSession) -> List[Tuple[str, s
     Load all stored embeddings from the database.
     Returns list of (student_id, name, embedding).
     """
-    stmt = select(Student).where(Student.embedding.is_not(None))
+    stmt = select(Student.student_id, Student.name, Student.embedding).where(Student.embedding.is_not(None))
     result = await session.execute(stmt)
-    students = result.scalars().all()
-    
+
     loaded = []
-    for s in students:
-        # s.embedding is a string or list depending on driver, but pgvector-python handles it
+    for student_id, name, embedding in result.all():
+        # embedding is a string or list depending on driver, but pgvector-python handles it
         # usually it returns a numpy array or list
-        if s.embedding is None:
+        if embedding is None:
             continue
-            
+
         # Ensure it's a numpy array
-        emb = np.array(s.embedding, dtype=np.float32)
-        loaded.append((s.student_id, s.name, emb))
+        emb = np.array(embedding, dtype=np.float32)
+        loaded.append((student_id, name, emb))
     return loaded
 
 
-async def recognize_from_image(session: AsyncSession, image: np.ndarray) -> List[Tuple[str, str, float]]:
+async def _load_gallery(session: AsyncSession, section_id: Optional[int]):
+    """Shared memory-mapped snapshot (or DB when it is stale); with section_id, the roster subset."""
+    with timed_stage("gallery_load"):
+        if section_id is not None:
+            gallery = await load_roster_gallery(session, section_id)
+        else:
+            gallery = await load_gallery(session)
+    GALLERY_SIZE.set(len(gallery))
+    return gallery
+
+
+def _rank(gallery, embeddings: np.ndarray):
+    """rank_matches against the gallery: approximate via its IVF index when it has one."""
+    if gallery.ann is None:
+        return rank_matches(embeddings, gallery.matrix, metric=DISTANCE_METRIC)
+    labels, dists = gallery.ann.search(embeddings, k=2)
+    best, best_dist, second, second_dist = labels[:, 0], dists[:, 0], labels[:, 1], dists[:, 1]
+    second_dist = np.where(second >= 0, second_dist, np.nan)
+    missed = np.nonzero(best < 0)[0]  # probed cells all empty: fall back to exact for those faces
+    if len(missed):
+        exact = rank_matches(embeddings[missed], gallery.matrix, metric=DISTANCE_METRIC)
+        for arr, fill in zip((best, best_dist, second, second_dist), exact):
+            arr[missed] = fill
+    return best, best_dist, second, second_dist
+
+
+def _match(gallery, embeddings, boxes=None) -> Tuple[List[Tuple[str, str, float]], List[FaceMatch]]:
+    """
+    Match all embeddings (list of vectors, or an (N, D) array) against the gallery matrix in one pass.
+    Returns (student_id, name, confidence) per match, and a FaceMatch per embedding.
+    """
+    if not isinstance(embeddings, np.ndarray):
+        embeddings = np.stack(embeddings) if embeddings else np.zeros((0, 0), np.float32)
+    recognized, faces = [], []
+    if len(embeddings) == 0:
+        return recognized, faces
+    threshold = THRESHOLD_COSINE if DISTANCE_METRIC == "cosine" else THRESHOLD_EUCLIDEAN
+    with timed_stage("match"):
+        best, best_dist, second, second_dist = _rank(gallery, embeddings)
+        for k, (idx, dist) in enumerate(zip(best.tolist(), best_dist.tolist())):
+            matched = dist <= threshold
+            if matched:
+                conf = 1.0 - dist if DISTANCE_METRIC == "cosine" else max(0, 1.0 - dist / THRESHOLD_EUCLIDEAN)
+                recognized.append((gallery.student_ids[idx], gallery.names[idx], round(float(conf), 4)))
+            runner_up = int(second[k])
+            faces.append(FaceMatch(
+                box=tuple(int(v) for v in boxes[k]) if boxes is not None else None,
+                student_id=gallery.student_ids[idx] if matched else None,
+                best_student_id=gallery.student_ids[idx],
+                best_distance=float(dist),
+                runner_up_student_id=gallery.student_ids[runner_up] if runner_up >= 0 else None,
+                runner_up_distance=float(second_dist[k]) if runner_up >= 0 else None,
+            ))
+    FACES_MATCHED.inc(len(recognized))
+    FACES_UNMATCHED.inc(len(embeddings) - len(recognized))
+    return recognized, faces
+
+
+async def recognize_from_image(
+    session: AsyncSession,
+    image: np.ndarray,
+    section_id: Optional[int] = None,
+) -> RecognitionResult:
     """
     Detect all faces in image and match to registered students using DB embeddings.
-    Returns list of (student_id, name, confidence) for each recognized face.
+    With section_id, faces are matched only against that section's roster.
+    Returns the recognized (student_id, name, confidence) per matched face, plus how many
+    faces were detected and how many the quality gate rejected (by reason).
     """
-    # 1. Get known embeddings from DB
-    known = await load_student_embeddings_db(session)
-    if not known:
+    gallery = await _load_gallery(session, section_id)
+    if not len(gallery):
         # Even if no students, we might want to detect faces? No, can't recognize.
-        return []
+        return RecognitionResult()
 
-    # 2. Detect faces and get embeddings (CPU bound, blocking)
-    # Ideally run in executor, but for simplicity we run here
-    face_list = get_embeddings_from_image(
+    # Detect faces, gate on quality, align and embed (CPU bound: off the event loop,
+    # so /health and other requests stay responsive while recognition runs)
+    extracted = await asyncio.to_thread(
+        extract_face_embeddings,
         image,
         detector_backend=FACE_DETECTOR,
-        model_name=FACE_RECOGNITION_MODEL,
+        model_name=gallery.model,
+    )
+    recognized, faces = _match(
+        gallery, [emb for _bbox, emb in extracted.faces], boxes=[bbox for bbox, _emb in extracted.faces]
     )
-    
-    recognized = []
-    for _bbox, emb in face_list:
-        match = find_best_match(
-            emb,
-            known,
-            metric=DISTANCE_METRIC,
-            threshold_cosine=THRESHOLD_COSINE,
-            threshold_euclidean=THRESHOLD_EUCLIDEAN,
+    return RecognitionResult(recognized, extracted.detected, extracted.rejected, faces, gallery.model)
+
+
+async def recognize_from_faces(
+    session: AsyncSession,
+    crops: List[np.ndarray],
+    section_id: Optional[int] = None,
+) -> RecognitionResult:
+    """
+    Match faces that were already detected, cropped and aligned on the device (RGB arrays).
+    No detection or quality gate: the crops are embedded in batches and matched in one pass.
+    faces_detected is the number of crops received.
+    """
+    gallery = await _load_gallery(session, section_id)
+    if not len(gallery):
+        return RecognitionResult(faces_detected=len(crops))
+    with timed_stage("embed"):
+        embeddings = await asyncio.to_thread(
+            embed_faces, crops, model_name=gallery.model, batch_size=EMBED_BATCH_SIZE
         )
-        if match:
-            sid, name, dist = match
-            conf = 1.0 - dist if DISTANCE_METRIC == "cosine" else max(0, 1.0 - dist / THRESHOLD_EUCLIDEAN)
-            recognized.append((sid, name, round(float(conf), 4)))
-            
-    return recognized
+    recognized, faces = _match(gallery, [emb for emb in embeddings if emb is not None])
+    return RecognitionResult(recognized, len(crops), faces=faces, model=gallery.model)
+
+
+async def recognize_from_embeddings(
+    session: AsyncSession,
+    embeddings: np.ndarray,
+    section_id: Optional[int] = None,
+    model: Optional[str] = None,
+) -> RecognitionResult:
+    """
+    Match embeddings computed on the device (N x D float32, same model as the gallery) in one
+    vectorized call; no image work at all. Raises ValueError when `model` (if given) is not the
+    gallery's model or D differs from the gallery's.
+    """
+    gallery = await _load_gallery(session, section_id)
+    if model is not None and model != gallery.model:
+        raise ValueError(f"Embeddings from model {model!r} cannot be matched; the gallery uses {gallery.model!r}")
+    if not len(gallery):
+        return RecognitionResult(faces_detected=len(embeddings))
+    if embeddings.shape[1] != gallery.matrix.shape[1]:
+        raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match gallery ({gallery.matrix.shape[1]})")
+    recognized, faces = _match(gallery, embeddings)
+    return RecognitionResult(recognized, len(embeddings), faces=faces, model=gallery.model)
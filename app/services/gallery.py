@@ -0,0 +1,287 @@
+"""
+Gallery of enrolled embeddings as one contiguous float32 matrix plus an id/name index.
+
+The gallery is exported to a versioned on-disk snapshot (GALLERY_SNAPSHOT_DIR/<version>/:
+embeddings.npy + index.json). Workers memory-map the matrix read-only, so its pages live
+once in the OS page cache and are shared by every worker process instead of each holding
+a private copy. A cheap version query (count / max id / max updated_at of enrolled students)
+detects stale snapshots; a stale or missing snapshot falls back to a DB reload, which then
+writes the new snapshot for the other workers.
+
+The gallery records the active embedding model (see app.services.embedding_models): query faces
+must be embedded with the same model. Switching models rewrites every student row, so the
+version token changes with it.
+
+Galleries of at least ANN_MIN_GALLERY students also carry an approximate IVF index
+(app.ml.ann) for matching. It is saved next to the snapshot (ivf/), so one worker trains it and
+the others memory-map it; when the version changes, the previous index is patched with the
+added / changed / removed rows instead of retrained (until the gallery doubles).
+
+Section rosters get their own small gallery: the roster's rows sliced out of the shared matrix,
+cached per section until the gallery version or the roster changes.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import select, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    GALLERY_SNAPSHOT_DIR,
+    GALLERY_SNAPSHOTS_KEEP,
+    FACE_RECOGNITION_MODEL,
+    DISTANCE_METRIC,
+    ANN_MIN_GALLERY,
+    ANN_NLIST,
+    ANN_NPROBE,
+)
+from app.models import Student, SectionEnrollment
+
+if TYPE_CHECKING:
+    from app.ml.ann import IVFIndex
+
+SNAPSHOT_FORMAT = 2
+
+
+@dataclass
+class Gallery:
+    """Enrolled embeddings: row i of `matrix` belongs to student_ids[i] / names[i]."""
+    version: str
+    student_ids: List[str]
+    names: List[str]
+    matrix: np.ndarray  # (N, D) float32; read-only memmap when loaded from a snapshot
+    source: str = "db"  # db | snapshot | memory | roster
+    model: str = FACE_RECOGNITION_MODEL  # embedding model the rows were computed with
+    ann: Optional["IVFIndex"] = field(default=None, repr=False)  # labels are row positions
+    _positions: Optional[dict] = field(default=None, repr=False)
+
+    def __len__(self) -> int:
+        return len(self.student_ids)
+
+    def position(self, student_id: str) -> Optional[int]:
+        if self._positions is None:
+            self._positions = {sid: i for i, sid in enumerate(self.student_ids)}
+        return self._positions.get(student_id)
+
+
+# Per-process cache: reused as long as the DB version is unchanged
+_current: Optional[Gallery] = None
+# Per-process roster galleries by section id (LRU)
+_rosters: "OrderedDict[int, Gallery]" = OrderedDict()
+ROSTER_CACHE_SIZE = 128
+
+
+async def gallery_version(session: AsyncSession) -> str:
+    """Change token for the enrolled gallery; one aggregate query, no embeddings transferred."""
+    row = (await session.execute(
+        select(func.count(Student.id), func.max(Student.id), func.max(Student.updated_at))
+        .where(Student.embedding.is_not(None))
+    )).one()
+    token = f"{SNAPSHOT_FORMAT}|{row[0]}|{row[1]}|{row[2]}"
+    return hashlib.sha1(token.encode()).hexdigest()[:16]
+
+
+async def load_gallery_from_db(session: AsyncSession, version: str) -> Gallery:
+    """Load only the columns needed for matching, straight into one contiguous matrix."""
+    from app.services.embedding_models import active_model
+
+    model = await active_model(session)
+    result = await session.execute(
+        select(Student.student_id, Student.name, Student.embedding)
+        .where(
+            Student.embedding.is_not(None),
+            or_(Student.embedding_model.is_(None), Student.embedding_model == model),
+        )
+        .order_by(Student.id)
+    )
+    ids, names, vectors = [], [], []
+    for sid, name, emb in result.all():
+        ids.append(sid)
+        names.append(name)
+        vectors.append(np.asarray(emb, dtype=np.float32))
+    matrix = np.ascontiguousarray(np.stack(vectors)) if vectors else np.zeros((0, 0), dtype=np.float32)
+    return Gallery(version=version, student_ids=ids, names=names, matrix=matrix, source="db", model=model)
+
+
+def snapshot_path(version: str, root: Path = GALLERY_SNAPSHOT_DIR) -> Path:
+    return root / version
+
+
+def read_snapshot(version: str, root: Path = GALLERY_SNAPSHOT_DIR) -> Optional[Gallery]:
+    """Memory-map a snapshot read-only; None if missing or unreadable."""
+    folder = snapshot_path(version, root)
+    try:
+        index = json.loads((folder / "index.json").read_text(encoding="utf-8"))
+        if index.get("version") != version or index.get("format") != SNAPSHOT_FORMAT:
+            return None
+        matrix = np.load(folder / "embeddings.npy", mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if matrix.shape[0] != len(index["student_ids"]):
+        return None
+    return Gallery(version=version, student_ids=index["student_ids"], names=index["names"],
+                   matrix=matrix, source="snapshot", model=index["model"])
+
+
+def write_snapshot(gallery: Gallery, root: Path = GALLERY_SNAPSHOT_DIR) -> Optional[Path]:
+    """
+    Atomically publish a snapshot (write to a temp dir, then rename). Returns its path, or None
+    if the filesystem is read-only or another worker published the same version first.
+    """
+    target = snapshot_path(gallery.version, root)
+    if target.exists():
+        return target
+    tmp = root / f".tmp-{uuid.uuid4().hex}"
+    try:
+        tmp.mkdir(parents=True)
+        np.save(tmp / "embeddings.npy", np.ascontiguousarray(gallery.matrix, dtype=np.float32))
+        (tmp / "index.json").write_text(json.dumps({
+            "format": SNAPSHOT_FORMAT,
+            "version": gallery.version,
+            "model": gallery.model,
+            "student_ids": gallery.student_ids,
+            "names": gallery.names,
+        }), encoding="utf-8")
+        os.rename(tmp, target)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return target if target.exists() else None
+    prune_snapshots(root, keep=GALLERY_SNAPSHOTS_KEEP)
+    return target
+
+
+def prune_snapshots(root: Path = GALLERY_SNAPSHOT_DIR, keep: int = 2) -> None:
+    """Delete all but the newest `keep` snapshots (mapped pages stay valid until unmapped)."""
+    try:
+        snaps = sorted(
+            (p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True,
+        )
+    except OSError:
+        return
+    for old in snaps[keep:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def update_index(index: "IVFIndex", old: Gallery, new: Gallery) -> "IVFIndex":
+    """Copy of `index` (built for `old`) relabelled to `new`'s rows: unchanged rows kept, the rest re-added."""
+    positions = [(i, new.position(sid)) for i, sid in enumerate(old.student_ids)]
+    kept = np.array([(i, j) for i, j in positions if j is not None], dtype=np.int64).reshape(-1, 2)
+    same = (np.asarray(old.matrix[kept[:, 0]]) == np.asarray(new.matrix[kept[:, 1]])).all(axis=1)
+    kept = kept[same]
+    mapping = np.full(len(old), -1, dtype=np.int64)
+    mapping[kept[:, 0]] = kept[:, 1]
+    index = index.copy()
+    index.remap(mapping)
+    added = np.setdiff1d(np.arange(len(new)), kept[:, 1])
+    if len(added):
+        index.add(added, new.matrix[added])
+    return index
+
+
+def build_index(gallery: Gallery, previous: Optional[Gallery] = None) -> "IVFIndex":
+    """
+    IVF index for `gallery`: the one saved with its snapshot, else `previous`'s patched, else
+    newly trained. A built index is saved into the snapshot folder for the other workers.
+    """
+    from app.ml.ann import IVFIndex
+
+    folder = snapshot_path(gallery.version) / "ivf"
+    index = IVFIndex.load(folder)
+    if index is not None and len(index) == len(gallery):
+        index.nprobe = ANN_NPROBE
+        return index
+    prev = previous.ann if previous is not None else None
+    if (prev is not None and previous.model == gallery.model
+            and prev.centroids.shape[1] == gallery.matrix.shape[1] and len(gallery) <= 2 * prev.trained_size):
+        index = update_index(prev, previous, gallery)
+    else:
+        index = IVFIndex.train(gallery.matrix, nlist=ANN_NLIST or None, metric=DISTANCE_METRIC, nprobe=ANN_NPROBE)
+        index.add(np.arange(len(gallery)), gallery.matrix)
+    if folder.parent.is_dir():
+        try:
+            index.save(folder)
+        except OSError:
+            pass  # read-only snapshot dir: every worker builds its own
+    return index
+
+
+async def load_gallery(session: AsyncSession) -> Gallery:
+    """
+    Current gallery for matching: the in-process copy if still current, else the shared
+    memory-mapped snapshot, else a DB reload (which publishes a fresh snapshot).
+    """
+    global _current
+    version = await gallery_version(session)
+    if _current is not None and _current.version == version:
+        return _current
+    gallery = read_snapshot(version)
+    if gallery is None:
+        gallery = await load_gallery_from_db(session, version)
+        if len(gallery):
+            write_snapshot(gallery)
+    if ANN_MIN_GALLERY and len(gallery) >= ANN_MIN_GALLERY:
+        gallery.ann = await asyncio.to_thread(build_index, gallery, _current)
+    _current = gallery
+    return gallery
+
+
+def subset_gallery(gallery: Gallery, student_ids: Sequence[str], version: str) -> Gallery:
+    """Rows of `gallery` for the given students (unknown / not enrolled ids are skipped)."""
+    positions = [p for p in (gallery.position(sid) for sid in student_ids) if p is not None]
+    if positions:
+        matrix = np.ascontiguousarray(gallery.matrix[positions], dtype=np.float32)
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    return Gallery(
+        version=version,
+        student_ids=[gallery.student_ids[p] for p in positions],
+        names=[gallery.names[p] for p in positions],
+        matrix=matrix,
+        source="roster",
+        model=gallery.model,
+    )
+
+
+async def load_roster_gallery(session: AsyncSession, section_id: int) -> Gallery:
+    """
+    Gallery restricted to one section's roster. Costs the gallery version query plus one
+    indexed roster query; the sliced matrix is reused while neither changes.
+    """
+    gallery = await load_gallery(session)
+    result = await session.execute(
+        select(Student.student_id)
+        .join(SectionEnrollment, SectionEnrollment.student_id == Student.id)
+        .where(SectionEnrollment.section_id == section_id, Student.embedding.is_not(None))
+        .order_by(Student.id)
+    )
+    roster = [row[0] for row in result.all()]
+    roster_token = hashlib.sha1("\n".join(roster).encode()).hexdigest()[:16]
+    version = f"{gallery.version}:{roster_token}"
+    cached = _rosters.get(section_id)
+    if cached is not None and cached.version == version:
+        _rosters.move_to_end(section_id)
+        return cached
+    sub = subset_gallery(gallery, roster, version)
+    _rosters[section_id] = sub
+    _rosters.move_to_end(section_id)
+    while len(_rosters) > ROSTER_CACHE_SIZE:
+        _rosters.popitem(last=False)
+    return sub
+
+
+def invalidate_gallery_cache() -> None:
+    """Drop the in-process galleries (e.g. in tests or after a bulk change in this process)."""
+    global _current
+    _current = None
+    _rosters.clear()
@@ -0,0 +1,156 @@
+"""
+Monthly range partitioning of the attendance table (PostgreSQL only).
+
+`convert_to_partitioned` rebuilds an existing plain `attendance` table as
+PARTITION BY RANGE (date) with one child table per month (attendance_y2024m01, ...) plus a
+DEFAULT partition, preserving ids, rows and the unique keys. Date-filtered queries then only
+touch the months they cover, and archiving a closed month is a DROP of its partition instead
+of a bulk DELETE. `ensure_partitions` creates upcoming months; it runs at startup and is a
+no-op when the table is not partitioned.
+
+SQLite has no native partitioning; there the hot table is kept small by archival alone
+(see app.services.archive).
+"""
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+TABLE = "attendance"
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + (day.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def month_range(first: date, last: date) -> List[date]:
+    """Month starts from first's month to last's month inclusive."""
+    months, current = [], month_start(first)
+    while current <= month_start(last):
+        months.append(current)
+        current = add_months(current, 1)
+    return months
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    result = await conn.execute(text(
+        "select 1 from pg_partitioned_table p join pg_class c on c.oid = p.partrelid "
+        "where c.relname = :name and pg_table_is_visible(c.oid)"
+    ), {"name": TABLE})
+    return result.first() is not None
+
+
+async def existing_partitions(conn: AsyncConnection) -> List[str]:
+    result = await conn.execute(text(
+        "select c.relname from pg_inherits i "
+        "join pg_class c on c.oid = i.inhrelid join pg_class p on p.oid = i.inhparent "
+        "where p.relname = :name and pg_table_is_visible(p.oid)"
+    ), {"name": TABLE})
+    return [row[0] for row in result.all()]
+
+
+async def create_partition(conn: AsyncConnection, month: date) -> None:
+    await conn.execute(text(
+        f"create table if not exists {partition_name(month)} partition of {TABLE} "
+        f"for values from ('{month.isoformat()}') to ('{add_months(month, 1).isoformat()}')"
+    ))
+
+
+async def ensure_partitions(conn: AsyncConnection, months_ahead: int = 3, today: Optional[date] = None) -> List[str]:
+    """Create partitions for this month and the next `months_ahead`. Returns names created."""
+    if not await is_partitioned(conn):
+        return []
+    today = today or date.today()
+    have = set(await existing_partitions(conn))
+    created = []
+    for month in month_range(today, add_months(today, months_ahead)):
+        name = partition_name(month)
+        if name not in have:
+            await create_partition(conn, month)
+            created.append(name)
+    return created
+
+
+async def lock_partition(conn: AsyncConnection, month: date) -> bool:
+    """Block writes to one month's partition until the transaction ends (reads still run). False if there is none."""
+    name = partition_name(month)
+    if name not in set(await existing_partitions(conn)):
+        return False
+    await conn.execute(text(f"lock table {name} in exclusive mode"))
+    return True
+
+
+async def drop_partition(conn: AsyncConnection, month: date) -> bool:
+    """Drop one month's partition (after it has been archived). False if there is none."""
+    name = partition_name(month)
+    if name not in set(await existing_partitions(conn)):
+        return False
+    await conn.execute(text(f"drop table {name}"))
+    return True
+
+
+async def convert_to_partitioned(conn: AsyncConnection, months_ahead: int = 3) -> List[str]:
+    """
+    Rebuild `attendance` as a month-partitioned table inside the caller's transaction.
+    The id sequence is kept (so ids continue), the primary key becomes (id, date) as
+    partitioning requires, and the unique keys are recreated on the parent.
+    Returns the partitions created.
+    """
+    if conn.dialect.name != "postgresql":
+        raise RuntimeError("Native partitioning requires PostgreSQL")
+    if await is_partitioned(conn):
+        return []
+    old = f"{TABLE}_unpartitioned"
+    seq = (await conn.execute(text(f"select pg_get_serial_sequence('{TABLE}', 'id')"))).scalar()
+    bounds = (await conn.execute(text(f"select min(date), max(date) from {TABLE}"))).one()
+
+    await conn.execute(text(f"alter table {TABLE} rename to {old}"))
+    if seq:
+        # Keep the sequence alive when the old table is dropped
+        await conn.execute(text(f"alter sequence {seq} owned by none"))
+    await conn.execute(text(
+        f"create table {TABLE} (like {old} including defaults) partition by range (date)"
+    ))
+    today = date.today()
+    first = bounds[0] or today
+    last = max(bounds[1] or today, add_months(today, months_ahead))
+    created = []
+    for month in month_range(first, last):
+        await create_partition(conn, month)
+        created.append(partition_name(month))
+    await conn.execute(text(f"create table if not exists {TABLE}_default partition of {TABLE} default"))
+    await conn.execute(text(f"insert into {TABLE} select * from {old}"))
+    await conn.execute(text(f"drop table {old}"))
+
+    await conn.execute(text(f"alter table {TABLE} add primary key (id, date)"))
+    await conn.execute(text(
+        f"alter table {TABLE} add constraint {TABLE}_student_id_fkey "
+        f"foreign key (student_id) references students (id)"
+    ))
+    await conn.execute(text(
+        f"alter table {TABLE} add constraint {TABLE}_session_id_fkey "
+        f"foreign key (session_id) references class_sessions (id)"
+    ))
+    await conn.execute(text(
+        f"create unique index uq_student_date on {TABLE} (student_id, date) where session_id is null"
+    ))
+    await conn.execute(text(
+        f"alter table {TABLE} add constraint uq_session_student unique (session_id, student_id, date)"
+    ))
+    await conn.execute(text(f"create index ix_{TABLE}_date on {TABLE} (date)"))
+    await conn.execute(text(f"create index ix_{TABLE}_marked_at on {TABLE} (marked_at, id)"))
+    if seq:
+        await conn.execute(text(f"alter sequence {seq} owned by {TABLE}.id"))
+    return created
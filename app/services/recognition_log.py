@@ -0,0 +1,153 @@
+"""
+Write-behind recognition event log: every face a recognition pass embedded (box, nearest and
+runner-up student with distances, matched or not) goes to recognition_events.
+
+Routers and the video ingest hand results to `log_recognition`, which only appends rows to an
+in-process buffer; no DB work is added to the marking request. The buffer is written by one
+bulk INSERT in its own short transaction when it reaches RECOGNITION_LOG_BATCH rows, every
+RECOGNITION_LOG_FLUSH_SECONDS, and at shutdown (app lifespan / CLI). A failed write puts its rows
+back at the head of the buffer for the next flush; past RECOGNITION_LOG_MAX_BUFFER rows (DB
+down), the oldest are dropped and counted. A crash loses at most the unflushed rows; the log is
+diagnostic, attendance itself is never written here.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime
+from typing import List, Optional
+
+from app.config import (
+    RECOGNITION_LOG_ENABLED,
+    RECOGNITION_LOG_BATCH,
+    RECOGNITION_LOG_FLUSH_SECONDS,
+    RECOGNITION_LOG_MAX_BUFFER,
+)
+from app.metrics import RECOGNITION_LOG_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionLog:
+    """Per-process buffer; flushes from the event loop that records into it."""
+
+    def __init__(self, batch_size: int, flush_seconds: float, max_buffer: int):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self._buffer: List[dict] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._pending: set = set()  # flushes in flight
+
+    def record(self, result, day: date, source: str, section_id: Optional[int] = None,
+               session_id: Optional[int] = None) -> None:
+        """Queue one row per face of a RecognitionResult. Never blocks and never touches the DB."""
+        if not result.faces:
+            return
+        now = datetime.utcnow()
+        batch_id = uuid.uuid4().hex
+        for face in result.faces:
+            x, y, w, h = face.box if face.box is not None else (None, None, None, None)
+            self._buffer.append({
+                "created_at": now,
+                "date": day,
+                "batch_id": batch_id,
+                "source": source[:50] if source else None,
+                "section_id": section_id,
+                "session_id": session_id,
+                "model": result.model,
+                "box_x": x, "box_y": y, "box_w": w, "box_h": h,
+                "matched_student_id": face.student_id,
+                "best_student_id": face.best_student_id,
+                "best_distance": face.best_distance,
+                "runner_up_student_id": face.runner_up_student_id,
+                "runner_up_distance": face.runner_up_distance,
+            })
+        self._trim()
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._flush_periodically())
+        # One size-triggered flush at a time: while the DB is down the timer does the retries
+        if len(self._buffer) >= self.batch_size and not self._pending:
+            self._spawn_flush()
+
+    def _trim(self) -> None:
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            RECOGNITION_LOG_EVENTS.inc(overflow, result="dropped")
+
+    def _spawn_flush(self) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            # Shielded: close() cancelling the timer must not abort a write in progress
+            await asyncio.shield(self._spawn_flush())
+            if not self._buffer:
+                return  # idle: the next record() restarts the timer
+
+    async def flush(self) -> int:
+        """Write everything buffered so far in one bulk INSERT. Returns rows written."""
+        from sqlalchemy import insert
+        from app.database import AsyncSessionLocal
+        from app.models import RecognitionEvent
+
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(RecognitionEvent), rows)
+                await session.commit()
+        except Exception:
+            logger.exception("recognition log: writing %d events failed; keeping them for the next flush", len(rows))
+            RECOGNITION_LOG_EVENTS.inc(len(rows), result="failed")
+            # Oldest first, ahead of whatever was recorded meanwhile; still capped at max_buffer
+            self._buffer = rows + self._buffer
+            self._trim()
+            return 0
+        RECOGNITION_LOG_EVENTS.inc(len(rows), result="written")
+        return len(rows)
+
+    async def close(self) -> None:
+        """Stop the timer, wait for in-flight flushes and write what is left."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        await self.flush()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+_log: Optional[RecognitionLog] = None
+
+
+def get_recognition_log() -> Optional[RecognitionLog]:
+    """The process-wide log, or None when RECOGNITION_LOG_ENABLED is off."""
+    global _log
+    if not RECOGNITION_LOG_ENABLED:
+        return None
+    if _log is None:
+        _log = RecognitionLog(RECOGNITION_LOG_BATCH, RECOGNITION_LOG_FLUSH_SECONDS, RECOGNITION_LOG_MAX_BUFFER)
+    return _log
+
+
+def log_recognition(result, day: date, source: str, section_id: Optional[int] = None,
+                    class_session=None) -> None:
+    """Buffer a recognition pass's faces (no-op when the log is disabled)."""
+    log = get_recognition_log()
+    if log is not None:
+        log.record(result, day, source, section_id=section_id,
+                   session_id=class_session.id if class_session is not None else None)
+
+
+async def close_recognition_log() -> None:
+    """Flush the buffer (app shutdown / end of a CLI run)."""
+    if _log is not None:
+        await _log.close()
@@ -0,0 +1,96 @@
+"""
+Conditional GET support for polled read endpoints.
+
+The caller supplies a cheap change token (e.g. row count + max marked_at for the day). The
+ETag is derived from the endpoint key and that token: a matching If-None-Match gets an empty
+304, and otherwise the serialized body is served from a small per-worker LRU cache as long as
+the token is unchanged. Only when the token moves is the response rebuilt.
+"""
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.metrics import RESPONSE_CACHE
+
+
+class ResponseCache:
+    """LRU of serialized JSON bodies: key -> (etag, body)."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+
+    def get(self, key: tuple, etag: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, etag: str, body: bytes) -> None:
+        self._entries[key] = (etag, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def _get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        from app.config import RESPONSE_CACHE_SIZE
+        _cache = ResponseCache(RESPONSE_CACHE_SIZE)
+    return _cache
+
+
+def make_etag(key: tuple, token: str) -> str:
+    digest = hashlib.sha1(repr((key, token)).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are equivalent for If-None-Match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+async def conditional_json(
+    request: Request,
+    key: tuple,
+    token: str,
+    build: Callable[[], Awaitable[object]],
+) -> Response:
+    """304 if the client's copy is current, else the cached or freshly built JSON body with an ETag."""
+    etag = make_etag(key, token)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}  # always revalidate, cheap when unchanged
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        RESPONSE_CACHE.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+    cache = _get_cache()
+    body = cache.get(key, etag)
+    if body is None:
+        RESPONSE_CACHE.inc(result="miss")
+        body = JSONResponse(jsonable_encoder(await build())).body
+        cache.put(key, etag, body)
+    else:
+        RESPONSE_CACHE.inc(result="hit")
+    return Response(content=body, media_type="application/json", headers=headers)
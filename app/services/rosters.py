@@ -0,0 +1,93 @@
+"""
+Course/section rosters and class sessions: who is expected in a section, and the session
+that section attendance for a date is keyed by.
+"""
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import insert_ignoring_conflicts
+from app.models import Student, Section, SectionEnrollment, ClassSession
+
+
+async def get_section(session: AsyncSession, section_id: int) -> Optional[Section]:
+    return await session.get(Section, section_id)
+
+
+async def get_roster(session: AsyncSession, section_id: int) -> List[Student]:
+    """Students enrolled in the section, in enrollment-independent (id) order."""
+    result = await session.execute(
+        select(Student)
+        .join(SectionEnrollment, SectionEnrollment.student_id == Student.id)
+        .where(SectionEnrollment.section_id == section_id)
+        .order_by(Student.id)
+    )
+    return list(result.scalars().all())
+
+
+async def get_roster_pks(session: AsyncSession, section_id: int) -> List[int]:
+    """Primary keys (students.id) of the section's roster."""
+    result = await session.execute(
+        select(SectionEnrollment.student_id).where(SectionEnrollment.section_id == section_id)
+    )
+    return [row[0] for row in result.all()]
+
+
+async def resolve_student_ids(session: AsyncSession, student_ids: List[str]) -> tuple:
+    """Map student_id strings to primary keys. Returns ({student_id: pk}, [unknown ids])."""
+    if not student_ids:
+        return {}, []
+    result = await session.execute(
+        select(Student.student_id, Student.id).where(Student.student_id.in_(student_ids))
+    )
+    found = {sid: pk for sid, pk in result.all()}
+    return found, [sid for sid in student_ids if sid not in found]
+
+
+async def add_to_roster(session: AsyncSession, section_id: int, student_pks: List[int]) -> int:
+    """Enroll students (already-enrolled ones are skipped). Returns number added."""
+    existing = set(await get_roster_pks(session, section_id))
+    new = [pk for pk in dict.fromkeys(student_pks) if pk not in existing]
+    if not new:
+        return 0
+    # Rows a concurrent request enrolled after our read are skipped, and not counted
+    result = await session.execute(
+        insert_ignoring_conflicts(session, SectionEnrollment).returning(SectionEnrollment.student_id),
+        [{"section_id": section_id, "student_id": pk} for pk in new],
+    )
+    return len(result.all())
+
+
+async def remove_from_roster(session: AsyncSession, section_id: int, student_pks: List[int]) -> int:
+    """Unenroll students. Returns number removed."""
+    if not student_pks:
+        return 0
+    result = await session.execute(
+        delete(SectionEnrollment).where(
+            SectionEnrollment.section_id == section_id,
+            SectionEnrollment.student_id.in_(student_pks),
+        )
+    )
+    return result.rowcount or 0
+
+
+async def get_class_session(session: AsyncSession, section_id: int, day: date) -> Optional[ClassSession]:
+    result = await session.execute(
+        select(ClassSession).where(ClassSession.section_id == section_id, ClassSession.date == day)
+    )
+    return result.scalar_one_or_none()
+
+
+async def get_or_create_class_session(session: AsyncSession, section_id: int, day: date) -> ClassSession:
+    """The section's session for the date, created on first marking."""
+    existing = await get_class_session(session, section_id, day)
+    if existing:
+        return existing
+    # Two markings of the section can both find no session: the later insert is skipped
+    # (uq_section_date) and both read back the same row
+    await session.execute(
+        insert_ignoring_conflicts(session, ClassSession).values(section_id=section_id, date=day)
+    )
+    return await get_class_session(session, section_id, day)
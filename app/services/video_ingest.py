@@ -0,0 +1,415 @@
+"""
+Continuous attendance from a video file or a stream (RTSP/HTTP URL, or a webcam index).
+
+Frames are read with OpenCV and only some reach the recognition pipeline: a frame is processed
+when the scene changed enough since the last processed frame (mean grayscale difference on a
+small thumbnail), at most every `min_interval` and at least every `max_interval` seconds.
+A student is marked the first time they have been seen in `min_sightings` processed frames;
+later sightings are ignored, so a class sitting still costs one DB write per student.
+When the source ends (or the session window closes) everyone not seen is marked Absent.
+A live source that drops inside its session window is reopened with exponential backoff,
+keeping the sightings so far; absentees are filled only once the window has closed.
+
+Files are read frame by frame on video time. Live sources are read by a thread that keeps only
+the newest frame, so processing never falls behind real time; frames replaced before they were
+picked up are counted as dropped.
+
+Runs from `python -m scripts.ingest_video` or, for the jobs in INGEST_SOURCES, from the app
+lifespan (one worker per host runs them, see `start_configured_ingest`).
+"""
+import asyncio
+import json
+import logging
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+from datetime import time as dtime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import (
+    INGEST_SOURCES,
+    INGEST_MIN_INTERVAL,
+    INGEST_MAX_INTERVAL,
+    INGEST_MOTION_THRESHOLD,
+    INGEST_MIN_SIGHTINGS,
+)
+from app.metrics import INGEST_FRAMES
+
+logger = logging.getLogger(__name__)
+
+THUMB_SIZE = (64, 36)  # motion thumbnail (w, h)
+RECONNECT_MIN_SECONDS = 2.0  # first wait before reopening a dropped live source, doubled per failure
+RECONNECT_MAX_SECONDS = 60.0
+
+
+@dataclass
+class IngestConfig:
+    source: str  # file path, stream URL or webcam index ("0")
+    section_id: Optional[int] = None
+    day: Optional[date] = None  # attendance day (default: today)
+    start: Optional[dtime] = None  # daily session window (live sources); None: start now
+    end: Optional[dtime] = None  # None: until the source ends
+    min_interval: float = INGEST_MIN_INTERVAL  # seconds between processed frames, at least
+    max_interval: float = INGEST_MAX_INTERVAL  # process a frame at least this often, motion or not
+    motion_threshold: float = INGEST_MOTION_THRESHOLD  # mean abs grayscale difference (0-255)
+    min_sightings: int = INGEST_MIN_SIGHTINGS  # processed frames a student must appear in
+    fill_absent: bool = True
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IngestConfig":
+        data = dict(data)
+        for key in ("start", "end"):
+            if isinstance(data.get(key), str):
+                data[key] = dtime.fromisoformat(data[key])
+        if isinstance(data.get("day"), str):
+            data["day"] = date.fromisoformat(data["day"])
+        return cls(**data)
+
+    @property
+    def label(self) -> str:
+        """Source tag for attendance rows and metrics (no credentials from the URL)."""
+        name = self.source.rsplit("@", 1)[-1] if "://" in self.source else Path(self.source).name
+        return f"video:{name}"[:50]
+
+
+@dataclass
+class IngestStats:
+    frames_read: int = 0
+    frames_processed: int = 0
+    frames_skipped: int = 0  # no scene change / too soon after the last processed frame
+    frames_dropped: int = 0  # live sources: replaced by a newer frame before being picked up
+    faces: int = 0
+    marked: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def add(self, other: "IngestStats") -> None:
+        """Accumulate another connection's counts (reconnects within one window)."""
+        self.frames_read += other.frames_read
+        self.frames_processed += other.frames_processed
+        self.frames_skipped += other.frames_skipped
+        self.frames_dropped += other.frames_dropped
+        self.faces += other.faces
+        self.marked.extend(other.marked)
+        self.seconds += other.seconds
+
+    def as_dict(self) -> dict:
+        elapsed = self.seconds or 1e-9
+        return {
+            "frames_read": self.frames_read,
+            "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_skipped,
+            "frames_dropped": self.frames_dropped,
+            "faces": self.faces,
+            "marked": len(self.marked),
+            "seconds": round(self.seconds, 3),
+            "read_fps": round(self.frames_read / elapsed, 2),
+            "processed_fps": round(self.frames_processed / elapsed, 2),
+            "dropped_fps": round(self.frames_dropped / elapsed, 2),
+        }
+
+
+class SourceEnded(Exception):
+    """A live source stopped delivering frames before its session window closed (camera / network drop)."""
+
+    def __init__(self, stats: IngestStats):
+        super().__init__("source ended before the session window closed")
+        self.stats = stats
+
+
+class MotionSampler:
+    """Decides which frames are worth recognizing: scene change since the last processed frame, or a timeout."""
+
+    def __init__(self, min_interval: float, max_interval: float, threshold: float):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self._last_t: Optional[float] = None
+        self._last_thumb = None
+
+    def should_process(self, frame, t: float) -> bool:
+        import cv2
+        import numpy as np
+
+        if self._last_t is not None and t - self._last_t < self.min_interval:
+            return False
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+        if (
+            self._last_thumb is None
+            or t - self._last_t >= self.max_interval
+            or float(np.abs(thumb - self._last_thumb).mean()) >= self.threshold
+        ):
+            self._last_thumb = thumb
+            self._last_t = t
+            return True
+        return False
+
+
+class FrameSource:
+    """
+    OpenCV capture. read() returns (frame, seconds) or None when the source is exhausted.
+    Files: every frame in order, on video time. Live: newest frame only, on wall-clock time.
+    """
+
+    def __init__(self, source: str):
+        import cv2
+
+        self.live = not Path(source).is_file()
+        self._cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+        if not self._cap.isOpened():
+            raise ValueError(f"Cannot open video source {source!r}")
+        self.read_count = 0
+        self.dropped = 0
+        self._latest: Optional[Tuple[object, float]] = None
+        self._done = False
+        self._cond = threading.Condition()
+        if self.live:
+            self._thread = threading.Thread(target=self._reader, daemon=True)
+            self._thread.start()
+
+    def _reader(self) -> None:
+        while not self._done:
+            ok, frame = self._cap.read()
+            with self._cond:
+                if not ok:
+                    self._done = True
+                else:
+                    self.read_count += 1
+                    if self._latest is not None:
+                        self.dropped += 1
+                    self._latest = (frame, time.monotonic())
+                self._cond.notify_all()
+
+    @property
+    def exhausted(self) -> bool:
+        return self._done
+
+    def read(self, timeout: float = 5.0):
+        """Blocking; call from a worker thread."""
+        if not self.live:
+            import cv2
+
+            ok, frame = self._cap.read()
+            if not ok:
+                return None
+            self.read_count += 1
+            return frame, self._cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        with self._cond:
+            if self._latest is None and not self._done:
+                self._cond.wait(timeout)
+            item, self._latest = self._latest, None
+            return item
+
+    def close(self) -> None:
+        with self._cond:
+            self._done = True
+        if self.live:
+            self._thread.join(timeout=5.0)  # never release the capture under a blocked read
+        self._cap.release()
+
+
+async def _mark(config: IngestConfig, student_ids: List[str], day: date, fill_absent: bool = False) -> List[str]:
+    """One short transaction: mark new sightings present (and/or fill absent for the window)."""
+    from app.database import AsyncSessionLocal
+    from app.services.attendance_service import mark_present_many, ensure_all_students_have_attendance_record
+    from app.services.rosters import get_or_create_class_session
+
+    async with AsyncSessionLocal() as session:
+        class_session = None
+        if config.section_id is not None:
+            class_session = await get_or_create_class_session(session, config.section_id, day)
+        marked = await mark_present_many(session, student_ids, day, source=config.label, class_session=class_session)
+        if fill_absent:
+            await ensure_all_students_have_attendance_record(session, day, class_session=class_session)
+        await session.commit()
+    return marked
+
+
+async def run_ingest(
+    config: IngestConfig,
+    stop: Optional[asyncio.Event] = None,
+    sightings: Optional[Dict[str, int]] = None,
+    marked: Optional[set] = None,
+) -> IngestStats:
+    """
+    Read the source until it ends, the window's end time passes or `stop` is set; recognize
+    sampled frames and mark attendance. Returns frame/face counts and who was marked.
+    A live source ending before the window's end raises SourceEnded (no absent fill); setting
+    `stop` before the source ends or the window closes skips the absent fill too.
+    sightings / marked carry over from earlier connections in the same window (ingest_window).
+    """
+    from app.database import AsyncSessionLocal
+    from app.services.face_engine import recognize_from_image
+    from app.services.archive import is_archived_day
+    from app.services.recognition_log import log_recognition
+
+    day = config.day or date.today()
+    if is_archived_day(day):
+        raise ValueError(f"{day.strftime('%Y-%m')} is archived and closed to marking")
+    sampler = MotionSampler(config.min_interval, config.max_interval, config.motion_threshold)
+    source = await asyncio.to_thread(FrameSource, config.source)
+    deadline = datetime.combine(day, config.end) if config.end and source.live else None
+    stats = IngestStats()
+    sightings = {} if sightings is None else sightings
+    marked = set() if marked is None else marked
+    label = config.label
+    ended_early = False
+    t0 = time.perf_counter()
+    try:
+        while not (stop is not None and stop.is_set()):
+            if deadline is not None and datetime.now() >= deadline:
+                break
+            item = await asyncio.to_thread(source.read)
+            if item is None:
+                if source.live and not source.exhausted:
+                    continue  # no new frame within the timeout; keep waiting
+                break
+            frame, t = item
+            if not sampler.should_process(frame, t):
+                stats.frames_skipped += 1
+                INGEST_FRAMES.inc(source=label, result="skipped")
+                continue
+            stats.frames_processed += 1
+            INGEST_FRAMES.inc(source=label, result="processed")
+            async with AsyncSessionLocal() as session:
+                result = await recognize_from_image(session, frame, section_id=config.section_id)
+            stats.faces += result.faces_detected
+            log_recognition(result, day, label, section_id=config.section_id)
+            ready = []
+            for sid in dict.fromkeys(sid for sid, _name, _conf in result.recognized):
+                sightings[sid] = sightings.get(sid, 0) + 1
+                if sid not in marked and sightings[sid] >= config.min_sightings:
+                    ready.append(sid)
+            if ready:
+                newly = await _mark(config, ready, day)
+                marked.update(ready)
+                stats.marked.extend(newly)
+                logger.info("%s: marked %d present (%d total)", label, len(newly), len(stats.marked))
+        stopped = stop is not None and stop.is_set()
+        if deadline is not None and datetime.now() >= deadline:
+            if config.fill_absent:
+                await _mark(config, [], day, fill_absent=True)
+        elif deadline is None:
+            # A file ran to its end; a shutdown mid-way has not seen everyone, so it fills nobody
+            if config.fill_absent and not stopped:
+                await _mark(config, [], day, fill_absent=True)
+        else:
+            ended_early = not stopped
+    finally:
+        source.close()
+        stats.frames_read = source.read_count
+        stats.frames_dropped = source.dropped
+        stats.seconds = time.perf_counter() - t0
+        INGEST_FRAMES.inc(stats.frames_read, source=label, result="read")
+        INGEST_FRAMES.inc(stats.frames_dropped, source=label, result="dropped")
+    if ended_early:
+        raise SourceEnded(stats)
+    return stats
+
+
+async def ingest_window(config: IngestConfig, stop: asyncio.Event) -> IngestStats:
+    """
+    Ingest a live source until the day's window end (`config.end`), reopening it with exponential
+    backoff whenever it drops or fails to open. Sightings and marks carry over between connections;
+    absentees are filled once, when the window closes. Returns the counts of all connections.
+    """
+    day = config.day or date.today()
+    config = replace(config, day=day)
+    end = datetime.combine(day, config.end)
+    sightings: Dict[str, int] = {}
+    marked: set = set()
+    total = IngestStats()
+    delay = RECONNECT_MIN_SECONDS
+    while not stop.is_set() and datetime.now() < end:
+        try:
+            total.add(await run_ingest(config, stop, sightings=sightings, marked=marked))
+            return total  # window closed (absentees filled) or stopped
+        except SourceEnded as e:
+            total.add(e.stats)
+            if e.stats.frames_read:
+                delay = RECONNECT_MIN_SECONDS  # it was up for a while: not a persistent failure
+            logger.warning("%s: source ended inside the window; reconnecting in %.0f s", config.label, delay)
+        except Exception:
+            logger.exception("%s: ingest failed; reconnecting in %.0f s", config.label, delay)
+        try:
+            timeout = max(0.0, min(delay, (end - datetime.now()).total_seconds()))
+            await asyncio.wait_for(stop.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+    if config.fill_absent and not stop.is_set():
+        await _mark(config, [], day, fill_absent=True)  # the window closed while the source was down
+    return total
+
+
+async def run_scheduled(config: IngestConfig, stop: asyncio.Event) -> None:
+    """Run the job every day inside its start/end window (once, right away, without a window)."""
+    if config.start is None or config.end is None:
+        stats = await (ingest_window if config.end is not None else run_ingest)(config, stop)
+        logger.info("%s finished: %s", config.label, stats.as_dict())
+        return
+    while not stop.is_set():
+        now = datetime.now()
+        day = now.date()
+        if now >= datetime.combine(day, config.end):
+            day += timedelta(days=1)
+        wait = (datetime.combine(day, config.start) - now).total_seconds()
+        if wait > 0:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=wait)
+                return
+            except asyncio.TimeoutError:
+                pass
+        try:
+            stats = await ingest_window(replace(config, day=day), stop)
+            logger.info("%s %s: %s", config.label, day, stats.as_dict())
+        except Exception:
+            logger.exception("%s: ingest failed; retrying in 30 s", config.label)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _claim_ingest_lock():
+    """Only one uvicorn worker per host runs the configured jobs; the others get None."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: single-worker deployments only
+        return True
+    handle = open(Path(tempfile.gettempdir()) / "attendance-ingest.lock", "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def start_configured_ingest() -> Optional[Tuple[asyncio.Event, List[asyncio.Task], object]]:
+    """
+    Start the jobs listed in INGEST_SOURCES (JSON list of IngestConfig fields) as background tasks.
+    Returns (stop event, tasks, lock) for `stop_ingest`, or None when nothing runs in this worker.
+    """
+    if not INGEST_SOURCES:
+        return None
+    configs = [IngestConfig.from_dict(item) for item in json.loads(INGEST_SOURCES)]
+    lock = _claim_ingest_lock()
+    if lock is None:
+        return None
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(run_scheduled(config, stop)) for config in configs]
+    return stop, tasks, lock
+
+
+async def stop_ingest(handle) -> None:
+    if handle is None:
+        return
+    stop, tasks, lock = handle
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if lock is not True:
+        lock.close()
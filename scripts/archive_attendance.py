@@ -0,0 +1,53 @@
+"""
+Archive closed months of attendance to compressed columnar files and remove them from the hot table.
+Run from project root:
+  python -m scripts.archive_attendance --before 2024-07-01   # every whole month before July 2024
+  python -m scripts.archive_attendance --month 2024-01       # one month
+  python -m scripts.archive_attendance --list
+
+Files go to ARCHIVE_DIR/attendance/YYYY-MM.npz; the API keeps reading archived months
+transparently (range summaries, student stats, reports).
+"""
+import argparse
+import asyncio
+import sys
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.config import ARCHIVE_DIR
+from app.database import AsyncSessionLocal, init_db
+from app.services.archive import archive_before, archive_month, archived_months
+
+
+async def main(args):
+    if args.list:
+        months = archived_months()
+        print("\n".join(months) if months else f"No archived months under {ARCHIVE_DIR}")
+        return
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        if args.month:
+            year, month = (int(x) for x in args.month.split("-"))
+            count = await archive_month(session, date(year, month, 1))
+            done = {args.month: count} if count else {}
+        else:
+            done = await archive_before(session, date.fromisoformat(args.before))
+        await session.commit()
+    if not done:
+        print("Nothing to archive.")
+        return
+    for key, count in done.items():
+        print(f"✓ {key}: {count} rows")
+    print(f"Archive: {ARCHIVE_DIR / 'attendance'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed attendance months")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--before", help="Archive every whole month ending on or before this date (YYYY-MM-DD)")
+    group.add_argument("--month", help="Archive one month (YYYY-MM)")
+    group.add_argument("--list", action="store_true", help="List archived months")
+    asyncio.run(main(parser.parse_args()))
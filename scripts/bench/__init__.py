@@ -0,0 +1 @@
+# Benchmarks: offline, CPU-only microbenchmarks for the recognition pipeline
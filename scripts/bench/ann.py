@@ -0,0 +1,132 @@
+"""
+Approximate vs exact gallery search (app/ml/ann.py IVF index) on synthetic galleries.
+Run from project root: python -m scripts.bench.ann [--sizes 10000,100000] [--nprobe 1,4,8,16,32] [--out ann.json]
+
+Per gallery size: index build time (k-means + adding every row), the incremental update a
+reload does after enrollment changes (1% of rows replaced), save/load time, then for each
+nprobe the recall@1 against exact search (app.ml.recognizer.rank_matches) and search latency
+for a batch of `--faces` queries, next to exact search latency. Queries are gallery rows plus
+Gaussian noise (--noise). Uniform random galleries are the hard case for IVF (no cluster
+structure); real face embeddings cluster and recall higher at the same nprobe.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.bench.run import git_commit, measure, summarize
+
+DEFAULT_SIZES = (10000, 100000)
+DEFAULT_NPROBE = (1, 4, 8, 16, 32)
+
+
+def bench_size(args, size: int, nprobes: list) -> dict:
+    import numpy as np
+    from app.ml.ann import IVFIndex
+    from app.ml.recognizer import rank_matches
+    from scripts.bench.synthetic import random_gallery
+
+    rng = np.random.default_rng(1)
+    matrix = np.stack([emb for _sid, _name, emb in random_gallery(size, dim=args.dim)])
+    truth_rows = rng.choice(size, args.queries, replace=False)
+    queries = matrix[truth_rows] + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * args.noise
+    exact_best = rank_matches(queries, matrix, metric=args.metric)[0]
+    out = {"size": size}
+
+    t0 = time.perf_counter()
+    index = IVFIndex.train(matrix, nlist=args.nlist or None, metric=args.metric)
+    out["train_s"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    index.add(np.arange(size), matrix)
+    out["add_all_s"] = round(time.perf_counter() - t0, 3)
+    out["nlist"] = index.nlist
+
+    changed = rng.choice(size, max(1, size // 100), replace=False)
+    t0 = time.perf_counter()
+    patched = index.copy()
+    patched.remove(changed)
+    patched.add(changed, matrix[changed])
+    out["update_1pct_s"] = round(time.perf_counter() - t0, 4)
+
+    folder = Path(tempfile.mkdtemp(prefix="ann-bench-")) / "ivf"
+    t0 = time.perf_counter()
+    index.save(folder)
+    out["save_s"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    index = IVFIndex.load(folder)
+    out["load_s"] = round(time.perf_counter() - t0, 3)
+
+    batch = queries[: args.faces]
+    out["exact"] = summarize(measure(
+        lambda: rank_matches(batch, matrix, metric=args.metric),
+        iterations=args.iterations, max_seconds=args.max_seconds,
+    ))
+    out["nprobe"] = {}
+    for nprobe in nprobes:
+        labels, _ = index.search(queries, k=1, nprobe=nprobe)
+        stats = summarize(measure(
+            lambda: index.search(batch, k=2, nprobe=nprobe),
+            iterations=args.iterations, max_seconds=args.max_seconds,
+        ))
+        stats["recall_at_1"] = round(float((labels[:, 0] == exact_best).mean()), 4)
+        stats["speedup_vs_exact"] = round(out["exact"]["mean_ms"] / stats["mean_ms"], 2) if stats["mean_ms"] else None
+        out["nprobe"][str(nprobe)] = stats
+        print(f"  size={size} nprobe={nprobe}: recall@1={stats['recall_at_1']} "
+              f"p50={stats['p50_ms']}ms (exact {out['exact']['p50_ms']}ms)", file=sys.stderr)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF index recall and latency vs exact search")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES), help="Comma-separated gallery sizes")
+    parser.add_argument("--nprobe", default=",".join(str(s) for s in DEFAULT_NPROBE), help="Comma-separated nprobe values")
+    parser.add_argument("--nlist", type=int, default=0, help="Cells (0: ~4*sqrt(N))")
+    parser.add_argument("--metric", choices=("cosine", "euclidean"), default="cosine")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500, help="Queries for recall@1")
+    parser.add_argument("--faces", type=int, default=30, help="Queries per timed search call (faces in a photo)")
+    parser.add_argument("--noise", type=float, default=0.05, help="Std of the noise added to query rows")
+    parser.add_argument("--iterations", type=int, default=50, help="Max iterations per timing")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Time budget per timing")
+    parser.add_argument("--out", help="Write JSON results to this path (default: stdout)")
+    args = parser.parse_args()
+
+    import numpy as np
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    nprobes = [int(s) for s in args.nprobe.split(",") if s.strip()]
+    results = {}
+    for size in sizes:
+        print(f"gallery size {size}...", file=sys.stderr)
+        results[str(size)] = bench_size(args, size, nprobes)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "sizes": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
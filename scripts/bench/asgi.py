@@ -0,0 +1,73 @@
+"""
+Minimal in-process ASGI client (no HTTP server, no extra dependencies) for benchmarks.
+"""
+import asyncio
+import json as jsonlib
+import uuid
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+def multipart(files) -> Tuple[bytes, str]:
+    """
+    Encode {field: (filename, data, content_type)} (or a list of (field, (...)) pairs, for repeated
+    fields) as multipart/form-data. Returns (body, content type).
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for field, (filename, data, content_type) in (files.items() if isinstance(files, dict) else files):
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+async def request(
+    app,
+    method: str,
+    url: str,
+    json=None,
+    files=None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Run one request through the ASGI app. Returns (status, headers, body)."""
+    parts = urlsplit(url)
+    body = b""
+    hdrs: List[Tuple[bytes, bytes]] = [(b"host", b"bench")]
+    if json is not None:
+        body = jsonlib.dumps(json).encode()
+        hdrs.append((b"content-type", b"application/json"))
+    elif files:
+        body, content_type = multipart(files)
+        hdrs.append((b"content-type", content_type.encode()))
+    hdrs.append((b"content-length", str(len(body)).encode()))
+    for k, v in (headers or {}).items():
+        hdrs.append((k.lower().encode(), v.encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method.upper(), "scheme": "http", "path": parts.path, "raw_path": parts.path.encode(),
+        "query_string": parts.query.encode(), "root_path": "", "headers": hdrs,
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    sent = False
+    status, out_headers, chunks = 0, {}, []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()  # client stays connected until the response is complete
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            out_headers.update({k.decode(): v.decode() for k, v in message.get("headers", [])})
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, out_headers, b"".join(chunks)
@@ -0,0 +1,53 @@
+"""
+Compare two benchmark JSON files produced by scripts.bench.run.
+Run from project root: python -m scripts.bench.compare baseline.json current.json [--max-regression 0.2]
+
+Prints p50/p95 deltas per stage; exits non-zero if any stage's p50 regressed by more than
+--max-regression (fraction), so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def compare(baseline: dict, current: dict, metric: str = "p50_ms") -> list:
+    """Return [(stage, old, new, ratio)] for stages present in both reports."""
+    rows = []
+    for stage, new in current["stages"].items():
+        old = baseline["stages"].get(stage)
+        if not old or not old.get(metric):
+            continue
+        rows.append((stage, old[metric], new[metric], new[metric] / old[metric]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed p50 slowdown as a fraction (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    baseline = json.loads(Path(args.baseline).read_text())
+    current = json.loads(Path(args.current).read_text())
+    print(f"baseline {baseline['meta'].get('git_commit')} ({baseline['meta'].get('model')}) -> "
+          f"current {current['meta'].get('git_commit')} ({current['meta'].get('model')})")
+    print(f"{'stage':32} {'p50 old':>10} {'p50 new':>10} {'change':>8}")
+    regressions = []
+    for stage, old, new, ratio in compare(baseline, current):
+        change = (ratio - 1.0) * 100
+        flag = ""
+        if ratio - 1.0 > args.max_regression:
+            flag = "  REGRESSION"
+            regressions.append(stage)
+        print(f"{stage:32} {old:10.3f} {new:10.3f} {change:+7.1f}%{flag}")
+    if regressions:
+        print(f"✗ {len(regressions)} stage(s) regressed more than {args.max_regression:.0%}")
+        sys.exit(1)
+    print("✓ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Tiled vs single-pass face detection on a synthetic high-resolution lecture-hall photo.
+Run from project root: python -m scripts.bench.detect [--width 4000 --height 3000] [--tile-sizes 768,1024,1536] [--out detect.json]
+
+The photo has rows of faces from `--back-face` px (back rows) to `--front-face` px (front).
+Reports latency and recall (ground-truth faces matched by a detection with IoU >= 0.5), plus
+extra detections, for a single pass over the full frame and for app.ml.detector's tiled mode
+at each tile size. `gated_recall` counts only faces that also pass the quality gate the
+recognition path applies (FACE_MIN_SIZE, or DETECT_TILE_MIN_FACE for tiled images), i.e. the
+faces that would actually be embedded. Uses the stub detector unless real weights are present or --model real is
+given; the stub works at a `--stub-max-side` input resolution with a `--stub-min-face` minimum
+(MTCNN's min_face_size), so small faces in a large frame are missed by the single pass. Tiles
+are detected in parallel: latency gains need several cores (see meta.cpu_count).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.bench.run import git_commit, measure, summarize
+
+
+def iou(a, b) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = w * h
+    return inter / float(aw * ah + bw * bh - inter) if inter else 0.0
+
+
+def score(truth: list, found: list) -> dict:
+    """Greedy one-to-one matching at IoU >= 0.5."""
+    unused = list(found)
+    hits = 0
+    for box in truth:
+        best = max(unused, key=lambda f: iou(box, f), default=None)
+        if best is not None and iou(box, best) >= 0.5:
+            hits += 1
+            unused.remove(best)
+    return {
+        "faces": len(truth),
+        "detected": len(found),
+        "recall": round(hits / len(truth), 4) if truth else None,
+        "extra": len(unused),
+    }
+
+
+def gated(image, faces, tile_size) -> list:
+    """Boxes of the faces the recognition path would embed (passing the quality gate)."""
+    import cv2
+    from app.ml.quality import QualityGate
+
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    gate = QualityGate.from_config().for_image(rgb, tile_size)
+    return [f.box for f in faces if gate.check(rgb, f) is None]
+
+
+def with_gated_recall(stats: dict, truth: list, image, faces, tile_size) -> dict:
+    stats["gated_recall"] = score(truth, gated(image, faces, tile_size))["recall"]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiled vs single-pass detection on a lecture-hall photo")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--back-face", type=int, default=22, help="Face size (px) in the back row")
+    parser.add_argument("--front-face", type=int, default=120, help="Face size (px) in the front row")
+    parser.add_argument("--tile-sizes", default="768,1024,1536", help="Comma-separated tile sizes (px)")
+    parser.add_argument("--overlap", type=int, default=160, help="Tile overlap (px)")
+    parser.add_argument("--model", choices=("auto", "stub", "real"), default="auto")
+    parser.add_argument("--stub-max-side", type=int, default=1280, help="Stub detector working resolution")
+    parser.add_argument("--stub-min-face", type=int, default=20, help="Stub detector minimum face side (px)")
+    parser.add_argument("--iterations", type=int, default=20, help="Max iterations per mode")
+    parser.add_argument("--max-seconds", type=float, default=20.0, help="Time budget per mode")
+    parser.add_argument("--out", help="Write JSON results to this path (default: stdout)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import cv2
+    import numpy as np
+    from app.ml import detector
+    from scripts.bench.stubs import StubMTCNN, select_models
+    from scripts.bench.synthetic import lecture_hall_image
+
+    mode = select_models(args.model)
+    if mode == "stub":
+        detector._detector = StubMTCNN(min_area=args.stub_min_face ** 2, max_side=args.stub_max_side)
+    image, truth = lecture_hall_image(args.width, args.height, args.back_face, args.front_face)
+    kw = dict(iterations=args.iterations, max_seconds=args.max_seconds)
+
+    results = {}
+    faces = detector.detect_faces_full(image, tile_size=0)
+    results["single_pass"] = with_gated_recall(
+        {**summarize(measure(lambda: detector.detect_faces_full(image, tile_size=0), **kw)),
+         **score(truth, [f.box for f in faces])},
+        truth, image, faces, 0,
+    )
+    print(f"single pass: {results['single_pass']}", file=sys.stderr)
+    for tile_size in [int(s) for s in args.tile_sizes.split(",") if s.strip()]:
+        run = lambda: detector.detect_faces_full(image, tile_size=tile_size, overlap=args.overlap)
+        faces = run()
+        stats = {**summarize(measure(run, **kw)), **score(truth, [f.box for f in faces])}
+        with_gated_recall(stats, truth, image, faces, tile_size)
+        stats["tiles"] = len(detector.tile_grid(args.width, args.height, tile_size, args.overlap))
+        stats["speedup_vs_single"] = round(results["single_pass"]["mean_ms"] / stats["mean_ms"], 2)
+        results[f"tiled[{tile_size}]"] = stats
+        print(f"tiled {tile_size}: {stats}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "tile_workers": detector.tile_workers(),
+            "model": mode,
+            "args": vars(args),
+        },
+        "modes": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
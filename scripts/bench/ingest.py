@@ -0,0 +1,98 @@
+"""
+End-to-end video ingest benchmark on a synthetic classroom video (stub models, throwaway DB).
+Run from project root: python -m scripts.bench.ingest [--students 30] [--enrolled 500] [--out ingest.json]
+
+Writes an MJPG video where students arrive in waves, enrolls them (plus `--enrolled` random
+gallery entries), runs app.services.video_ingest on the file and checks that exactly the
+students in the video were marked Present and everyone else Absent. Reports frames/sec read
+and processed, and how many frames the motion sampler skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+async def run(args, tmpdir: Path) -> dict:
+    import numpy as np
+    from sqlalchemy import insert, select
+    from app.database import AsyncSessionLocal, init_db
+    from app.ml.recognizer import get_embeddings_from_image
+    from app.models import Student, Attendance
+    from app.services.video_ingest import IngestConfig, run_ingest
+    from scripts.bench.synthetic import face_patch, random_gallery, write_classroom_video
+
+    await init_db()
+    rows = []
+    for i in range(args.students):
+        photo = np.full((200, 200, 3), 40, np.uint8)
+        photo[50:146, 50:146] = face_patch(i)
+        rows.append({"student_id": f"VID{i:04d}", "name": f"Video {i}",
+                     "embedding": get_embeddings_from_image(photo)[0][1], "embedding_count": 1})
+    rows += [{"student_id": sid, "name": name, "embedding": emb, "embedding_count": 1}
+             for sid, name, emb in random_gallery(args.enrolled, seed=5)]
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Student), rows)
+        await session.commit()
+
+    video = tmpdir / "classroom.avi"
+    frames = write_classroom_video(str(video), list(range(args.students)), groups=args.groups,
+                                   seconds_per_group=args.seconds_per_group, fps=args.fps)
+    day = date(2024, 5, 2)
+    stats = await run_ingest(IngestConfig(source=str(video), day=day))
+
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Student.student_id, Attendance.status)
+            .join(Attendance, Attendance.student_id == Student.id)
+            .where(Attendance.date == day)
+        )
+        status = dict(result.all())
+    expected = {f"VID{i:04d}" for i in range(args.students)}
+    present = {sid for sid, s in status.items() if s == "Present"}
+    return {
+        "video_frames": frames,
+        "video_seconds": frames / args.fps,
+        **stats.as_dict(),
+        "missed": sorted(expected - present),
+        "false_present": sorted(present - expected),
+        "rows": len(status),
+        "expected_rows": len(rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end video ingest benchmark")
+    parser.add_argument("--students", type=int, default=30, help="Students in the video")
+    parser.add_argument("--enrolled", type=int, default=500, help="Additional enrolled students not in the video")
+    parser.add_argument("--groups", type=int, default=3, help="Arrival waves")
+    parser.add_argument("--seconds-per-group", type=float, default=4.0)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--out", help="Write JSON results to this path")
+    args = parser.parse_args()
+
+    tmpdir = Path(tempfile.mkdtemp(prefix="attendance-ingest-"))
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmpdir / 'bench.db'}"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    from scripts.bench.stubs import install_stub_models
+    install_stub_models()
+
+    results = asyncio.run(run(args, tmpdir))
+    print(json.dumps(results, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2))
+    if results["missed"] or results["false_present"] or results["rows"] != results["expected_rows"]:
+        print("✗ Ingest marked the wrong students", file=sys.stderr)
+        sys.exit(1)
+    print(f"✓ {results['marked']} students marked from {results['frames_processed']}/{results['frames_read']} frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Query-count and query-plan regression harness for the API endpoints.
+Run from project root: python -m scripts.bench.queries [--students 2000] [--days 30] [--out queries.json]
+
+Seeds a throwaway SQLite DB (students with embeddings, a section with a roster, `--days` of
+attendance), then calls each endpoint in-process and records every SQL statement it issues
+(count and time, via SQLAlchemy cursor events). Each distinct statement is then run through
+EXPLAIN QUERY PLAN (EXPLAIN on PostgreSQL) and full scans are counted per table.
+
+Exits non-zero when an endpoint exceeds its statement budget or scans a watched table
+(attendance, rosters, sessions) that it should reach through an index. Statement budgets are
+independent of --students / --days: growing counts mean a per-row query crept in.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+# Tables that grow with time / enrollment: endpoints must reach them through an index
+WATCHED_TABLES = ("attendance", "section_enrollments", "class_sessions")
+FACES = 24  # identities in the classroom photo (all enrolled, half of them on the roster)
+
+# name -> (method, url, max statements, max full scans of watched tables)
+# {day} / {from} / {to} are filled from the seeded range.
+ENDPOINTS = {
+    "students.list": ("GET", "/api/students", 2, 0),
+    "records.day": ("GET", "/api/attendance/records?day={day}", 4, 0),
+    "records.section": ("GET", "/api/attendance/records?day={day}&section_id=1", 6, 0),
+    "summary.day": ("GET", "/api/attendance/summary?day={day}", 4, 0),
+    "summary.section": ("GET", "/api/attendance/summary?day={day}&section_id=1", 6, 0),
+    "summary.range": ("GET", "/api/attendance/summary-range?from_date={from}&to_date={to}", 4, 0),
+    "summary.range.section": ("GET", "/api/attendance/summary-range?from_date={from}&to_date={to}&section_id=1", 6, 0),
+    "stats.range": ("GET", "/api/attendance/student-stats?from_date={from}&to_date={to}&below_percent=75", 6, 0),
+    "stats.section": ("GET", "/api/attendance/student-stats?from_date={from}&to_date={to}&section_id=1", 8, 0),
+    "roster": ("GET", "/api/sections/1/roster", 3, 0),
+    "mark.image": ("POST", "/api/attendance/mark-from-image?attendance_date={next}", 8, 0),
+    "mark.image.again": ("POST", "/api/attendance/mark-from-image?attendance_date={next}", 8, 0),
+    "mark.image.section": ("POST", "/api/attendance/mark-from-image?attendance_date={next}&section_id=1", 13, 0),
+    "report.range": ("GET", "/api/reports/range?from_date={from}&to_date={to}", 4, 0),
+    "changes.since": ("GET", "/api/attendance/changes?since={cursor}&limit=1000", 1, 0),
+}
+
+
+class StatementRecorder:
+    """Collects (statement, params, seconds) from the engine's cursor events while active."""
+
+    def __init__(self, sync_engine):
+        from sqlalchemy import event
+
+        self.active = False
+        self.statements = []
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_bench_t0", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["_bench_t0"].pop()
+        if self.active:
+            self.statements.append((statement, parameters, executemany, time.perf_counter() - t0))
+
+    def start(self):
+        self.statements = []
+        self.active = True
+
+    def stop(self) -> list:
+        self.active = False
+        return self.statements
+
+
+def _scanned_tables(plan_lines: list, dialect: str) -> list:
+    """Tables read by a full scan according to the plan text."""
+    tables = []
+    for line in plan_lines:
+        if dialect == "sqlite":
+            # "SCAN attendance" / "SCAN attendance USING COVERING INDEX ..." (full index scan, still O(n));
+            # index lookups show up as "SEARCH ..."
+            m = re.match(r"SCAN (?:TABLE )?(\w+)", line)
+        else:
+            m = re.search(r"Seq Scan on (\w+)", line)
+        if m:
+            tables.append(m.group(1))
+    return tables
+
+
+async def explain(engine, statement: str, parameters, executemany: bool) -> list:
+    """Plan lines for one captured statement (first parameter set for executemany)."""
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(prefix + statement, parameters)
+        rows = result.all()
+    if engine.dialect.name == "sqlite":
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+async def seed(students: int, days: int, start: date) -> None:
+    """Students (the first FACES enrollable from the synthetic photo), a 60-student section and `days` of marking."""
+    import numpy as np
+    from sqlalchemy import insert
+    from app.database import AsyncSessionLocal, init_db
+    from app.ml.recognizer import get_embeddings_from_image
+    from app.models import Student, Attendance, Course, Section, SectionEnrollment, ClassSession
+    from scripts.bench.synthetic import face_patch, random_gallery
+
+    await init_db()
+    gallery = random_gallery(students, seed=1)
+    rows = []
+    for i, (sid, name, emb) in enumerate(gallery):
+        if i < FACES:
+            photo = np.full((200, 200, 3), 40, np.uint8)
+            photo[50:146, 50:146] = face_patch(i)
+            emb = get_embeddings_from_image(photo)[0][1]
+        rows.append({"student_id": sid, "name": name, "embedding": emb, "embedding_count": 1})
+    rng = np.random.default_rng(0)
+    async with AsyncSessionLocal() as session:
+        for chunk in range(0, len(rows), 5000):
+            await session.execute(insert(Student), rows[chunk:chunk + 5000])
+        session.add(Course(code="BENCH101", name="Bench"))
+        await session.flush()
+        session.add(Section(course_id=1, name="A"))
+        await session.flush()
+        roster = list(range(1, FACES // 2 + 1)) + list(range(FACES + 1, FACES + 1 + 60 - FACES // 2))
+        roster = [pk for pk in roster if pk <= students]
+        await session.execute(insert(SectionEnrollment), [{"section_id": 1, "student_id": pk} for pk in roster])
+        for d in range(days):
+            day = start + timedelta(days=d)
+            class_session = ClassSession(section_id=1, date=day)
+            session.add(class_session)
+            await session.flush()
+            present = rng.random(students) < 0.85
+            batch = [
+                {"student_id": pk, "date": day, "status": "Present" if present[pk - 1] else "Absent", "source": "seed"}
+                for pk in range(1, students + 1)
+            ]
+            batch += [
+                {"student_id": pk, "session_id": class_session.id, "date": day,
+                 "status": "Present" if present[pk - 1] else "Absent", "source": "seed"}
+                for pk in roster
+            ]
+            await session.execute(insert(Attendance), batch)
+        await session.commit()
+
+
+async def run(args) -> dict:
+    from app.database import engine
+    from app.main import app, lifespan
+    from scripts.bench.asgi import request
+    from scripts.bench.synthetic import classroom_image, encode_jpeg
+
+    start = date(2024, 1, 1)
+    await seed(args.students, args.days, start)
+    img, _ = classroom_image(list(range(FACES)), width=1280, height=720, seed=3)
+    photo = encode_jpeg(img)
+    fill = {
+        "day": (start + timedelta(days=args.days // 2)).isoformat(),
+        "from": start.isoformat(),
+        "to": (start + timedelta(days=args.days - 1)).isoformat(),
+        "next": (start + timedelta(days=args.days)).isoformat(),
+        "cursor": f"{start.isoformat()}T00:00:00~0",
+    }
+    recorder = StatementRecorder(engine.sync_engine)
+    results = {}
+    async with lifespan(app):
+        for name, (method, url, max_statements, max_scans) in ENDPOINTS.items():
+            if args.only and name not in args.only:
+                continue
+            files = {"file": ("class.jpg", photo, "image/jpeg")} if method == "POST" else None
+            recorder.start()
+            t0 = time.perf_counter()
+            status, _headers, _body = await request(app, method, url.format(**fill), files=files)
+            elapsed = time.perf_counter() - t0
+            statements = recorder.stop()
+
+            scans, plans = {}, []
+            for statement, params, many, _seconds in statements:
+                verb = statement.lstrip().split(None, 1)[0].upper()
+                if verb not in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH"):
+                    continue
+                if verb == "INSERT" and " SELECT " not in statement.upper():
+                    continue  # plain VALUES insert: nothing to plan
+                plan = await explain(engine, statement, params, many)
+                tables = [t for t in _scanned_tables(plan, engine.dialect.name) if t in WATCHED_TABLES]
+                for t in tables:
+                    scans[t] = scans.get(t, 0) + 1
+                plans.append({"sql": " ".join(statement.split())[:300], "plan": plan, "scans": tables})
+
+            failures = []
+            if status >= 400:
+                failures.append(f"HTTP {status}")
+            if len(statements) > max_statements:
+                failures.append(f"{len(statements)} statements > budget {max_statements}")
+            if sum(scans.values()) > max_scans:
+                failures.append(f"full scans of {', '.join(sorted(scans))} > budget {max_scans}")
+            results[name] = {
+                "method": method,
+                "url": url.format(**fill),
+                "status": status,
+                "seconds": round(elapsed, 4),
+                "statements": len(statements),
+                "sql_seconds": round(sum(s[3] for s in statements), 4),
+                "statement_budget": max_statements,
+                "watched_scans": scans,
+                "failures": failures,
+                "plans": plans,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-endpoint SQL statement counts and query plans")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--only", nargs="*", help="Endpoint names to run (default: all)")
+    parser.add_argument("--plans", action="store_true", help="Print every statement's plan")
+    parser.add_argument("--out", help="Write JSON results (including plans) to this path")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="attendance-queries-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(tmpdir) / 'bench.db'}"
+    os.environ["ARCHIVE_DIR"] = str(Path(tmpdir) / "archive")
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    os.environ.setdefault("ADMISSION_MAX_QUEUE", "64")
+
+    from scripts.bench.stubs import install_stub_models
+    install_stub_models()
+
+    results = asyncio.run(run(args))
+    failed = False
+    print(f"{'endpoint':<24} {'status':>6} {'stmts':>5} {'budget':>6} {'sql ms':>8} {'total ms':>9}  scans / failures")
+    for name, r in results.items():
+        flag = "; ".join(r["failures"]) or ", ".join(f"{t}x{n}" for t, n in r["watched_scans"].items())
+        print(f"{name:<24} {r['status']:>6} {r['statements']:>5} {r['statement_budget']:>6} "
+              f"{r['sql_seconds'] * 1000:>8.1f} {r['seconds'] * 1000:>9.1f}  {flag}")
+        if args.plans:
+            for p in r["plans"]:
+                print(f"    {p['sql']}")
+                for line in p["plan"]:
+                    print(f"        {line}")
+        failed |= bool(r["failures"])
+    if args.out:
+        Path(args.out).write_text(json.dumps({"students": args.students, "days": args.days, "endpoints": results}, indent=2, default=str))
+        print(f"Results written to {args.out}", file=sys.stderr)
+    if failed:
+        print("✗ Query budget exceeded", file=sys.stderr)
+        sys.exit(1)
+    print("✓ All endpoints within query budgets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Stage-level microbenchmarks for the recognition pipeline.
+Run from project root: python -m scripts.bench.run [--sizes 100,1000,10000,100000] [--out bench.json]
+
+Stages (each timed separately):
+  decode            cv2.imdecode of a synthetic classroom JPEG
+  detect_faces      app.ml.detector.detect_faces on the decoded frame
+  get_embedding     app.ml.recognizer.get_embedding on one face crop
+  find_best_match   app.ml.recognizer.find_best_match, per gallery size
+  match_embeddings  app.ml.recognizer.match_embeddings (all faces of a photo at once), per gallery size
+  attendance_write  mark_recognized_and_fill_absent on a seeded SQLite DB, per gallery size
+
+Runs offline on CPU; uses the stub models (scripts/bench/stubs.py) unless real weights are
+present or --model real is given. Results are JSON so runs can be compared across commits
+with `python -m scripts.bench.compare old.json new.json`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+
+
+def summarize(samples_s: list) -> dict:
+    """Latency percentiles (ms) and throughput (ops/s) for a list of durations in seconds."""
+    import numpy as np
+    arr = np.asarray(samples_s, dtype=np.float64) * 1000.0
+    total_s = float(np.sum(samples_s))
+    return {
+        "n": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 4),
+        "min_ms": round(float(arr.min()), 4),
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p90_ms": round(float(np.percentile(arr, 90)), 4),
+        "p95_ms": round(float(np.percentile(arr, 95)), 4),
+        "p99_ms": round(float(np.percentile(arr, 99)), 4),
+        "max_ms": round(float(arr.max()), 4),
+        "throughput_per_s": round(arr.size / total_s, 3) if total_s > 0 else None,
+    }
+
+
+def measure(fn, iterations: int, warmup: int = 1, max_seconds: float = 10.0, min_iterations: int = 3) -> list:
+    """Call fn repeatedly; stop at `iterations` or when `max_seconds` is spent (after min_iterations)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+        if i + 1 >= min_iterations and time.perf_counter() - started > max_seconds:
+            break
+    return samples
+
+
+def measure_async(loop, coro_fn, **kwargs) -> list:
+    return measure(lambda: loop.run_until_complete(coro_fn()), **kwargs)
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(ROOT), capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+async def seed_students(n: int, gallery) -> None:
+    """Create tables and insert n students (with embeddings) in bulk."""
+    from sqlalchemy import insert
+    from app.database import AsyncSessionLocal, init_db
+    from app.models import Student
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        chunk = 5000
+        for start in range(0, n, chunk):
+            rows = [
+                {"student_id": sid, "name": name, "embedding": emb}
+                for sid, name, emb in gallery[start:start + chunk]
+            ]
+            await session.execute(insert(Student), rows)
+        await session.commit()
+
+
+def bench_image_stages(args, results: dict) -> None:
+    import cv2
+    import numpy as np
+    from app.ml.detector import detect_faces
+    from app.ml.recognizer import get_embedding
+    from scripts.bench.synthetic import classroom_image, encode_jpeg
+
+    img, boxes = classroom_image(list(range(args.faces)), width=args.width, height=args.height, seed=1)
+    jpeg = encode_jpeg(img)
+    buf = np.frombuffer(jpeg, np.uint8)
+    kw = dict(iterations=args.iterations, max_seconds=args.max_seconds)
+
+    results["decode"] = summarize(measure(lambda: cv2.imdecode(buf, cv2.IMREAD_COLOR), **kw))
+    results["decode"]["image_bytes"] = len(jpeg)
+
+    frame = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    detected = detect_faces(frame)
+    results["detect_faces"] = summarize(measure(lambda: detect_faces(frame), **kw))
+    results["detect_faces"]["faces_expected"] = len(boxes)
+    results["detect_faces"]["faces_detected"] = len(detected)
+
+    x, y, w, h = boxes[0]
+    crop = cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2RGB)
+    results["get_embedding"] = summarize(measure(lambda: get_embedding(crop), **kw))
+
+
+def bench_gallery_stages(args, size: int, results: dict, loop) -> None:
+    import numpy as np
+    from app.config import DISTANCE_METRIC, THRESHOLD_COSINE, THRESHOLD_EUCLIDEAN
+    from app.ml.recognizer import find_best_match, match_embeddings
+    from app.database import AsyncSessionLocal, engine
+    from app.services.attendance_service import mark_recognized_and_fill_absent
+    from scripts.bench.synthetic import random_gallery
+
+    gallery = random_gallery(size, seed=size)
+    rng = np.random.default_rng(0)
+    # Queries are noisy copies of gallery members, so the match path (not just rejection) is timed
+    idx = rng.integers(0, size, size=32)
+    queries = [gallery[i][2] + rng.normal(0, 0.05, gallery[i][2].shape).astype(np.float32) for i in idx]
+    qi = iter(range(10 ** 9))
+
+    def match_one():
+        find_best_match(
+            queries[next(qi) % len(queries)],
+            gallery,
+            metric=DISTANCE_METRIC,
+            threshold_cosine=THRESHOLD_COSINE,
+            threshold_euclidean=THRESHOLD_EUCLIDEAN,
+        )
+
+    results[f"find_best_match[{size}]"] = summarize(
+        measure(match_one, iterations=args.iterations, max_seconds=args.max_seconds)
+    )
+
+    # What recognize_from_image does: all faces of a photo vs. the contiguous gallery matrix
+    matrix = np.ascontiguousarray(np.stack([emb for _sid, _name, emb in gallery]))
+    batch = np.stack(queries[: args.faces])
+    results[f"match_embeddings[{size}]"] = summarize(measure(
+        lambda: match_embeddings(batch, matrix, metric=DISTANCE_METRIC,
+                                 threshold_cosine=THRESHOLD_COSINE, threshold_euclidean=THRESHOLD_EUCLIDEAN),
+        iterations=args.iterations, max_seconds=args.max_seconds,
+    ))
+    results[f"match_embeddings[{size}]"]["faces_per_call"] = len(batch)
+
+    if args.skip_db:
+        return
+    loop.run_until_complete(engine.dispose())
+    db_path = Path(os.environ["BENCH_DB_PATH"])
+    if db_path.exists():
+        db_path.unlink()
+    loop.run_until_complete(seed_students(size, gallery))
+    recognized = [(gallery[i][0], gallery[i][1], 0.9) for i in idx[: args.faces]]
+    day_iter = iter(date(2000, 1, 1) + timedelta(days=i) for i in range(10 ** 6))
+
+    async def write_day():
+        async with AsyncSessionLocal() as session:
+            await mark_recognized_and_fill_absent(session, recognized, next(day_iter), source="bench")
+            await session.commit()
+
+    results[f"attendance_write[{size}]"] = summarize(
+        measure_async(loop, write_day, iterations=args.iterations, max_seconds=args.max_seconds, warmup=0)
+    )
+    loop.run_until_complete(engine.dispose())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognition pipeline stage benchmarks")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated synthetic gallery sizes")
+    parser.add_argument("--stages", default="image,gallery", help="image,gallery (comma-separated)")
+    parser.add_argument("--model", choices=("auto", "stub", "real"), default="auto")
+    parser.add_argument("--iterations", type=int, default=50, help="Max iterations per stage")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="Time budget per stage")
+    parser.add_argument("--faces", type=int, default=30, help="Faces per synthetic classroom image")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--skip-db", action="store_true", help="Skip the attendance_write stage")
+    parser.add_argument("--out", help="Write JSON results to this path (default: stdout)")
+    args = parser.parse_args()
+
+    # Isolated throwaway DB; must be set before app.config is imported
+    tmpdir = tempfile.mkdtemp(prefix="attendance-bench-")
+    db_path = Path(tmpdir) / "bench.db"
+    os.environ["BENCH_DB_PATH"] = str(db_path)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+    import numpy as np
+    from scripts.bench.stubs import select_models
+
+    mode = select_models(args.model)
+    stages = {s.strip() for s in args.stages.split(",") if s.strip()}
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    results = {}
+    if "image" in stages:
+        bench_image_stages(args, results)
+    if "gallery" in stages:
+        loop = asyncio.new_event_loop()
+        try:
+            for size in sizes:
+                print(f"gallery size {size}...", file=sys.stderr)
+                bench_gallery_stages(args, size, results, loop)
+        finally:
+            loop.close()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": mode,
+            "args": vars(args),
+        },
+        "stages": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+"""
+The API with the stub detector / embedding model (offline, CPU), for load tests:
+  uvicorn scripts.bench.stub_app:app --port 8000 --workers 4
+Every uvicorn worker imports this module, so each installs the stubs before serving.
+"""
+from scripts.bench.stubs import install_stub_models
+
+install_stub_models()
+
+from app.main import app  # noqa: E402
+
+__all__ = ["app"]
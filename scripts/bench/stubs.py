@@ -0,0 +1,130 @@
+"""
+Stub detector / embedding model for offline CPU benchmarks.
+They plug into the same lazy globals the app uses (`app.ml.detector._detector`,
+`app.ml.recognizer._recognition_model`), so the real pipeline code is exercised.
+
+StubMTCNN finds the bright regions drawn by synthetic.py; StubDeepFace turns a face
+crop into a deterministic 128-d vector (16x8 grayscale thumbnail), so the same
+synthetic identity always maps to (nearly) the same embedding. Any model name other
+than Facenet gets a 256-d vector (16x16 thumbnail), to exercise model switches.
+"""
+import importlib.util
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+
+def _face_region(image: np.ndarray) -> np.ndarray:
+    """Largest bright blob in a crop (drops the padding around the face)."""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    _, mask = cv2.threshold(gray, 80, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return gray
+    x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    # Inner square of the ellipse only: the outline is shared by every identity
+    mx, my = int(0.18 * w), int(0.18 * h)
+    return gray[y + my:y + h - my, x + mx:x + w - mx]
+
+
+def stub_embedding(image: np.ndarray, model_name: str = "Facenet") -> np.ndarray:
+    face = _face_region(image)
+    size = (8, 16) if model_name == "Facenet" else (16, 16)
+    thumb = cv2.resize(face, size, interpolation=cv2.INTER_AREA).astype(np.float32).flatten()
+    thumb -= thumb.mean()
+    return thumb / (np.linalg.norm(thumb) + 1e-8)
+
+
+class StubMTCNN:
+    """
+    Mimics mtcnn.MTCNN.detect_faces output (box, confidence, keypoints). With max_side, frames
+    are downscaled to that working resolution first, like a real detector's input size limit:
+    small faces in large frames then fall under min_area and are missed.
+    """
+
+    def __init__(self, min_area: int = 64, max_side: int = 0):
+        self.min_area = min_area
+        self.max_side = max_side
+
+    def detect_faces(self, image: np.ndarray) -> list:
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+        scale = 1.0
+        if self.max_side and max(gray.shape) > self.max_side:
+            scale = self.max_side / max(gray.shape)
+            gray = cv2.resize(gray, (int(gray.shape[1] * scale), int(gray.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+        _, mask = cv2.threshold(gray, 80, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        faces = []
+        for c in contours:
+            x, y, w, h = cv2.boundingRect(c)
+            if w * h < self.min_area:
+                continue
+            x, y, w, h = (int(round(v / scale)) for v in (x, y, w, h))
+            faces.append({
+                "box": [int(x), int(y), int(w), int(h)],
+                "confidence": 0.99,
+                "keypoints": {
+                    "left_eye": (int(x + 0.3 * w), int(y + 0.35 * h)),
+                    "right_eye": (int(x + 0.7 * w), int(y + 0.35 * h)),
+                    "nose": (int(x + 0.5 * w), int(y + 0.55 * h)),
+                    "mouth_left": (int(x + 0.35 * w), int(y + 0.75 * h)),
+                    "mouth_right": (int(x + 0.65 * w), int(y + 0.75 * h)),
+                },
+            })
+        return faces
+
+
+class StubDeepFace:
+    """Mimics the subset of the DeepFace API used by app.ml.recognizer."""
+
+    @staticmethod
+    def represent(img_path, model_name="Facenet", detector_backend="mtcnn", enforce_detection=False, **kwargs):
+        img = img_path if isinstance(img_path, np.ndarray) else cv2.imread(str(img_path))
+        if img is None:
+            return []
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        return [{"embedding": stub_embedding(rgb, model_name).tolist()}]
+
+    @staticmethod
+    def build_model(model_name="Facenet"):
+        return StubKerasModel(model_name)
+
+
+class StubKerasModel:
+    """Batched counterpart of StubDeepFace.represent: BGR batch in [0, 1], like DeepFace's Keras models."""
+
+    input_shape = (None, 160, 160, 3)
+
+    def __init__(self, model_name: str = "Facenet"):
+        self.model_name = model_name
+
+    def predict(self, batch: np.ndarray, verbose: int = 0) -> np.ndarray:
+        images = (np.clip(batch, 0.0, 1.0) * 255).astype(np.uint8)
+        return np.stack([stub_embedding(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), self.model_name) for img in images])
+
+
+def real_models_available() -> bool:
+    """True if MTCNN + DeepFace are installed and Facenet weights are already on disk (no download)."""
+    if importlib.util.find_spec("mtcnn") is None or importlib.util.find_spec("deepface") is None:
+        return False
+    home = Path(os.environ.get("DEEPFACE_HOME", str(Path.home())))
+    return (home / ".deepface" / "weights" / "facenet_weights.h5").exists()
+
+
+def install_stub_models() -> None:
+    """Point the app's lazy model globals at the stubs."""
+    from app.ml import detector, recognizer
+    detector._detector = StubMTCNN()
+    recognizer._recognition_model = StubDeepFace()
+
+
+def select_models(mode: str = "auto") -> str:
+    """mode: auto | stub | real. Installs stubs when needed; returns the mode actually used."""
+    if mode == "real" or (mode == "auto" and real_models_available()):
+        return "real"
+    install_stub_models()
+    return "stub"
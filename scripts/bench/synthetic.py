@@ -0,0 +1,125 @@
+"""
+Synthetic data for benchmarks: classroom images with known face boxes, classroom videos and
+random galleries.
+Faces are deterministic per identity so the stub model (see stubs.py) can re-identify them.
+"""
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+BACKGROUND = (40, 40, 40)  # dark BGR background; faces are the only bright regions
+
+
+def face_patch(identity: int, size: int = 96) -> np.ndarray:
+    """Deterministic BGR 'face' for an identity: skin-toned ellipse with an identity-specific texture."""
+    rng = np.random.default_rng(identity)
+    patch = np.full((size, size, 3), BACKGROUND, dtype=np.uint8)
+    texture = rng.integers(120, 255, size=(24, 24, 3), dtype=np.uint8)
+    texture = cv2.resize(texture, (size, size), interpolation=cv2.INTER_NEAREST)
+    mask = np.zeros((size, size), dtype=np.uint8)
+    cv2.ellipse(mask, (size // 2, size // 2), (size // 2 - 1, size // 2 - 1), 0, 0, 360, 255, -1)
+    patch[mask > 0] = texture[mask > 0]
+    return patch
+
+
+def classroom_image(
+    identities: List[int],
+    width: int = 1280,
+    height: int = 720,
+    face_size: int = 96,
+    seed: int = 0,
+) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """
+    Lay out one face per identity on a grid (with jitter). Returns (BGR image, [(x, y, w, h)]).
+    Identities that do not fit in the frame are dropped.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+    cell = int(face_size * 1.5)
+    cols = max(1, width // cell)
+    rows = max(1, height // cell)
+    boxes = []
+    for i, ident in enumerate(identities[: cols * rows]):
+        r, c = divmod(i, cols)
+        jitter = rng.integers(0, cell - face_size + 1, size=2)
+        x = c * cell + int(jitter[0])
+        y = r * cell + int(jitter[1])
+        img[y:y + face_size, x:x + face_size] = face_patch(ident, face_size)
+        boxes.append((x, y, face_size, face_size))
+    return img, boxes
+
+
+def lecture_hall_image(
+    width: int = 4000,
+    height: int = 3000,
+    back_face: int = 22,
+    front_face: int = 120,
+    seed: int = 0,
+) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]]]:
+    """
+    Rows of seats from the back (top, `back_face` px faces) to the front (bottom, `front_face` px),
+    as a wide-angle photo of a lecture hall. Returns (BGR image, [(x, y, w, h)]); identities are
+    the face indices.
+    """
+    rng = np.random.default_rng(seed)
+    img = np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+    boxes = []
+    y = int(0.05 * height)
+    while True:
+        size = int(back_face + (front_face - back_face) * y / height)
+        cell = int(size * 1.8)
+        if y + cell > height:
+            break
+        for c in range(width // cell):
+            jitter = rng.integers(0, cell - size + 1, size=2)
+            x, fy = c * cell + int(jitter[0]), y + int(jitter[1])
+            img[fy:fy + size, x:x + size] = face_patch(len(boxes), size)
+            boxes.append((x, fy, size, size))
+        y += cell
+    return img, boxes
+
+
+def write_classroom_video(
+    path: str,
+    identities: List[int],
+    groups: int = 3,
+    seconds_per_group: float = 4.0,
+    fps: int = 15,
+    width: int = 1280,
+    height: int = 720,
+) -> int:
+    """
+    MJPG video of students arriving in `groups` waves: each wave adds faces to the frame (a scene
+    change), then the room sits still (static frames the ingest sampler should skip), with a
+    little sensor noise. Returns the number of frames written.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot write video to {path}")
+    rng = np.random.default_rng(0)
+    per_group = -(-len(identities) // groups)
+    frames = 0
+    for g in range(groups):
+        img, _ = classroom_image(identities[: (g + 1) * per_group], width=width, height=height, seed=1)
+        for _ in range(int(seconds_per_group * fps)):
+            noise = rng.integers(-2, 3, size=img.shape, dtype=np.int16)
+            writer.write(np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8))
+            frames += 1
+    writer.release()
+    return frames
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 90) -> bytes:
+    ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buf.tobytes()
+
+
+def random_gallery(n: int, dim: int = 128, seed: int = 0) -> List[Tuple[str, str, np.ndarray]]:
+    """n random unit-norm embeddings in the (student_id, name, embedding) shape used by the engine."""
+    rng = np.random.default_rng(seed)
+    mat = rng.standard_normal((n, dim)).astype(np.float32)
+    mat /= np.linalg.norm(mat, axis=1, keepdims=True)
+    return [(f"STU{i:06d}", f"Student {i}", mat[i]) for i in range(n)]
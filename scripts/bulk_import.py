@@ -0,0 +1,66 @@
+"""
+Bulk-enroll students from a photo archive.
+Run from project root:
+  python -m scripts.bulk_import path/to/photos_or.zip --names students.csv [--workers 8]
+
+Archive layout: <student_id>/<photos>; CSV columns: student_id, name.
+Progress is checkpointed; re-running the same command resumes an interrupted import.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database import AsyncSessionLocal, init_db
+from app.services.bulk_import import extract_zip, load_names, run_bulk_import
+
+
+async def main(args):
+    source = Path(args.source)
+    if not source.exists():
+        print(f"✗ {source} not found")
+        sys.exit(1)
+    checkpoint = Path(args.checkpoint) if args.checkpoint else source.with_name(source.name + ".checkpoint.jsonl")
+    names = load_names(Path(args.names)) if args.names else {}
+
+    worker_setup = None
+    if args.model == "stub":
+        from scripts.bench.stubs import install_stub_models
+        worker_setup = install_stub_models
+
+    def progress(done, total):
+        print(f"  {done}/{total} students")
+
+    await init_db()
+    with tempfile.TemporaryDirectory(prefix="bulk-import-") as tmp:
+        photo_root = extract_zip(source, Path(tmp)) if source.suffix.lower() == ".zip" else source
+        print(f"Importing from {source} (checkpoint: {checkpoint})")
+        async with AsyncSessionLocal() as session:
+            summary = await run_bulk_import(
+                session,
+                photo_root,
+                names,
+                checkpoint,
+                workers=args.workers,
+                batch_size=args.batch_size,
+                worker_setup=worker_setup,
+                progress=progress,
+            )
+    print(f"✓ {summary['imported']} imported, {summary['skipped']} already done, {summary['total']} total")
+    if summary["no_face"]:
+        print(f"⚠️  No face found for {len(summary['no_face'])} student(s): {', '.join(summary['no_face'][:20])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-enroll students from <student_id>/<photos>")
+    parser.add_argument("source", help="Directory or .zip laid out as <student_id>/<photos>")
+    parser.add_argument("--names", help="CSV with columns student_id, name")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <source>.checkpoint.jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Students per DB transaction")
+    parser.add_argument("--model", choices=("real", "stub"), default="real", help="stub = offline synthetic model")
+    asyncio.run(main(parser.parse_args()))
@@ -1,11 +1,27 @@
 """
-Optional: Evaluate face recognition accuracy (Precision, Recall, F1-Score).
-Run from project root: python -m scripts.evaluate_accuracy
+Evaluate face recognition accuracy (Precision, Recall, F1-Score) and sweep match thresholds.
+Run from project root: python -m scripts.evaluate_accuracy --dataset path/to/dataset
 
-Expects a CSV or list of (image_path, true_student_id) test pairs.
-Example usage: prepare test_data.csv with columns: image_path, student_id
+Dataset: either a directory laid out as <student_id>/<images> or a CSV (--pairs) with
+columns image_path, student_id (empty student_id = impostor / not enrolled).
+
+1. Every image is embedded once, across a process pool, and cached on disk
+   (keyed by path, size and mtime), so re-runs only embed new/changed images.
+2. Gallery: either the first --gallery-per-id images of each identity (mean embedding,
+   like enrollment) or the live DB gallery (--gallery db).
+3. The full query x gallery distance matrix is computed in one vectorized pass and
+   THRESHOLD_COSINE / THRESHOLD_EUCLIDEAN are swept to produce precision/recall/F1 curves.
+   Re-tuning thresholds therefore needs no re-inference. Queries with no detected face are
+   rejected at every threshold (an FN for enrolled identities), as in the live pipeline.
 """
+import argparse
+import asyncio
+import csv
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
 
 # Add project root
@@ -13,54 +29,242 @@ ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
 import numpy as np
-import cv2
-from app.services.face_engine import recognize_from_image
+
+from app.config import (
+    EMBEDDINGS_DIR,
+    FACE_DETECTOR,
+    FACE_RECOGNITION_MODEL,
+    THRESHOLD_COSINE,
+    THRESHOLD_EUCLIDEAN,
+)
+from app.ml.recognizer import distance_matrix
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+# ----- Dataset -----
+def load_pairs_from_dir(dataset: Path) -> list:
+    """<student_id>/<images> -> [(image_path, student_id)], sorted for a stable gallery split."""
+    pairs = []
+    for folder in sorted(p for p in dataset.iterdir() if p.is_dir()):
+        for img in sorted(folder.iterdir()):
+            if img.suffix.lower() in IMAGE_SUFFIXES:
+                pairs.append((str(img), folder.name))
+    return pairs
+
+
+def load_pairs_from_csv(path: Path) -> list:
+    with open(path, newline="") as f:
+        return [(row["image_path"], (row.get("student_id") or "").strip() or None) for row in csv.DictReader(f)]
+
+
+# ----- Embedding (process pool + disk cache) -----
+def _init_worker(model_mode: str) -> None:
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    if model_mode == "stub":
+        from scripts.bench.stubs import install_stub_models
+        install_stub_models()
+
+
+def _embed_path(path: str):
+    """Embed the largest face in one image; None if unreadable or no face."""
+    import cv2
+    from app.ml.recognizer import get_embeddings_from_image
+
+    img = cv2.imread(path)
+    if img is None:
+        return path, None
+    faces = get_embeddings_from_image(img, detector_backend=FACE_DETECTOR, model_name=FACE_RECOGNITION_MODEL)
+    if not faces:
+        return path, None
+    _bbox, emb = max(faces, key=lambda f: f[0][2] * f[0][3])
+    return path, emb
+
+
+def _file_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{path}|{st.st_size}|{int(st.st_mtime)}"
+
+
+def embed_dataset(paths: list, cache_file: Path, workers: int, model_mode: str) -> dict:
+    """Return {path: embedding or None}; only images missing from the cache are embedded."""
+    cached = {}
+    if cache_file.exists():
+        data = np.load(cache_file, allow_pickle=False)
+        for key, emb, ok in zip(data["keys"], data["embeddings"], data["valid"]):
+            cached[str(key)] = emb if ok else None
+
+    keys = {p: _file_key(p) for p in paths if os.path.exists(p)}
+    todo = [p for p, k in keys.items() if k not in cached]
+    print(f"Embeddings: {len(keys) - len(todo)} cached, {len(todo)} to compute ({workers} workers)")
+    if todo:
+        ctx = get_context("spawn")  # TensorFlow is not fork-safe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(model_mode,)) as pool:
+            for i, (path, emb) in enumerate(pool.map(_embed_path, todo, chunksize=8), 1):
+                cached[keys[path]] = emb
+                if i % 100 == 0:
+                    print(f"  {i}/{len(todo)}")
+        _save_cache(cache_file, cached)
+    return {p: cached.get(k) for p, k in keys.items()}
+
+
+def _save_cache(cache_file: Path, cached: dict) -> None:
+    dim = next((e.shape[0] for e in cached.values() if e is not None), 0)
+    keys = list(cached.keys())
+    mat = np.zeros((len(keys), dim), dtype=np.float32)
+    valid = np.zeros(len(keys), dtype=bool)
+    for i, k in enumerate(keys):
+        if cached[k] is not None:
+            mat[i] = cached[k]
+            valid[i] = True
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_suffix(".tmp.npz")
+    np.savez(tmp, keys=np.array(keys), embeddings=mat, valid=valid)
+    os.replace(tmp, cache_file)
 
 
-def evaluate_accuracy(test_pairs, threshold_strict=False):
+# ----- Gallery -----
+def split_gallery(pairs: list, embeddings: dict, per_id: int):
+    """First `per_id` images of each identity -> mean gallery embedding; the rest are queries."""
+    by_id, queries = {}, []
+    for path, sid in pairs:
+        emb = embeddings.get(path)
+        if sid and len(by_id.setdefault(sid, [])) < per_id:
+            if emb is not None:
+                by_id[sid].append(emb)
+            continue
+        queries.append((path, sid))
+    ids = [sid for sid, embs in by_id.items() if embs]
+    mat = np.stack([np.mean(by_id[sid], axis=0) for sid in ids]) if ids else np.zeros((0, 0), np.float32)
+    return ids, mat.astype(np.float32), queries
+
+
+def db_gallery():
+    from app.database import AsyncSessionLocal
+    from app.services.face_engine import load_student_embeddings_db
+
+    async def load():
+        async with AsyncSessionLocal() as session:
+            return await load_student_embeddings_db(session)
+
+    known = asyncio.run(load())
+    ids = [sid for sid, _name, _emb in known]
+    mat = np.stack([emb for _sid, _name, emb in known]) if known else np.zeros((0, 0), np.float32)
+    return ids, mat.astype(np.float32)
+
+
+# ----- Metrics -----
+def sweep(best_dist: np.ndarray, correct: np.ndarray, genuine: np.ndarray, thresholds: np.ndarray) -> list:
+    """
+    Precision/recall/F1 for every threshold at once.
+    best_dist: (Q,) nearest-gallery distance; correct: nearest id == true id; genuine: query is enrolled.
+    Counting matches the single-threshold rules: a wrong-identity match is both an FP and an FN.
     """
-    test_pairs: list of (image_path_or_numpy, expected_student_id).
-    If threshold_strict, use stricter matching (fewer FP, more FN).
-    Returns dict with precision, recall, f1, tp, fp, fn.
+    accepted = best_dist[None, :] <= thresholds[:, None]          # (T, Q)
+    tp = (accepted & correct[None, :]).sum(axis=1)
+    fp = (accepted & ~correct[None, :]).sum(axis=1)
+    fn = (genuine[None, :] & ~(accepted & correct[None, :])).sum(axis=1)
+    out = []
+    for t, tp_i, fp_i, fn_i in zip(thresholds, tp, fp, fn):
+        precision = tp_i / (tp_i + fp_i) if (tp_i + fp_i) > 0 else 0.0
+        recall = tp_i / (tp_i + fn_i) if (tp_i + fn_i) > 0 else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0.0
+        out.append({
+            "threshold": round(float(t), 4),
+            "precision": round(float(precision), 4),
+            "recall": round(float(recall), 4),
+            "f1_score": round(float(f1), 4),
+            "tp": int(tp_i),
+            "fp": int(fp_i),
+            "fn": int(fn_i),
+        })
+    return out
+
+
+def nearest_matches(query_ids: list, query_mat: np.ndarray, gallery_ids: list, gallery_mat: np.ndarray,
+                    metric: str, has_face: np.ndarray = None):
     """
-    tp, fp, fn = 0, 0, 0
-    for item, expected_id in test_pairs:
-        if isinstance(item, str):
-            img = cv2.imread(item)
+    Nearest gallery identity per query from one (Q, N) distance matrix -> (best_dist, correct, genuine).
+    has_face: (Q,) mask of the queries that have a row in query_mat; the others (no face detected)
+    get an infinite distance, so they are rejected at every threshold and count as FN when genuine.
+    """
+    has_face = np.ones(len(query_ids), dtype=bool) if has_face is None else has_face
+    best_dist = np.full(len(query_ids), np.inf)
+    nearest_id = np.full(len(query_ids), None, dtype=object)
+    if len(query_mat):
+        dists = distance_matrix(query_mat, gallery_mat, metric=metric)
+        nearest = np.argmin(dists, axis=1)
+        best_dist[has_face] = dists[np.arange(len(query_mat)), nearest]
+        nearest_id[has_face] = np.array(gallery_ids, dtype=object)[nearest]
+    truth = np.array(query_ids, dtype=object)
+    correct = has_face & (nearest_id == truth)
+    enrolled = set(gallery_ids)
+    genuine = np.array([sid is not None and sid in enrolled for sid in query_ids])
+    return best_dist, correct, genuine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognition accuracy + threshold sweep")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--dataset", help="Directory laid out as <student_id>/<images>")
+    src.add_argument("--pairs", help="CSV with columns image_path, student_id")
+    parser.add_argument("--gallery", choices=("split", "db"), default="split")
+    parser.add_argument("--gallery-per-id", type=int, default=3, help="Images per identity used for enrollment (split)")
+    parser.add_argument("--metric", choices=("cosine", "euclidean", "both"), default="both")
+    parser.add_argument("--steps", type=int, default=41, help="Thresholds per sweep")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--model", choices=("real", "stub"), default="real", help="stub = offline synthetic model")
+    parser.add_argument("--cache", default=None, help="Embedding cache file (.npz)")
+    parser.add_argument("--out", help="Write curves as JSON to this path")
+    args = parser.parse_args()
+
+    pairs = load_pairs_from_dir(Path(args.dataset)) if args.dataset else load_pairs_from_csv(Path(args.pairs))
+    if not pairs:
+        print("No images found.")
+        sys.exit(1)
+    cache_file = Path(args.cache) if args.cache else (
+        EMBEDDINGS_DIR / "eval_cache" / f"{FACE_RECOGNITION_MODEL}-{FACE_DETECTOR}-{args.model}.npz"
+    )
+    embeddings = embed_dataset([p for p, _ in pairs], cache_file, args.workers, args.model)
+
+    if args.gallery == "split":
+        gallery_ids, gallery_mat, queries = split_gallery(pairs, embeddings, args.gallery_per_id)
+    else:
+        gallery_ids, gallery_mat = db_gallery()
+        queries = pairs
+    # Queries without a detected face stay in: the pipeline recognizes nobody, i.e. a miss
+    has_face = np.array([embeddings.get(p) is not None for p, _sid in queries], dtype=bool)
+    missed = int((~has_face).sum())
+    if not gallery_ids or not has_face.any():
+        print("Need at least one gallery identity and one query with a detected face.")
+        sys.exit(1)
+    query_ids = [sid for _p, sid in queries]
+    query_mat = np.stack([embeddings[p] for p, _sid in queries if embeddings.get(p) is not None]).astype(np.float32)
+    print(f"Gallery: {len(gallery_ids)} identities; queries: {len(queries)} ({missed} without a face, counted as misses)")
+
+    metrics = ("cosine", "euclidean") if args.metric == "both" else (args.metric,)
+    report = {"gallery_size": len(gallery_ids), "queries": len(queries), "no_face": missed, "curves": {}}
+    for metric in metrics:
+        if metric == "cosine":
+            thresholds, current = np.linspace(0.05, 1.0, args.steps), THRESHOLD_COSINE
         else:
-            img = item
-        if img is None:
-            fn += 1
-            continue
-        recognized = recognize_from_image(img)
-        pred_id = recognized[0][0] if recognized else None
-        if expected_id and pred_id == expected_id:
-            tp += 1
-        elif expected_id and pred_id and pred_id != expected_id:
-            fp += 1
-            fn += 1  # true identity missed
-        elif expected_id:
-            fn += 1
-        elif pred_id:
-            fp += 1
-    precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
-    recall = tp / (tp + fn) if (tp + fn) > 0 else 0.0
-    f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0.0
-    return {
-        "precision": round(precision, 4),
-        "recall": round(recall, 4),
-        "f1_score": round(f1, 4),
-        "tp": tp,
-        "fp": fp,
-        "fn": fn,
-    }
+            thresholds, current = np.linspace(1.0, 2.0 * THRESHOLD_EUCLIDEAN, args.steps), THRESHOLD_EUCLIDEAN
+        best_dist, correct, genuine = nearest_matches(query_ids, query_mat, gallery_ids, gallery_mat, metric, has_face)
+        curve = sweep(best_dist, correct, genuine, thresholds)
+        at_current = sweep(best_dist, correct, genuine, np.array([current]))[0]
+        best = max(curve, key=lambda r: r["f1_score"])
+        report["curves"][metric] = {"sweep": curve, "current": at_current, "best": best}
+
+        print(f"\n[{metric}] threshold  precision  recall  f1")
+        for r in curve:
+            print(f"  {r['threshold']:9.3f}  {r['precision']:9.4f}  {r['recall']:6.4f}  {r['f1_score']:.4f}")
+        print(f"  current ({current}): F1 {at_current['f1_score']}  |  best: {best['threshold']} (F1 {best['f1_score']})")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+        print(f"\nCurves written to {args.out}")
 
 
 if __name__ == "__main__":
-    # Example: no test file → print usage
-    print("Accuracy evaluation (Precision, Recall, F1-Score)")
-    print("Provide test_pairs as (image_path, expected_student_id).")
-    print("Example: add test images and run with your test_data.")
-    # Demo with empty list
-    result = evaluate_accuracy([])
-    print("Sample output format:", result)
+    main()
@@ -0,0 +1,32 @@
+"""
+Export the enrolled gallery to a memory-mappable snapshot (run at deploy to pre-warm workers).
+Run from project root: python -m scripts.export_gallery_snapshot
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.config import GALLERY_SNAPSHOT_DIR
+from app.database import AsyncSessionLocal
+from app.services.gallery import gallery_version, load_gallery_from_db, write_snapshot
+
+
+async def main():
+    async with AsyncSessionLocal() as session:
+        version = await gallery_version(session)
+        gallery = await load_gallery_from_db(session, version)
+    if not len(gallery):
+        print("No enrolled embeddings; nothing to export.")
+        return
+    path = write_snapshot(gallery)
+    if path is None:
+        print(f"✗ Could not write snapshot under {GALLERY_SNAPSHOT_DIR}")
+        sys.exit(1)
+    print(f"✓ Snapshot {version}: {len(gallery)} x {gallery.matrix.shape[1]} -> {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
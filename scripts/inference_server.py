@@ -0,0 +1,55 @@
+"""
+Shared inference server: loads MTCNN + DeepFace once and serves every API worker on this host.
+Run from project root:
+  python -m scripts.inference_server [--socket /tmp/attendance-inference.sock] [--threads 2]
+then start the API with the same INFERENCE_SOCKET, e.g.
+  INFERENCE_SOCKET=/tmp/attendance-inference.sock uvicorn app.main:app --workers 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DEFAULT_SOCKET = "/tmp/attendance-inference.sock"
+
+
+async def main(args):
+    from app.ml.inference import InferenceServer
+
+    if args.model == "stub":
+        from scripts.bench.stubs import install_stub_models
+        install_stub_models()
+    server = InferenceServer(args.socket, batch_size=args.batch_size, batch_wait=args.batch_wait_ms / 1000.0,
+                             threads=args.threads)
+    print("Loading models...")
+    await asyncio.to_thread(server.warm_up)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"✓ Serving detect/embed on {args.socket} (pid {os.getpid()})")
+    await server.serve(stop)
+    print(f"Stopped after {server.batches} embedding batches ({server.batched_crops} crops)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared detect/embed server for API workers (Unix socket)")
+    parser.add_argument("--socket", default=os.getenv("INFERENCE_SOCKET") or DEFAULT_SOCKET)
+    parser.add_argument("--threads", type=int, default=2, help="Inference threads (detection and batched embedding overlap)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Max crops per embedding batch (default: EMBED_BATCH_SIZE)")
+    parser.add_argument("--batch-wait-ms", type=float, default=None, help="Wait for more crops (default: INFERENCE_BATCH_WAIT_MS)")
+    parser.add_argument("--model", choices=("real", "stub"), default="real", help="stub = offline synthetic model")
+    args = parser.parse_args()
+    # Must not delegate to itself
+    os.environ.pop("INFERENCE_SOCKET", None)
+    from app.config import EMBED_BATCH_SIZE, INFERENCE_BATCH_WAIT_MS
+    args.batch_size = args.batch_size or EMBED_BATCH_SIZE
+    args.batch_wait_ms = INFERENCE_BATCH_WAIT_MS if args.batch_wait_ms is None else args.batch_wait_ms
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args))
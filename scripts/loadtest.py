@@ -0,0 +1,325 @@
+"""
+End-to-end load test: seed a throwaway database, start the app, drive concurrent realistic traffic.
+Run from project root:
+  python -m scripts.loadtest --students 5000 --days 30 --concurrency 16 --duration 60 [--workers 2] [--out load.json]
+  python -m scripts.loadtest --url http://staging:8000 --days 30 --duration 60   # existing, already seeded server
+
+Seeds `--students` students with embeddings (the first 24 are the faces in the synthetic photos),
+a 60-student section and `--days` days of attendance (as scripts.bench.queries does), then starts
+uvicorn on a free port with `--workers` processes. Client threads (stdlib http.client, one
+keep-alive connection each) pick requests by `--mix` weights:
+  poll    dashboard polls of summary / records (today, a section, an older day), sending
+          If-None-Match like the dashboard so unchanged polls are 304s
+  mark    POST mark-from-image with a synthetic multi-face classroom photo for today
+  report  Excel report downloads (one day, or the whole seeded range)
+
+Reports per endpoint: requests, throughput, p50/p95/p99 latency, error rate (5xx and connection
+errors) and status counts. With --model stub (default unless Facenet weights are present) it
+runs offline on CPU. Exits non-zero when the overall error rate exceeds --max-error-rate.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from http.client import HTTPConnection
+from pathlib import Path
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from scripts.bench.run import git_commit, summarize
+
+DEFAULT_MIX = "poll=75,mark=15,report=10"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def seed_database(args, start: date) -> None:
+    from sqlalchemy import func, select
+    from app.database import AsyncSessionLocal, engine, init_db
+    from app.models import Student
+    from scripts.bench.queries import seed
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        if (await session.execute(select(func.count(Student.id)))).scalar_one():
+            raise SystemExit("✗ Database already has students; the load test only seeds an empty, throwaway database")
+    await seed(args.students, args.days, start)
+    await engine.dispose()  # the server processes open their own connections
+
+
+def start_server(args, env: dict, port: int) -> subprocess.Popen:
+    target = "scripts.bench.stub_app:app" if args.mode == "stub" else "app.main:app"
+    cmd = [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(args.workers), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=str(ROOT), env=env)
+
+
+def wait_ready(base: str, proc, timeout: float) -> None:
+    parts = urlsplit(base)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"✗ Server exited with code {proc.returncode}")
+        try:
+            conn = HTTPConnection(parts.hostname, parts.port or 80, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise SystemExit(f"✗ {base} not ready after {timeout:.0f}s")
+
+
+def build_photos(count: int) -> list:
+    """JPEG classroom photos, each with a different subset of the 24 enrolled synthetic faces."""
+    from scripts.bench.queries import FACES
+    from scripts.bench.synthetic import classroom_image, encode_jpeg
+
+    rng = random.Random(7)
+    photos = []
+    for i in range(count):
+        faces = rng.sample(range(FACES), rng.randint(FACES // 2, FACES))
+        img, _ = classroom_image(faces, width=1280, height=720, seed=i)
+        photos.append(encode_jpeg(img))
+    return photos
+
+
+class Scenario:
+    """Picks the next request: (endpoint name, method, path, photo to upload or None)."""
+
+    def __init__(self, mix: dict, start: date, days: int, photos: list):
+        self.names, self.weights = list(mix), list(mix.values())
+        self.start, self.days, self.photos = start, days, photos
+        self.today = start + timedelta(days=days)  # marked during the run, polled the most
+
+    def next(self, rng: random.Random):
+        kind = rng.choices(self.names, self.weights)[0]
+        old_day = (self.start + timedelta(days=rng.randrange(max(1, self.days)))).isoformat()
+        if kind == "poll":
+            return rng.choice([
+                ("poll.summary", "GET", f"/api/attendance/summary?day={self.today}", None),
+                ("poll.records", "GET", f"/api/attendance/records?day={self.today}", None),
+                ("poll.section", "GET", f"/api/attendance/summary?day={self.today}&section_id=1", None),
+                ("poll.history", "GET", f"/api/attendance/summary?day={old_day}", None),
+            ])
+        if kind == "mark":
+            return ("mark.image", "POST", f"/api/attendance/mark-from-image?attendance_date={self.today}",
+                    rng.choice(self.photos))
+        end = self.start + timedelta(days=max(0, self.days - 1))
+        return rng.choice([
+            ("report.daily", "GET", f"/api/reports/daily?day={old_day}", None),
+            ("report.range", "GET", f"/api/reports/range?from_date={self.start}&to_date={end}", None),
+        ])
+
+
+def client(base: str, scenario: Scenario, deadline: float, seed: int, results: dict, lock: threading.Lock) -> None:
+    from scripts.bench.asgi import multipart
+
+    parts = urlsplit(base)
+    rng = random.Random(seed)
+    conn = None
+    etags = {}
+    local = defaultdict(lambda: {"latencies": [], "statuses": defaultdict(int), "errors": 0})
+    while time.monotonic() < deadline:
+        name, method, path, photo = scenario.next(rng)
+        headers, body = {}, None
+        if photo is not None:
+            body, content_type = multipart({"file": ("class.jpg", photo, "image/jpeg")})
+            headers["Content-Type"] = content_type
+        elif path in etags:
+            headers["If-None-Match"] = etags[path]
+        stats = local[name]
+        t0 = time.perf_counter()
+        try:
+            if conn is None:
+                conn = HTTPConnection(parts.hostname, parts.port or 80, timeout=120)
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            elapsed = time.perf_counter() - t0
+            if response.getheader("ETag"):
+                etags[path] = response.getheader("ETag")
+            stats["statuses"][response.status] += 1
+            if response.status >= 500:
+                stats["errors"] += 1
+            stats["latencies"].append(elapsed)
+            if response.getheader("Connection", "").lower() == "close":
+                conn.close()
+                conn = None
+        except Exception as exc:  # connection reset, timeout, protocol error
+            stats["errors"] += 1
+            stats["statuses"][type(exc).__name__] += 1
+            if conn is not None:
+                conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+    with lock:
+        for name, stats in local.items():
+            merged = results[name]
+            merged["latencies"] += stats["latencies"]
+            merged["errors"] += stats["errors"]
+            for status, n in stats["statuses"].items():
+                merged["statuses"][status] += n
+
+
+def drive(base: str, scenario: Scenario, concurrency: int, seconds: float) -> dict:
+    results = defaultdict(lambda: {"latencies": [], "statuses": defaultdict(int), "errors": 0})
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client, args=(base, scenario, deadline, i, results, lock), daemon=True)
+               for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def report(raw: dict, wall: float) -> dict:
+    out = {}
+    for name in sorted(raw):
+        stats = raw[name]
+        total = sum(stats["statuses"].values())
+        entry = summarize(stats["latencies"]) if stats["latencies"] else {"n": 0}
+        entry.update({
+            "requests": total,
+            "throughput_per_s": round(total / wall, 3),
+            "error_rate": round(stats["errors"] / total, 4) if total else 0.0,
+            "statuses": {str(k): v for k, v in sorted(stats["statuses"].items(), key=lambda kv: str(kv[0]))},
+        })
+        out[name] = entry
+    requests = sum(e["requests"] for e in out.values())
+    errors = sum(raw[n]["errors"] for n in raw)
+    out["_total"] = {
+        "requests": requests,
+        "throughput_per_s": round(requests / wall, 3),
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+    }
+    return out
+
+
+def print_table(results: dict) -> None:
+    print(f"{'endpoint':<16} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  statuses",
+          file=sys.stderr)
+    for name, e in results.items():
+        if name == "_total":
+            continue
+        print(f"{name:<16} {e['requests']:>7} {e['throughput_per_s']:>8} {e.get('p50_ms', '-'):>9} "
+              f"{e.get('p95_ms', '-'):>9} {e.get('p99_ms', '-'):>9} {e['error_rate']:>7.2%}  "
+              f"{' '.join(f'{k}:{v}' for k, v in e['statuses'].items())}", file=sys.stderr)
+    t = results["_total"]
+    print(f"{'total':<16} {t['requests']:>7} {t['throughput_per_s']:>8} {'':>9} {'':>9} {'':>9} {t['error_rate']:>7.2%}",
+          file=sys.stderr)
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("poll", "mark", "report"):
+            raise SystemExit(f"✗ Unknown traffic kind in --mix: {name!r} (poll, mark, report)")
+        if float(weight or 0) > 0:
+            mix[name.strip()] = float(weight)
+    if not mix:
+        raise SystemExit("✗ --mix has no positive weights")
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded end-to-end load test")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=30, help="Days of seeded attendance history")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2024, 1, 1), help="First seeded day")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of measured traffic")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of unmeasured traffic first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic weights, e.g. poll=75,mark=15,report=10")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--model", choices=("auto", "stub", "real"), default="auto")
+    parser.add_argument("--photos", type=int, default=8, help="Distinct synthetic photos to upload")
+    parser.add_argument("--database-url", help="Empty throwaway database to seed (default: temp SQLite)")
+    parser.add_argument("--url", help="Drive an already running, seeded server instead (no seeding, no launch)")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--out", help="Write JSON results to this path (default: stdout)")
+    args = parser.parse_args()
+
+    tmpdir = Path(tempfile.mkdtemp(prefix="attendance-load-"))
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{tmpdir / 'load.db'}"
+    os.environ["ARCHIVE_DIR"] = str(tmpdir / "archive")
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+    from scripts.bench.stubs import select_models
+
+    args.mode = select_models(args.model)
+    proc = None
+    base = args.url.rstrip("/") if args.url else None
+    try:
+        if base is None:
+            print(f"Seeding {args.students} students x {args.days} days...", file=sys.stderr)
+            asyncio.run(seed_database(args, args.start))
+            port = free_port()
+            base = f"http://127.0.0.1:{port}"
+            proc = start_server(args, dict(os.environ), port)
+        wait_ready(base, proc, args.ready_timeout)
+        scenario = Scenario(parse_mix(args.mix), args.start, args.days, build_photos(args.photos))
+        if args.warmup > 0:
+            print(f"Warm-up {args.warmup:.0f}s...", file=sys.stderr)
+            drive(base, scenario, args.concurrency, args.warmup)
+        print(f"Load: {args.concurrency} clients for {args.duration:.0f}s against {base}", file=sys.stderr)
+        started = time.monotonic()
+        raw = drive(base, scenario, args.concurrency, args.duration)
+        results = report(raw, time.monotonic() - started)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    print_table(results)
+    out = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": args.mode,
+            "target": args.url or "local",
+            "args": {k: (str(v) if isinstance(v, date) else v) for k, v in vars(args).items()},
+        },
+        "endpoints": results,
+    }
+    text = json.dumps(out, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    if results["_total"]["error_rate"] > args.max_error_rate:
+        print(f"✗ Error rate {results['_total']['error_rate']:.2%} > {args.max_error_rate:.2%}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Convert the attendance table to monthly range partitions (PostgreSQL).
+Run from project root: python -m scripts.partition_attendance [--months-ahead 3]
+
+Runs in one transaction: the table is rebuilt as PARTITION BY RANGE (date) with a partition
+per month of existing data plus upcoming months and a DEFAULT partition; ids are preserved.
+Take a backup first; writes to attendance are blocked while it runs.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database import engine, init_db
+from app.services.partitions import convert_to_partitioned, is_partitioned
+
+
+async def main(args):
+    if engine.dialect.name != "postgresql":
+        print("✗ Native partitioning requires PostgreSQL (set DATABASE_URL). "
+              "On SQLite, keep the table small with: python -m scripts.archive_attendance")
+        sys.exit(1)
+    await init_db()
+    async with engine.begin() as conn:
+        if await is_partitioned(conn):
+            print("attendance is already partitioned.")
+            return
+        created = await convert_to_partitioned(conn, months_ahead=args.months_ahead)
+    print(f"✓ attendance partitioned by month: {len(created)} partitions ({created[0]} … {created[-1]})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition attendance by month (PostgreSQL)")
+    parser.add_argument("--months-ahead", type=int, default=3, help="Future months to pre-create")
+    asyncio.run(main(parser.parse_args()))
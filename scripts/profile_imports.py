@@ -0,0 +1,176 @@
+"""
+Profile cold-start import cost of the serverless entry point and enforce a /health budget.
+Run from project root: python -m scripts.profile_imports
+
+Each measurement runs in a fresh interpreter (like a cold serverless worker):
+  1. `python -X importtime` on `api.index` -> per-module self/cumulative import cost.
+  2. Which heavy dependencies were pulled in by the import (should be none).
+  3. Wall time from interpreter start to the first `/health` response (import + request).
+
+Exits non-zero if a heavy module is imported eagerly or the /health budget is exceeded,
+so it can be used as a regression gate in CI.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that must only be imported at the point of use
+HEAVY_MODULES = ("cv2", "numpy", "pandas", "openpyxl", "pgvector", "passlib", "tensorflow", "deepface", "mtcnn")
+
+DEFAULT_HEALTH_BUDGET_MS = 1500.0
+
+# Runs in a fresh interpreter: import the entry point, serve one /health request over raw ASGI.
+_HEALTH_CHILD = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+from api.index import app
+t_import = time.perf_counter()
+
+async def call():
+    sent = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/health", "raw_path": b"/health",
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+    }
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        sent.append(message)
+    await app(scope, receive, send)
+    return sent[0]["status"]
+
+status = asyncio.run(call())
+t_done = time.perf_counter()
+heavy = sorted(m for m in HEAVY if m in sys.modules)
+print(json.dumps({
+    "status": status,
+    "import_ms": (t_import - t0) * 1000,
+    "total_ms": (t_done - t0) * 1000,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """Parse `-X importtime` output into [{module, self_us, cumulative_us}]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            _, rest = line.split(":", 1)
+            self_us, cum_us, name = rest.split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cum_us),
+            })
+        except ValueError:
+            continue
+    return rows
+
+
+def profile_imports(target: str = "api.index") -> list:
+    """Import `target` in a fresh interpreter with -X importtime; return per-module rows."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def top_level_costs(rows: list) -> list:
+    """Aggregate self time per top-level package (e.g. sqlalchemy, fastapi, app)."""
+    totals = {}
+    for r in rows:
+        pkg = r["module"].split(".")[0]
+        totals[pkg] = totals.get(pkg, 0) + r["self_us"]
+    return sorted(({"package": k, "self_us": v} for k, v in totals.items()), key=lambda x: -x["self_us"])
+
+
+def measure_health(runs: int = 5) -> list:
+    """Cold-start /health measurements, one fresh interpreter per run."""
+    code = f"HEAVY = {HEAVY_MODULES!r}\n" + _HEALTH_CHILD
+    results = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=str(ROOT),
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"/health cold-start run failed:\n{proc.stderr[-2000:]}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import profile and /health budget")
+    parser.add_argument("--target", default="api.index", help="Module to profile")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to print")
+    parser.add_argument("--runs", type=int, default=5, help="Cold-start /health runs")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_HEALTH_BUDGET_MS,
+                        help="Max median cold-start /health latency (import + first request)")
+    parser.add_argument("--json", dest="json_path", help="Write full report to this JSON file")
+    args = parser.parse_args()
+
+    rows = profile_imports(args.target)
+    by_cum = sorted(rows, key=lambda r: -r["cumulative_us"])
+    print(f"Import profile for {args.target} ({len(rows)} modules)")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for r in by_cum[: args.top]:
+        print(f"{r['cumulative_us'] / 1000:14.1f} {r['self_us'] / 1000:9.1f}  {r['module']}")
+    print("\nSelf time by top-level package:")
+    packages = top_level_costs(rows)
+    for p in packages[: args.top]:
+        print(f"{p['self_us'] / 1000:9.1f} ms  {p['package']}")
+
+    health = measure_health(args.runs)
+    median_total = statistics.median(h["total_ms"] for h in health)
+    median_import = statistics.median(h["import_ms"] for h in health)
+    heavy = sorted({m for h in health for m in h["heavy_modules"]})
+    print(f"\n/health cold start: median {median_total:.1f} ms (import {median_import:.1f} ms), "
+          f"budget {args.budget_ms:.0f} ms, {args.runs} runs")
+
+    failures = []
+    if any(h["status"] != 200 for h in health):
+        failures.append("/health did not return 200")
+    if heavy:
+        failures.append(f"heavy modules imported at startup: {', '.join(heavy)}")
+    if median_total > args.budget_ms:
+        failures.append(f"/health cold start {median_total:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+
+    if args.json_path:
+        report = {
+            "target": args.target,
+            "modules": rows,
+            "packages": packages,
+            "health_runs": health,
+            "health_median_ms": median_total,
+            "budget_ms": args.budget_ms,
+            "failures": failures,
+        }
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.json_path}")
+
+    if failures:
+        for f in failures:
+            print(f"✗ {f}")
+        sys.exit(1)
+    print("✓ Cold-start budget met")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Re-embed every enrolled student with another face recognition model, then switch the gallery to it.
+Run from project root:
+  python -m scripts.reembed --model ArcFace [--rate 20] [--workers 2] [--batch-size 50]
+  python -m scripts.reembed --model Facenet --version aligned-1   # rebuild the active model
+  python -m scripts.reembed --status
+
+Reads each student's photos from UPLOAD_DIR/<student_id>/ and stores the new embeddings next to
+the current ones; recognition keeps using the active model meanwhile. Interrupting and re-running
+the command resumes where it stopped. Once every student is done the switch is one transaction
+(--no-activate stops before it; run again without it to switch). --rate caps photos per second
+so a live server keeps its CPU. The switch is refused while enrolled students would lose their
+embedding (no usable photo); they are listed, and --force switches anyway. Naming the active
+model with a --version it does not have yet rebuilds it from the photos the same way.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database import AsyncSessionLocal, init_db
+from app.services.embedding_models import model_status, run_reembed
+
+
+async def main(args):
+    await init_db()
+    if args.status:
+        async with AsyncSessionLocal() as session:
+            rows = await model_status(session)
+        if not rows:
+            print("No embedding models recorded yet (nothing enrolled)")
+        for m in rows:
+            print(
+                f"  {m['name']:<16} {m['state']:<9} dim={m['dim'] or '?':<5} "
+                f"embedded={m['students_embedded']}/{m['students_total']} pending={m['students_pending']}"
+            )
+        return
+    if not args.model:
+        print("✗ --model is required (or --status)")
+        sys.exit(1)
+
+    worker_setup = None
+    if args.model_stub:
+        from scripts.bench.stubs import install_stub_models
+        worker_setup = install_stub_models
+
+    def progress(done, total):
+        print(f"  {done}/{total} students")
+
+    print(f"Re-embedding with {args.model}" + (f" at <= {args.rate} photos/s" if args.rate else ""))
+    async with AsyncSessionLocal() as session:
+        summary = await run_reembed(
+            session,
+            args.model,
+            version=args.version,
+            batch_size=args.batch_size,
+            photos_per_second=args.rate,
+            workers=args.workers,
+            activate=not args.no_activate,
+            allow_missing=args.force,
+            worker_setup=worker_setup,
+            progress=progress,
+        )
+    if summary.get("already_active"):
+        print(f"✓ {args.model} is already the active model (pass a new --version to rebuild it)")
+        return
+    print(f"✓ {summary['processed']} students re-embedded")
+    if summary["no_face"]:
+        print(
+            f"⚠️  No usable photo for {len(summary['no_face'])} student(s); they need new photos after the switch: "
+            f"{', '.join(summary['no_face'][:20])}"
+        )
+    if summary.get("missing"):
+        missing = summary["missing"]
+        print(
+            f"✗ Not activated: {len(missing)} enrolled student(s) would lose their embedding: "
+            f"{', '.join(missing[:20])}{' ...' if len(missing) > 20 else ''}"
+        )
+        print("  Upload new photos for them and re-run, or re-run with --force to switch anyway")
+        sys.exit(1)
+    print(f"✓ Gallery switched to {args.model}" if summary["activated"] else "  Not activated (--no-activate)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-embed enrolled students with another model and switch over")
+    parser.add_argument("--model", help="DeepFace model name, e.g. ArcFace, Facenet512")
+    parser.add_argument("--version", help="Free-form version label stored with the embeddings")
+    parser.add_argument("--batch-size", type=int, default=50, help="Students per DB transaction")
+    parser.add_argument("--rate", type=float, default=None, help="Max photos per second (default: unlimited)")
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (default: CPU count)")
+    parser.add_argument("--no-activate", action="store_true", help="Build the embeddings but do not switch")
+    parser.add_argument("--force", action="store_true", help="Switch even if some students would lose their embedding")
+    parser.add_argument("--status", action="store_true", help="Show models and progress, then exit")
+    parser.add_argument("--model-stub", action="store_true", help="Offline synthetic model (testing)")
+    asyncio.run(main(parser.parse_args()))
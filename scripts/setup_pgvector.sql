@@ -2,9 +2,18 @@
 create extension if not exists vector;
 
 -- Add embedding column to students table (if it doesn't exist)
--- Assuming Facenet model (128 dimensions)
-alter table students add column if not exists embedding vector(128);
+-- No fixed dimension: the active model's embeddings (Facenet: 128, ArcFace: 512, ...).
+-- Matching runs on the in-memory gallery, so no vector index is needed (pgvector indexes
+-- require a fixed dimension and would block switching models)
+alter table students add column if not exists embedding vector;
+alter table students add column if not exists embedding_model varchar(50);
 
--- Create an index for faster similarity search (IVFFlat or HNSW)
--- HNSW is generally faster for recall but takes longer to build
-create index on students using hnsw (embedding vector_l2_ops);
+-- Running count of embeddings averaged into students.embedding (incremental enrollment)
+alter table students add column if not exists embedding_count integer not null default 0;
+
+-- Course/section rosters: new tables are created by init_db; existing attendance tables need
+-- the session key and the per-day uniqueness narrowed to institution-wide (session-less) rows
+alter table attendance add column if not exists session_id integer references class_sessions(id);
+alter table attendance drop constraint if exists uq_student_date;
+create unique index if not exists uq_student_date on attendance (student_id, date) where session_id is null;
+create unique index if not exists uq_session_student on attendance (session_id, student_id, date);